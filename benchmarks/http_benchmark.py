@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""End-to-end HTTP benchmark with regression tracking.
+
+Generates (or reuses) a synthetic fleet with src/generate_fleet.py, boots the
+real application against a throw-away copy of it on a local port, then drives
+the API endpoints over HTTP with a configurable number of concurrent clients.
+Each scenario reports p50/p95/p99 latency, throughput, errors and the mean
+number of SQL statements per request (from the X-Query-Count header).
+
+    python benchmarks/http_benchmark.py                    # run, save results
+    python benchmarks/http_benchmark.py --save-baseline    # ... and make them the baseline
+    python benchmarks/http_benchmark.py --only analytics   # scenarios matching a prefix
+
+Results go to benchmarks/results/<timestamp>.json. When a baseline exists
+(benchmarks/baseline.json by default) every scenario is compared with it and
+the exit code is 1 if any of them regressed.
+"""
+
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import argparse
+import http.client
+import json
+import platform
+import random
+import shutil
+import subprocess
+import threading
+import time
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARK_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# A scenario regresses when its p95 grows by more than this share AND by
+# more than MIN_REGRESSION_MS (tiny absolute changes are noise)
+DEFAULT_THRESHOLD = 0.20
+MIN_REGRESSION_MS = 5.0
+
+
+class Scenario:
+    """One endpoint to drive. `path` and `body` are callables taking the context."""
+
+    def __init__(self, name, method, path, body=None, requests=None, concurrency=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.requests = requests
+        self.concurrency = concurrency
+
+
+def _today(offset=0):
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+def build_scenarios():
+    """Every scenario, in run order (the trip write scenarios feed each other)"""
+    return [
+        # Lists with filters, search, sorting and pagination
+        Scenario('vehicles.list', 'GET', lambda ctx: '/api/vehicles?page=1&per_page=20&sort=-status,reg_no'),
+        Scenario('vehicles.search', 'GET', lambda ctx: f"/api/vehicles?page=1&q={ctx.choice(['LD', 'BE', 'toyota', 'kia'])}"),
+        Scenario('vehicles.get', 'GET', lambda ctx: f'/api/vehicles/{ctx.vehicle()}'),
+        Scenario('vehicles.stats', 'GET', lambda ctx: f'/api/vehicles/{ctx.vehicle()}/stats'),
+        Scenario('drivers.list', 'GET', lambda ctx: '/api/drivers?page=1&per_page=20&status=active'),
+        Scenario('drivers.search', 'GET', lambda ctx: f"/api/drivers?page=1&q={ctx.choice(['ana', 'joão', 'carlos', 'maria'])}"),
+        Scenario('drivers.get', 'GET', lambda ctx: f'/api/drivers/{ctx.driver()}'),
+        Scenario('drivers.stats', 'GET', lambda ctx: f'/api/drivers/{ctx.driver()}/stats'),
+        Scenario('trips.list', 'GET', lambda ctx: f'/api/trips?page={ctx.randint(1, 50)}&per_page=20'),
+        Scenario('trips.list_by_vehicle', 'GET', lambda ctx: f'/api/trips?vehicle_id={ctx.vehicle()}&page=1'),
+        Scenario('trips.list_by_date', 'GET',
+                 lambda ctx: f'/api/trips?status=completed&start_date={_today(-30)}&end_date={_today()}&page=1'),
+        Scenario('trips.search', 'GET', lambda ctx: f"/api/trips?q={ctx.choice(['luanda', 'uige', 'benguela lobito', 'huambo'])}"),
+        Scenario('trips.get', 'GET', lambda ctx: f'/api/trips/{ctx.trip()}'),
+        Scenario('maintenance.list', 'GET', lambda ctx: f'/api/maintenance?page={ctx.randint(1, 20)}&per_page=20'),
+        Scenario('maintenance.search', 'GET', lambda ctx: f"/api/maintenance?q={ctx.choice(['travão', 'oleo', 'bateria', 'motor'])}"),
+        Scenario('maintenance.get', 'GET', lambda ctx: f'/api/maintenance/{ctx.maintenance()}'),
+        Scenario('maintenance.stats', 'GET', lambda ctx: '/api/maintenance/stats'),
+        Scenario('maintenance.predictions', 'GET', lambda ctx: '/api/maintenance/predictions?page=1'),
+        Scenario('users.list', 'GET', lambda ctx: '/api/users?page=1'),
+        # Analytics
+        Scenario('analytics.dashboard', 'GET', lambda ctx: '/api/analytics/dashboard'),
+        Scenario('analytics.dashboard_bundle', 'GET', lambda ctx: '/api/analytics/dashboard/bundle'),
+        Scenario('analytics.fuel_consumption', 'GET', lambda ctx: '/api/analytics/fuel-consumption?days=30'),
+        Scenario('analytics.fuel_consumption_weekly', 'GET',
+                 lambda ctx: '/api/analytics/fuel-consumption?granularity=week&periods=12&group_by=fuel_type'),
+        Scenario('analytics.trips_per_vehicle', 'GET', lambda ctx: '/api/analytics/trips-per-vehicle'),
+        Scenario('analytics.trips_per_driver', 'GET', lambda ctx: '/api/analytics/trips-per-driver'),
+        Scenario('analytics.maintenance_costs', 'GET', lambda ctx: '/api/analytics/maintenance-costs?months=12'),
+        Scenario('analytics.vehicle_utilization', 'GET', lambda ctx: '/api/analytics/vehicle-utilization?days=30'),
+        Scenario('analytics.fuel_efficiency', 'GET', lambda ctx: '/api/analytics/fuel-efficiency'),
+        Scenario('analytics.fuel_efficiency_rolling', 'GET', lambda ctx: '/api/analytics/fuel-efficiency/rolling'),
+        Scenario('analytics.fuel_anomalies', 'GET', lambda ctx: '/api/analytics/fuel-anomalies?page=1'),
+        # Writes
+        Scenario('trips.create', 'POST', lambda ctx: '/api/trips', body=lambda ctx: {
+            'vehicle_id': ctx.vehicle(), 'driver_id': ctx.driver(),
+            'source': 'Luanda', 'destination': ctx.choice(['Benguela', 'Huambo', 'Uíge', 'Soyo']),
+            'trip_date': _today(), 'status': 'planned'
+        }),
+        Scenario('trips.start', 'POST', lambda ctx: f'/api/trips/{ctx.created_trip()}/start'),
+        Scenario('trips.complete', 'POST', lambda ctx: f'/api/trips/{ctx.started_trip()}/complete',
+                 body=lambda ctx: {'distance': round(ctx.uniform(50, 600), 1), 'fuel_used': round(ctx.uniform(5, 60), 1)}),
+        Scenario('maintenance.create', 'POST', lambda ctx: '/api/maintenance', body=lambda ctx: {
+            'vehicle_id': ctx.vehicle(), 'date': _today(), 'cost': round(ctx.uniform(10000, 90000), -2),
+            'description': 'Revisão periódica (benchmark).', 'maintenance_type': 'routine'
+        }),
+        Scenario('vehicles.update', 'PUT', lambda ctx: f'/api/vehicles/{ctx.vehicle()}',
+                 body=lambda ctx: {'status': ctx.choice(['active', 'maintenance'])}),
+        # Batch jobs behind an endpoint: a few sequential runs are enough
+        Scenario('maintenance.predictions.run', 'POST', lambda ctx: '/api/maintenance/predictions/run',
+                 requests=3, concurrency=1),
+    ]
+
+
+class Context:
+    """Shared, thread-safe source of ids for building request paths"""
+
+    def __init__(self, seed, counts):
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = counts
+        self.created_trips = []
+        self.started_trips = []
+
+    def _call(self, method, *args):
+        with self._lock:
+            return getattr(self._random, method)(*args)
+
+    def choice(self, values):
+        return self._call('choice', values)
+
+    def randint(self, low, high):
+        return self._call('randint', low, high)
+
+    def uniform(self, low, high):
+        return self._call('uniform', low, high)
+
+    def vehicle(self):
+        return self.randint(1, self.counts['vehicles'])
+
+    def driver(self):
+        return self.randint(1, self.counts['drivers'])
+
+    def trip(self):
+        return self.randint(1, self.counts['trips'])
+
+    def maintenance(self):
+        return self.randint(1, self.counts['maintenance'])
+
+    def created_trip(self):
+        with self._lock:
+            trip_id = self.created_trips.pop() if self.created_trips else None
+        if trip_id is not None:
+            with self._lock:
+                self.started_trips.append(trip_id)
+        return trip_id or 0
+
+    def started_trip(self):
+        with self._lock:
+            return self.started_trips.pop() if self.started_trips else 0
+
+
+def _dataset_path(args):
+    return os.path.join(DATA_DIR, f'fleet-{args.vehicles}v-{args.drivers}d-{args.trips}t-{args.maintenance}m-s{args.seed}.db')
+
+
+def prepare_database(args):
+    """Generate the dataset once, then hand out a fresh working copy per run"""
+    from src.generate_fleet import create_app, generate_fleet
+
+    dataset = _dataset_path(args)
+    if args.regenerate or not os.path.exists(dataset):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        if os.path.exists(dataset):
+            os.remove(dataset)
+        print(f'Generating dataset {os.path.basename(dataset)} ...')
+        app = create_app(f'sqlite:///{dataset}')
+        with app.app_context():
+            generate_fleet(args.vehicles, args.drivers, args.trips, args.maintenance, seed=args.seed, reset=True)
+
+    working_copy = os.path.join(DATA_DIR, 'benchmark-run.db')
+    shutil.copyfile(dataset, working_copy)
+    # The app attaches <database>-archive.db; start every run with an empty one
+    archive = os.path.join(DATA_DIR, 'benchmark-run-archive.db')
+    if os.path.exists(archive):
+        os.remove(archive)
+    # ...and, with COLUMNAR_STORE=1, a columnar snapshot rebuilt from the copy
+    shutil.rmtree(os.path.join(DATA_DIR, 'benchmark-run-columns'), ignore_errors=True)
+    return working_copy
+
+
+def start_server(database_path, port):
+    """Import the real app against `database_path` and serve it on a thread"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    os.environ.setdefault('QUERY_BUDGET_MODE', 'log')
+    # Measure the endpoints themselves, not the rate limiter
+    os.environ.setdefault('ADMISSION_ENABLED', '0')
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from src.main import app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True)
+    thread.start()
+    return server, app
+
+
+class Client:
+    """One keep-alive HTTP connection per worker thread"""
+
+    def __init__(self, port, token):
+        self.port = port
+        self.headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        payload = json.dumps(body) if body is not None else None
+        # Search terms may hold spaces and accents
+        path = quote(path, safe='/?&=,-')
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=payload, headers=self.headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self._local.connection = None
+            raise
+        elapsed = (time.perf_counter() - started) * 1000
+        return response.status, elapsed, response.getheader('X-Query-Count'), data
+
+
+def login(port, username, password):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('POST', '/api/auth/login', body=json.dumps({'username': username, 'password': password}),
+                       headers={'Content-Type': 'application/json'})
+    response = json.loads(connection.getresponse().read())
+    if not response.get('success'):
+        raise RuntimeError(f"Login failed: {response.get('message')}")
+    return response['data']['token']
+
+
+def run_scenario(client, context, scenario, requests, concurrency):
+    latencies = []
+    query_counts = []
+    errors = {}
+    lock = threading.Lock()
+
+    def one(_):
+        path = scenario.path(context)
+        body = scenario.body(context) if scenario.body else None
+        try:
+            status, elapsed, queries, data = client.request(scenario.method, path, body)
+        except Exception as e:
+            status, elapsed, queries, data = type(e).__name__, None, None, b''
+        with lock:
+            if elapsed is not None:
+                latencies.append(elapsed)
+            if queries is not None:
+                query_counts.append(int(queries))
+            if not isinstance(status, int) or status >= 400:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        if scenario.name == 'trips.create' and status == 201:
+            trip_id = json.loads(data)['data']['id']
+            with context._lock:
+                context.created_trips.append(trip_id)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark-client') as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    values = np.array(latencies) if latencies else np.array([np.nan])
+    return {
+        'method': scenario.method,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'throughput_rps': round(requests / wall, 1) if wall > 0 else None,
+        'mean_ms': round(float(np.mean(values)), 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'max_ms': round(float(np.max(values)), 2),
+        'mean_queries': round(float(np.mean(query_counts)), 1) if query_counts else None
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return `(rows, regressions)` comparing p95 and query counts per scenario"""
+    rows = []
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            rows.append((name, current, None, 'new' if baseline else ''))
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] if previous['p95_ms'] else 0.0
+        reasons = []
+        if change > threshold and current['p95_ms'] - previous['p95_ms'] > MIN_REGRESSION_MS:
+            reasons.append(f'p95 +{change:.0%}')
+        if (current.get('mean_queries') or 0) > (previous.get('mean_queries') or 0) + 0.5:
+            reasons.append(f"queries {previous.get('mean_queries')} -> {current.get('mean_queries')}")
+        if current['errors'] and not previous.get('errors'):
+            reasons.append('new errors')
+        if reasons:
+            regressions.append((name, reasons))
+        rows.append((name, current, previous, ', '.join(reasons) or f'{change:+.0%}'))
+    return rows, regressions
+
+
+def print_report(rows):
+    print()
+    print(f"{'scenario':40} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8} {'sql':>6} {'err':>5}  vs baseline")
+    for name, current, previous, verdict in rows:
+        errors = sum(current['errors'].values())
+        print(f"{name:40} {current['p50_ms']:8.1f} {current['p95_ms']:8.1f} {current['p99_ms']:8.1f} "
+              f"{current['throughput_rps'] or 0:8.1f} {current['mean_queries'] if current['mean_queries'] is not None else '-':>6} "
+              f"{errors:5d}  {verdict}")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the HTTP benchmark suite.')
+    parser.add_argument('--vehicles', type=int, default=5000)
+    parser.add_argument('--drivers', type=int, default=10000)
+    parser.add_argument('--trips', type=int, default=1000000)
+    parser.add_argument('--maintenance', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--regenerate', action='store_true', help='rebuild the cached dataset')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario (default 200)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients (default 8)')
+    parser.add_argument('--only', action='append', help='run scenarios whose name starts with this (repeatable)')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative p95 increase before flagging a regression (default 0.20)')
+    args = parser.parse_args()
+
+    database = prepare_database(args)
+    server, app = start_server(database, args.port)
+    try:
+        from src.models import Vehicle, Driver, Trip, Maintenance
+        with app.app_context():
+            counts = {
+                'vehicles': Vehicle.query.count(),
+                'drivers': Driver.query.count(),
+                'trips': Trip.query.count(),
+                'maintenance': Maintenance.query.count()
+            }
+        client = Client(args.port, login(args.port, 'admin', 'admin123'))
+        context = Context(args.seed, counts)
+
+        scenarios = [scenario for scenario in build_scenarios()
+                     if not args.only or any(scenario.name.startswith(prefix) for prefix in args.only)]
+        results = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dataset': counts,
+            'settings': {'requests': args.requests, 'concurrency': args.concurrency, 'seed': args.seed},
+            'scenarios': {}
+        }
+        for scenario in scenarios:
+            requests = scenario.requests or args.requests
+            concurrency = scenario.concurrency or args.concurrency
+            print(f'  {scenario.name} ({requests} requests, {concurrency} clients)', flush=True)
+            results['scenarios'][scenario.name] = run_scenario(client, context, scenario, requests, concurrency)
+    finally:
+        server.shutdown()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    rows, regressions = compare(results, baseline, args.threshold)
+    print_report(rows)
+    print(f'\nResults saved to {output}')
+
+    if args.save_baseline:
+        shutil.copyfile(output, args.baseline)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) against {args.baseline}:')
+        for name, reasons in regressions:
+            print(f"  {name}: {', '.join(reasons)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
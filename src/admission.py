@@ -0,0 +1,256 @@
+"""Admission control: per-user rate limits, concurrency limits and load shedding.
+
+Every API request belongs to an endpoint class: `writes` (POST, PUT, PATCH,
+DELETE), `analytics` (the analytics blueprint), `exports` (bulk sync) or
+`reads`; a view can pick its class with `@admission_class(name)`.
+
+- Rate limits are token buckets per caller (user id from the JWT, or the
+  client address when anonymous) and class: `rate` tokens per second up to
+  `burst`, both scaled by the caller's role. An empty bucket answers `429`
+  with `Retry-After`.
+- Classes with a concurrency limit admit that many requests at once per
+  process; the next ones wait up to `ADMISSION_QUEUE_TIMEOUT` seconds for a
+  slot. When `ADMISSION_MAX_QUEUE` requests are already waiting, or the
+  wait times out, the request is shed with `503` and `Retry-After`.
+
+Limits are configured with `RATE_LIMITS` / `CONCURRENCY_LIMITS` (a dict in
+the app config, or `class=rate/burst,...` and `class=n,...` in the
+environment) and are per process. `ADMISSION_ENABLED=0` turns it all off.
+Decisions, queue depth and waiting time are exported through src/metrics.py.
+"""
+
+import math
+import os
+import threading
+import time
+
+import jwt
+from flask import g, request, current_app, jsonify
+
+from src.metrics import metrics, LATENCY_BUCKETS
+
+# class -> (tokens per second, burst)
+DEFAULT_RATE_LIMITS = {
+    'reads': (10.0, 60),
+    'writes': (2.0, 20),
+    'analytics': (1.0, 15),
+    'exports': (0.1, 3)
+}
+# class -> requests served at once per process
+DEFAULT_CONCURRENCY_LIMITS = {
+    'analytics': 4,
+    'exports': 2
+}
+# Multiplier on rate and burst; None is an anonymous caller
+ROLE_MULTIPLIERS = {
+    'admin': 2.0,
+    'manager': 1.0,
+    'driver': 1.0,
+    None: 0.5
+}
+BLUEPRINT_CLASSES = {
+    'analytics': 'analytics',
+    'sync': 'exports'
+}
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+DEFAULT_QUEUE_TIMEOUT = 2.0  # seconds
+DEFAULT_MAX_QUEUE = 8
+# Idle buckets are dropped once this many callers are tracked
+MAX_BUCKETS = 10000
+
+metrics.counter('admission_rejected_total', 'Requests refused by admission control.', ('class', 'reason'))
+metrics.gauge('admission_in_flight', 'Requests holding a concurrency slot.', ('class',))
+metrics.gauge('admission_queue_depth', 'Requests waiting for a concurrency slot.', ('class',))
+metrics.histogram('admission_queue_wait_seconds', 'Time spent waiting for a concurrency slot, in seconds.',
+                  ('class',), buckets=LATENCY_BUCKETS)
+
+_enabled = False
+_rate_limits = dict(DEFAULT_RATE_LIMITS)
+_queue_timeout = DEFAULT_QUEUE_TIMEOUT
+_max_queue = DEFAULT_MAX_QUEUE
+_gates = {}
+
+
+def admission_class(name):
+    """Decorator placing a view in an endpoint class other than the default"""
+    def decorator(f):
+        f.admission_class = name
+        return f
+    return decorator
+
+
+class TokenBuckets:
+    """Token buckets keyed by (caller, class), refilled lazily on each take"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, rate, burst):
+        """Take one token; returns 0 on success, else the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._prune(now)
+            return (1 - tokens) / rate if rate > 0 else float('inf')
+
+    def _prune(self, now):
+        # A bucket idle for a minute has refilled for every default rate
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated > 60:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class ConcurrencyGate:
+    """A bounded number of slots with a short, bounded queue in front"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.waiting = 0
+
+    def enter(self, timeout, max_queue):
+        """Take a slot; returns None on success, else 'queue_full' or 'queue_timeout'"""
+        if self._slots.acquire(blocking=False):
+            metrics.inc('admission_in_flight', (self.name,))
+            return None
+        with self._lock:
+            if self.waiting >= max_queue:
+                return 'queue_full'
+            self.waiting += 1
+        metrics.inc('admission_queue_depth', (self.name,))
+        started = time.perf_counter()
+        try:
+            acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+            metrics.inc('admission_queue_depth', (self.name,), amount=-1)
+            metrics.observe('admission_queue_wait_seconds', (self.name,), time.perf_counter() - started)
+        if not acquired:
+            return 'queue_timeout'
+        metrics.inc('admission_in_flight', (self.name,))
+        return None
+
+    def leave(self):
+        self._slots.release()
+        metrics.inc('admission_in_flight', (self.name,), amount=-1)
+
+
+buckets = TokenBuckets()
+
+
+def _endpoint_class():
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    name = getattr(view, 'admission_class', None)
+    if name:
+        return name
+    if request.method in WRITE_METHODS:
+        return 'writes'
+    return BLUEPRINT_CLASSES.get(request.blueprint, 'reads')
+
+
+def _caller():
+    """`(key, role)` from the bearer token without a database round trip"""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        try:
+            payload = jwt.decode(header[7:], current_app.config['SECRET_KEY'], algorithms=['HS256'])
+            return f"user:{payload['user_id']}", payload.get('role')
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    return f'addr:{request.remote_addr}', None
+
+
+def _refuse(status, reason, name, retry_after, message):
+    metrics.inc('admission_rejected_total', (name, reason))
+    response = jsonify({
+        'success': False,
+        'message': message
+    })
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _before_request():
+    if request.method == 'OPTIONS' or not request.path.startswith('/api/'):
+        return None
+
+    name = _endpoint_class()
+    limit = _rate_limits.get(name)
+    if limit is not None:
+        key, role = _caller()
+        scale = ROLE_MULTIPLIERS.get(role, 1.0)
+        rate, burst = limit[0] * scale, max(1.0, limit[1] * scale)
+        wait = buckets.take((key, name), rate, burst)
+        if wait:
+            return _refuse(429, 'rate_limited', name, wait, 'Too many requests, please retry later')
+
+    gate = _gates.get(name)
+    if gate is not None:
+        refused = gate.enter(_queue_timeout, _max_queue)
+        if refused:
+            return _refuse(503, refused, name, _queue_timeout, 'Server is busy, please retry later')
+        g.admission_gate = gate
+    return None
+
+
+def _teardown_request(exception=None):
+    gate = g.pop('admission_gate', None)
+    if gate is not None:
+        gate.leave()
+
+
+def _parse_limits(value, parse):
+    """`class=spec,...` from the environment into a dict"""
+    limits = {}
+    for part in (value or '').split(','):
+        if part.strip():
+            name, _, spec = part.partition('=')
+            limits[name.strip()] = parse(spec.strip())
+    return limits
+
+
+def _rate_spec(spec):
+    rate, _, burst = spec.partition('/')
+    return float(rate), float(burst or rate)
+
+
+def init_app(app):
+    """Install the admission hooks according to the app config and environment"""
+    global _enabled, _rate_limits, _queue_timeout, _max_queue, _gates
+
+    _enabled = str(app.config.get('ADMISSION_ENABLED', os.environ.get('ADMISSION_ENABLED', '1'))) != '0'
+    _rate_limits = dict(DEFAULT_RATE_LIMITS)
+    _rate_limits.update(app.config.get('RATE_LIMITS') or _parse_limits(os.environ.get('RATE_LIMITS'), _rate_spec))
+    concurrency = dict(DEFAULT_CONCURRENCY_LIMITS)
+    concurrency.update(app.config.get('CONCURRENCY_LIMITS') or
+                       _parse_limits(os.environ.get('CONCURRENCY_LIMITS'), int))
+    _queue_timeout = float(app.config.get('ADMISSION_QUEUE_TIMEOUT',
+                                          os.environ.get('ADMISSION_QUEUE_TIMEOUT', DEFAULT_QUEUE_TIMEOUT)))
+    _max_queue = int(app.config.get('ADMISSION_MAX_QUEUE', os.environ.get('ADMISSION_MAX_QUEUE', DEFAULT_MAX_QUEUE)))
+
+    # A limit of None turns rate limiting off for that class
+    for name, limit in _rate_limits.items():
+        if limit is not None and (limit[0] <= 0 or limit[1] < 1):
+            raise ValueError(f'Invalid rate limit for {name}: rate must be positive and burst at least 1')
+    # A limit of 0 (or less) means no concurrency limit for that class
+    _gates = {name: ConcurrencyGate(name, limit) for name, limit in concurrency.items() if limit > 0}
+
+    if _enabled:
+        app.before_request(_before_request)
+        app.teardown_request(_teardown_request)
@@ -0,0 +1,212 @@
+"""Rolling fuel-efficiency statistics and anomaly detection per vehicle.
+
+Each vehicle keeps an exponentially weighted mean and variance of its km/l.
+Every completed trip is scored against the statistics *before* it is folded
+in; trips more than `Z_THRESHOLD` standard deviations away are recorded as
+`FuelAnomaly` rows (low = possible theft, leak or failing injector; high =
+usually a bad fuel or odometer reading).
+
+`record_trip_efficiency()` applies one trip incrementally, in the order
+trips become completed, while `backfill()` replays the whole history,
+archived trips included, vectorized across vehicles in `(trip_date,
+end_time, id)` order. The two agree when trips complete in that order; a
+trip completed late or edited afterwards is folded in at a different point,
+so the EWMA, and which trips are flagged, can differ until the next
+backfill. Anomalies are only kept for trips still in the hot table, as
+archiving drops them.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select, insert, delete
+
+from src.models import db, Trip, VehicleEfficiencyStats, FuelAnomaly
+from src.archive import trip_source
+
+# Weight of the newest trip; 0.1 roughly averages the last 20 trips
+EWMA_ALPHA = 0.1
+Z_THRESHOLD = 3.0
+# Trips needed before a vehicle's statistics are trusted for flagging
+WARMUP_SAMPLES = 5
+# Lower bound on the std (as a share of the mean) so very steady vehicles do
+# not flag every small wobble
+MIN_STD_RATIO = 0.05
+
+
+def _step(mean, variance, count, value):
+    """Score `value` and fold it into the statistics.
+
+    Works on scalars and on NumPy arrays alike. Returns
+    `(mean, variance, count, z_score, expected_std, is_anomaly)`; the z-score
+    and std describe the statistics before the update. Outliers are clipped to
+    the threshold before being folded in, so one bad reading cannot drag the
+    mean or blow up the variance.
+    """
+    fresh = count == 0
+    scale = np.maximum(np.sqrt(variance), MIN_STD_RATIO * np.abs(mean))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z_score = np.where(fresh | (scale == 0), 0.0, (value - mean) / scale)
+    is_anomaly = (count >= WARMUP_SAMPLES) & (np.abs(z_score) >= Z_THRESHOLD)
+
+    clipped = np.clip(value, mean - Z_THRESHOLD * scale, mean + Z_THRESHOLD * scale)
+    diff = clipped - mean
+    increment = EWMA_ALPHA * diff
+    new_mean = np.where(fresh, value, mean + increment)
+    new_variance = np.where(fresh, 0.0, (1 - EWMA_ALPHA) * (variance + diff * increment))
+    return new_mean, new_variance, count + 1, z_score, scale, is_anomaly
+
+
+def _anomaly_row(trip_id, vehicle_id, trip_date, value, mean, scale, z_score):
+    return {
+        'trip_id': trip_id,
+        'vehicle_id': vehicle_id,
+        'trip_date': trip_date,
+        'km_per_liter': value,
+        'expected_km_per_liter': mean,
+        'expected_std': scale,
+        'z_score': z_score,
+        'direction': 'low' if z_score < 0 else 'high'
+    }
+
+
+def record_trip_efficiency(trip):
+    """Update the vehicle's rolling statistics with a completed trip.
+
+    Adds the changes to the current session without committing; returns the
+    new `FuelAnomaly` when the trip is flagged, otherwise None.
+    """
+    value = trip.get_fuel_efficiency()
+    if value is None:
+        return None
+
+    stats = VehicleEfficiencyStats.query.filter_by(vehicle_id=trip.vehicle_id).first()
+    if stats is None:
+        stats = VehicleEfficiencyStats(vehicle_id=trip.vehicle_id, ewma_mean=0.0, ewma_variance=0.0, sample_count=0)
+        db.session.add(stats)
+
+    previous_mean = stats.ewma_mean
+    mean, variance, count, z_score, scale, is_anomaly = _step(
+        stats.ewma_mean, stats.ewma_variance, stats.sample_count, value
+    )
+    stats.ewma_mean = float(mean)
+    stats.ewma_variance = float(variance)
+    stats.sample_count = int(count)
+    stats.last_trip_id = trip.id
+
+    if not is_anomaly:
+        return None
+
+    anomaly = FuelAnomaly(**_anomaly_row(
+        trip.id, trip.vehicle_id, trip.trip_date, value, previous_mean, float(scale), float(z_score)
+    ))
+    db.session.add(anomaly)
+    return anomaly
+
+
+def _load_trips():
+    """Completed trips (hot and archived) with a usable km/l, sorted by vehicle then time"""
+    trips = trip_source()
+    rows = db.session.query(
+        trips.id, trips.vehicle_id, trips.trip_date, trips.distance, trips.fuel_used
+    ).filter(
+        trips.status == 'completed',
+        trips.distance > 0,
+        trips.fuel_used > 0
+    ).order_by(trips.vehicle_id, trips.trip_date, trips.end_time, trips.id).all()
+
+    count = len(rows)
+    trip_ids = np.empty(count, dtype=np.int64)
+    vehicle_ids = np.empty(count, dtype=np.int64)
+    values = np.empty(count, dtype=np.float64)
+    dates = []
+    for i, (trip_id, vehicle_id, trip_date, distance, fuel_used) in enumerate(rows):
+        trip_ids[i] = trip_id
+        vehicle_ids[i] = vehicle_id
+        values[i] = distance / fuel_used
+        dates.append(trip_date)
+    return trip_ids, vehicle_ids, values, dates
+
+
+def backfill():
+    """Rebuild every vehicle's statistics and anomalies from trip history.
+
+    Trips are laid out vehicle by vehicle; the loop walks trip positions
+    (first trip of every vehicle, then the second, ...) and updates all
+    vehicles that have a trip at that position in one array operation.
+    """
+    started = time.monotonic()
+    trip_ids, vehicle_ids, values, dates = _load_trips()
+
+    vehicles, offsets, lengths = np.unique(vehicle_ids, return_index=True, return_counts=True)
+    size = vehicles.size
+    mean = np.zeros(size)
+    variance = np.zeros(size)
+    count = np.zeros(size, dtype=np.int64)
+
+    expected = np.zeros(values.size)
+    scales = np.zeros(values.size)
+    z_scores = np.zeros(values.size)
+    flagged = np.zeros(values.size, dtype=bool)
+
+    for position in range(int(lengths.max()) if size else 0):
+        active = np.nonzero(lengths > position)[0]
+        rows = offsets[active] + position
+        expected[rows] = mean[active]
+        (mean[active], variance[active], count[active],
+         z_scores[rows], scales[rows], flagged[rows]) = _step(
+            mean[active], variance[active], count[active], values[rows]
+        )
+
+    stats = [
+        {
+            'vehicle_id': int(vehicles[i]),
+            'ewma_mean': float(mean[i]),
+            'ewma_variance': float(variance[i]),
+            'sample_count': int(count[i]),
+            'last_trip_id': int(trip_ids[offsets[i] + lengths[i] - 1]),
+            'updated_at': datetime.utcnow()
+        }
+        for i in range(size)
+    ]
+    # Archived trips shape the statistics but keep no anomaly rows
+    hot = np.fromiter(db.session.scalars(select(Trip.id).where(Trip.status == 'completed')), dtype=np.int64)
+    flagged &= np.isin(trip_ids, hot)
+    anomalies = [
+        _anomaly_row(int(trip_ids[i]), int(vehicle_ids[i]), dates[i], float(values[i]),
+                     float(expected[i]), float(scales[i]), float(z_scores[i]))
+        for i in np.nonzero(flagged)[0]
+    ]
+
+    try:
+        db.session.execute(delete(FuelAnomaly))
+        db.session.execute(delete(VehicleEfficiencyStats))
+        if stats:
+            db.session.execute(insert(VehicleEfficiencyStats), stats)
+        if anomalies:
+            db.session.execute(insert(FuelAnomaly), anomalies)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'vehicles': int(size),
+        'trips': int(values.size),
+        'anomalies': len(anomalies),
+        'duration_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+if __name__ == '__main__':
+    from src.main import app
+
+    with app.app_context():
+        summary = backfill()
+        print(f"Replayed {summary['trips']} trips for {summary['vehicles']} vehicles "
+              f"in {summary['duration_ms']} ms; {summary['anomalies']} anomalies found.")
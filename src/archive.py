@@ -0,0 +1,310 @@
+"""Hot/cold archival of closed trips and maintenance records.
+
+Completed or cancelled trips and completed maintenance older than
+`ARCHIVE_AFTER_DAYS` (365 by default) are moved, in batches, from the main
+tables into tables of the same shape in an `archive` schema: on SQLite a
+separate database file ATTACHed to every connection (`ARCHIVE_DATABASE`,
+by default next to the main database), elsewhere a plain schema.
+
+All-time figures stay exact through `ArchivedTripRollup` and
+`ArchivedMaintenanceRollup`, updated in the same transaction as each move.
+Date-bounded reads use `trip_source()` / `maintenance_source()`, which return
+the plain model while the requested range stays clear of the archive and a
+union of both tables once it reaches it. Archived rows are read-only, are
+not in the full-text index and no longer feed the fuel-anomaly statistics.
+
+SQLite hands a new row `max(id) + 1` of its own table, which can be an id
+already archived once the newest hot rows are deleted. On SQLite, new trips
+and maintenance records therefore get their id from `next_id()`, above
+both the hot and the archived ids.
+"""
+
+import os
+import weakref
+from datetime import date, timedelta
+
+from flask import g, has_app_context
+from sqlalchemy import MetaData, Table, Column, Index, event, select, insert, delete, func, case, text, union_all
+from sqlalchemy.orm import aliased
+
+from src.models import db, Trip, Maintenance, FuelAnomaly, ArchivedTripRollup, ArchivedMaintenanceRollup
+from src.listing import ensure_columns
+
+ARCHIVE_SCHEMA = 'archive'
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+DEFAULT_BATCH_SIZE = 5000
+
+CLOSED_TRIP_STATUSES = ('completed', 'cancelled')
+CLOSED_MAINTENANCE_STATUSES = ('completed',)
+
+archive_metadata = MetaData(schema=ARCHIVE_SCHEMA)
+
+_archive_after_days = DEFAULT_ARCHIVE_AFTER_DAYS
+_batch_size = DEFAULT_BATCH_SIZE
+# SQLite engines with the archive attached (see next_id())
+_attached_engines = weakref.WeakSet()
+
+
+def _archive_table(model, indexed):
+    """Copy of a model's table in the archive schema, without foreign keys"""
+    source = model.__table__
+    table = Table(source.name, archive_metadata, *(
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in source.columns
+    ))
+    for name in indexed:
+        Index(f'ix_archive_{source.name}_{name}', table.c[name])
+    return table
+
+
+archived_trip = _archive_table(Trip, ('trip_date', 'vehicle_id', 'driver_id'))
+archived_maintenance = _archive_table(Maintenance, ('date', 'vehicle_id'))
+
+# table name -> (model, date column name, archive table)
+ARCHIVED = {
+    'trip': (Trip, 'trip_date', archived_trip),
+    'maintenance': (Maintenance, 'date', archived_maintenance)
+}
+
+
+def _default_archive_path(database):
+    if not database or database == ':memory:':
+        return ':memory:'
+    return f'{os.path.splitext(database)[0]}-archive.db'
+
+
+def init_app(app):
+    """Attach (or create) the archive and read the archival settings"""
+    global _archive_after_days, _batch_size
+
+    _archive_after_days = int(app.config.get('ARCHIVE_AFTER_DAYS',
+                                             os.environ.get('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)))
+    _batch_size = int(app.config.get('ARCHIVE_BATCH_SIZE',
+                                     os.environ.get('ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)))
+    if _archive_after_days < 1:
+        raise ValueError('ARCHIVE_AFTER_DAYS must be at least 1')
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            path = app.config.get('ARCHIVE_DATABASE',
+                                  os.environ.get('ARCHIVE_DATABASE', _default_archive_path(engine.url.database)))
+
+            @event.listens_for(engine, 'connect')
+            def _attach_archive(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (path,))
+                cursor.close()
+
+            # Connections opened before the listener existed lack the ATTACH
+            engine.dispose()
+            _attached_engines.add(engine)
+        else:
+            with engine.begin() as connection:
+                connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}'))
+        archive_metadata.create_all(engine)
+        ensure_columns(archive_metadata)
+
+
+def next_id(connection, table_name):
+    """An id for a new `trip` or `maintenance` row, above every hot and archived id"""
+    model, _, table = ARCHIVED[table_name]
+    hot = select(func.max(model.__table__.c.id)).scalar_subquery()
+    archived = select(func.max(table.c.id)).scalar_subquery()
+    # Two-argument max() is SQLite's scalar maximum
+    return connection.execute(select(func.max(func.coalesce(hot, 0), func.coalesce(archived, 0)))).scalar() + 1
+
+
+def assign_ids(connection, table_name, rows):
+    """Give bulk-inserted rows (dicts) ids from `next_id()` where SQLite needs them"""
+    if connection.engine in _attached_engines:
+        first = next_id(connection, table_name)
+        for offset, row in enumerate(rows):
+            row['id'] = first + offset
+    return rows
+
+
+def _allocate_ids(table_name, model):
+    @event.listens_for(model, 'before_insert')
+    def _before_insert(mapper, connection, target):
+        if target.id is None and connection.engine in _attached_engines:
+            target.id = next_id(connection, table_name)
+
+
+for _table_name, (_model, _, _) in ARCHIVED.items():
+    _allocate_ids(_table_name, _model)
+
+
+def newest_archived(table_name):
+    """Latest date held in the archive for `trip` or `maintenance`, or None"""
+    cache = g.setdefault('archive_newest', {}) if has_app_context() else {}
+    if table_name not in cache:
+        _, date_name, table = ARCHIVED[table_name]
+        cache[table_name] = db.session.execute(select(func.max(table.c[date_name]))).scalar()
+    return cache[table_name]
+
+
+def _source(table_name, start_date):
+    model, _, table = ARCHIVED[table_name]
+    newest = newest_archived(table_name)
+    if newest is None or (start_date is not None and start_date > newest):
+        return model
+    combined = union_all(
+        select(*model.__table__.columns),
+        select(*(table.c[column.name] for column in model.__table__.columns))
+    ).subquery(f'{table_name}_all')
+    return aliased(model, combined, adapt_on_names=True)
+
+
+def trip_source(start_date=None):
+    """`Trip`, or an alias over trips and archived trips if `start_date` reaches the archive"""
+    return _source('trip', start_date)
+
+
+def maintenance_source(start_date=None):
+    """`Maintenance`, or an alias over both tables if `start_date` reaches the archive"""
+    return _source('maintenance', start_date)
+
+
+def find_archived(model, record_id):
+    """Load an archived trip or maintenance record by id (read-only)"""
+    _, _, table = ARCHIVED[model.__tablename__]
+    archived = aliased(model, table, adapt_on_names=True)
+    return db.session.query(archived).filter(archived.id == record_id).first()
+
+
+def archived_trip_totals(*group_by):
+    """Sums over the archived trips' rollups as a subquery, grouped by rollup columns"""
+    keys = [getattr(ArchivedTripRollup, name).label(name) for name in group_by]
+    return db.session.query(
+        *keys,
+        func.sum(ArchivedTripRollup.trip_count).label('trip_count'),
+        func.sum(ArchivedTripRollup.total_distance).label('total_distance'),
+        func.sum(ArchivedTripRollup.total_fuel).label('total_fuel'),
+        func.sum(ArchivedTripRollup.efficiency_distance).label('efficiency_distance'),
+        func.sum(ArchivedTripRollup.efficiency_fuel).label('efficiency_fuel')
+    ).group_by(*keys).subquery()
+
+
+def archived_maintenance_totals(vehicle_id):
+    """`(record_count, total_cost)` of a vehicle's archived maintenance"""
+    count, cost = db.session.query(
+        func.coalesce(func.sum(ArchivedMaintenanceRollup.record_count), 0),
+        func.coalesce(func.sum(ArchivedMaintenanceRollup.total_cost), 0.0)
+    ).filter(ArchivedMaintenanceRollup.vehicle_id == vehicle_id).one()
+    return count, cost
+
+
+def has_archived_trips(vehicle_id=None, driver_id=None):
+    query = ArchivedTripRollup.query
+    if vehicle_id is not None:
+        query = query.filter(ArchivedTripRollup.vehicle_id == vehicle_id)
+    if driver_id is not None:
+        query = query.filter(ArchivedTripRollup.driver_id == driver_id)
+    return query.first() is not None
+
+
+def has_archived_maintenance(vehicle_id):
+    return ArchivedMaintenanceRollup.query.filter(ArchivedMaintenanceRollup.vehicle_id == vehicle_id).first() is not None
+
+
+def _fold_rollups(rollup_model, keys, rows, measures):
+    """Add per-key totals of the rows being archived onto the rollup table"""
+    if not rows:
+        return
+    vehicle_ids = {row[0] for row in rows}
+    existing = {
+        tuple(getattr(rollup, key) for key in keys): rollup
+        for rollup in rollup_model.query.filter(rollup_model.vehicle_id.in_(vehicle_ids))
+    }
+    for row in rows:
+        key = tuple(row[:len(keys)])
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = rollup_model(**dict(zip(keys, key)), **{name: 0 for name in measures})
+            db.session.add(rollup)
+        for name, value in zip(measures, row[len(keys):]):
+            setattr(rollup, name, getattr(rollup, name) + (value or 0))
+
+
+def _fold_trips(batch):
+    efficient = (Trip.distance > 0) & (Trip.fuel_used > 0)
+    rows = db.session.query(
+        Trip.vehicle_id, Trip.driver_id, Trip.status,
+        func.count(Trip.id),
+        func.sum(Trip.distance),
+        func.sum(Trip.fuel_used),
+        func.sum(case((efficient, Trip.distance), else_=0)),
+        func.sum(case((efficient, Trip.fuel_used), else_=0))
+    ).filter(*batch).group_by(Trip.vehicle_id, Trip.driver_id, Trip.status).all()
+    _fold_rollups(ArchivedTripRollup, ('vehicle_id', 'driver_id', 'status'), rows,
+                  ('trip_count', 'total_distance', 'total_fuel', 'efficiency_distance', 'efficiency_fuel'))
+
+
+def _fold_maintenance(batch):
+    rows = db.session.query(
+        Maintenance.vehicle_id, Maintenance.maintenance_type,
+        func.count(Maintenance.id),
+        func.sum(Maintenance.cost)
+    ).filter(*batch).group_by(Maintenance.vehicle_id, Maintenance.maintenance_type).all()
+    _fold_rollups(ArchivedMaintenanceRollup, ('vehicle_id', 'maintenance_type'), rows,
+                  ('record_count', 'total_cost'))
+
+
+def _move(table_name, eligible, fold, before_delete=None, batch_size=None):
+    """Move the rows matching `eligible` to the archive, one batch per transaction"""
+    model, _, table = ARCHIVED[table_name]
+    columns = [column.name for column in model.__table__.columns]
+    batch_size = batch_size or _batch_size
+
+    moved = 0
+    while True:
+        ids = select(model.id).where(*eligible).order_by(model.id).limit(batch_size).subquery()
+        upper = db.session.execute(select(func.max(ids.c.id))).scalar()
+        if upper is None:
+            break
+        batch = (*eligible, model.id <= upper)
+        try:
+            db.session.execute(insert(table).from_select(
+                columns, select(*(model.__table__.c[name] for name in columns)).where(*batch)
+            ))
+            fold(batch)
+            if before_delete is not None:
+                before_delete(batch)
+            result = db.session.execute(
+                delete(model).where(*batch).execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += result.rowcount
+    return moved
+
+
+def _drop_fuel_anomalies(batch):
+    db.session.execute(
+        delete(FuelAnomaly).where(FuelAnomaly.trip_id.in_(select(Trip.id).where(*batch)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def archive_old_records(older_than_days=None, today=None, batch_size=None):
+    """Move closed trips and maintenance older than the cut-off to the archive"""
+    older_than_days = _archive_after_days if older_than_days is None else older_than_days
+    if older_than_days < 1:
+        raise ValueError('older_than_days must be at least 1')
+    cutoff = (today or date.today()) - timedelta(days=older_than_days)
+
+    trips = _move('trip', (
+        Trip.status.in_(CLOSED_TRIP_STATUSES),
+        Trip.trip_date < cutoff
+    ), _fold_trips, before_delete=_drop_fuel_anomalies, batch_size=batch_size)
+    maintenance = _move('maintenance', (
+        Maintenance.status.in_(CLOSED_MAINTENANCE_STATUSES),
+        Maintenance.date < cutoff
+    ), _fold_maintenance, batch_size=batch_size)
+
+    if has_app_context():
+        g.pop('archive_newest', None)
+    return {'cutoff': cutoff.isoformat(), 'trips': trips, 'maintenance': maintenance}
@@ -0,0 +1,125 @@
+"""Vehicle and driver availability, and double-booking checks for trips.
+
+Only open trips (planned or in progress) hold a vehicle or driver. A trip
+occupies `[start_time, end_time)`; the missing ends are filled in as:
+
+- no `start_time`: it starts at midnight of its `trip_date`
+- no `end_time`, in progress: it runs until completed (open-ended)
+- no `end_time`, planned: it lasts until the end of the day it starts
+
+Overlaps are answered in SQL from the `(vehicle_id, status, busy_from)` and
+`(driver_id, status, busy_from)` indexes on `trip`, where `busy_from` is
+`start_time`, or midnight of `trip_date` when there is none. SQLite keeps
+DATETIME values as `'YYYY-MM-DD HH:MM:SS.ffffff'` text and DATE values as
+`'YYYY-MM-DD'`, so the date is padded to the same format before the two are
+coalesced; compared bare, `'2027-03-10'` sorts before every time on that
+day. A lookup only ever touches the open trips of one vehicle or driver. The planned-trip rule above keeps the end side a
+plain comparison: such a trip overlaps a window starting at `start` exactly
+when it starts on or after midnight of `start`'s day.
+"""
+
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func, and_, or_, exists, select, literal_column
+
+from src.models import Trip, Vehicle, Driver
+
+OPEN_TRIP_STATUSES = ('planned', 'in_progress')
+
+# Matches the expression indexed by ix_trip_vehicle_busy / ix_trip_driver_busy
+busy_from = func.coalesce(
+    Trip.start_time, Trip.trip_date.op('||')(literal_column("' 00:00:00.000000'")),
+    type_=Trip.start_time.type
+)
+
+
+class BookingConflict(Exception):
+    def __init__(self, message, trips):
+        super().__init__(message)
+        self.trips = trips
+
+
+def trip_window(trip_date, start_time=None, end_time=None, status='planned'):
+    """`(start, end)` a trip occupies; `end` is None while it is open-ended"""
+    start = start_time or datetime.combine(trip_date, time.min)
+    if end_time is not None:
+        return start, end_time
+    if status == 'in_progress':
+        return start, None
+    return start, datetime.combine(start.date() + timedelta(days=1), time.min)
+
+
+def parse_window(start, end):
+    """Validate the `from`/`to` query arguments; raises ValueError"""
+    if not start or not end:
+        raise ValueError('Both from and to are required (ISO date or datetime)')
+    try:
+        start, end = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    except ValueError:
+        raise ValueError('Invalid from/to format. Use ISO format')
+    if end <= start:
+        raise ValueError('to must be after from')
+    return start, end
+
+
+def overlaps(start, end):
+    """Condition on `Trip`: an open trip occupying part of `[start, end)` (`end` None: no end)"""
+    conditions = [
+        Trip.status.in_(OPEN_TRIP_STATUSES),
+        or_(
+            Trip.end_time > start,
+            and_(Trip.end_time.is_(None), Trip.status == 'in_progress'),
+            and_(Trip.end_time.is_(None), busy_from >= datetime.combine(start.date(), time.min))
+        )
+    ]
+    if end is not None:
+        conditions.append(busy_from < end)
+    return and_(*conditions)
+
+
+def conflicting_trips(start, end, vehicle_id=None, driver_id=None, exclude_trip_id=None):
+    """Open trips of the vehicle or the driver that overlap `[start, end)`"""
+    holders = []
+    if vehicle_id is not None:
+        holders.append(Trip.vehicle_id == vehicle_id)
+    if driver_id is not None:
+        holders.append(Trip.driver_id == driver_id)
+    if not holders:
+        return []
+    query = Trip.query.filter(or_(*holders), overlaps(start, end))
+    if exclude_trip_id is not None:
+        query = query.filter(Trip.id != exclude_trip_id)
+    return query.order_by(busy_from, Trip.id).all()
+
+
+def check_trip_booking(trip_date, start_time, end_time, status, vehicle_id, driver_id, exclude_trip_id=None):
+    """Raise BookingConflict if an open trip would double-book the vehicle or driver"""
+    if status not in OPEN_TRIP_STATUSES:
+        return
+    start, end = trip_window(trip_date, start_time, end_time, status)
+    if end is not None and end <= start:
+        raise ValueError('end_time must be after start_time')
+    trips = conflicting_trips(start, end, vehicle_id, driver_id, exclude_trip_id)
+    if not trips:
+        return
+    booked = []
+    if any(trip.vehicle_id == vehicle_id for trip in trips):
+        booked.append('Vehicle')
+    if any(trip.driver_id == driver_id for trip in trips):
+        booked.append('Driver')
+    raise BookingConflict(f"{' and '.join(booked)} already booked for an overlapping trip", trips)
+
+
+def available_vehicles(start, end, fuel_type=None):
+    """Active vehicles without an open trip overlapping `[start, end)`"""
+    busy = exists(select(Trip.id).where(Trip.vehicle_id == Vehicle.id, overlaps(start, end)))
+    query = Vehicle.query.filter(Vehicle.status == 'active', ~busy)
+    if fuel_type:
+        query = query.filter(Vehicle.fuel_type == fuel_type)
+    return query.order_by(Vehicle.reg_no).all()
+
+
+def available_drivers(start, end):
+    """Active drivers without an open trip overlapping `[start, end)`"""
+    busy = exists(select(Trip.id).where(Trip.driver_id == Driver.id, overlaps(start, end)))
+    return Driver.query.filter(Driver.status == 'active', ~busy).order_by(Driver.name).all()
@@ -0,0 +1,372 @@
+"""Optional columnar snapshot of trips for the analytics endpoints.
+
+With `COLUMNAR_STORE=1` the analytics that scan every trip (trips per
+vehicle/driver, fuel efficiency, vehicle utilization) are answered from typed
+NumPy columns instead of SQL: `id`, `vehicle_id`, `driver_id`, `trip_date`
+(date ordinal), `status` (code), `distance`, `fuel_used` (NaN when unknown)
+and `updated_at` (epoch seconds). Filters are boolean masks and group-bys
+are `np.bincount`, so a full scan touches only the columns it needs.
+
+Layout, under `COLUMNAR_STORE_DIR` (default: next to the SQLite database):
+
+    CURRENT          name of the live generation
+    gen-<n>/*.npy    the compacted base, one file per column, sorted by id
+    gen-<n>/delta    fixed-size records appended after every committed trip
+                     insert, update or delete (deletes have status -1)
+
+Base columns are opened with `mmap_mode='r'`, so every worker process shares
+the same page-cache pages. For each trip id the record with the newest
+`updated_at` wins, whether it sits in the base or the delta. `compact()`
+rewrites the base from the database (hot and archived trips, so archival
+does not change the answers) into a new generation and carries over the
+delta records appended meanwhile; it runs at startup when there is no
+snapshot and then from the `columnar_compact` job, which also picks up bulk
+loads that bypass the ORM. Writers and the generation switch serialize on
+an `flock` on `LOCK`.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import fcntl
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import event, select, cast, String
+from sqlalchemy.orm import Session, object_session
+
+from src.models import db, Trip
+from src.archive import trip_source
+
+STATUS_CODES = {'planned': 0, 'in_progress': 1, 'completed': 2, 'cancelled': 3}
+DELETED = -1
+
+RECORD = np.dtype([
+    ('id', '<i8'),
+    ('vehicle_id', '<i4'),
+    ('driver_id', '<i4'),
+    ('trip_date', '<i4'),
+    ('status', 'i1'),
+    ('distance', '<f8'),
+    ('fuel_used', '<f8'),
+    ('updated_at', '<f8')
+])
+COLUMNS = RECORD.names
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.date().toordinal()
+READ_BATCH_SIZE = 100000
+
+_enabled = False
+_directory = None
+_reader_lock = threading.Lock()
+_snapshot = None
+
+
+def enabled():
+    return _enabled
+
+
+def _default_directory(database):
+    if not database or database == ':memory:':
+        return None
+    return f'{os.path.splitext(database)[0]}-columns'
+
+
+def init_app(app):
+    """Read the settings and build the first snapshot if there is none"""
+    global _enabled, _directory
+
+    _enabled = str(app.config.get('COLUMNAR_STORE', os.environ.get('COLUMNAR_STORE', '0'))) == '1'
+    if not _enabled:
+        return
+    with app.app_context():
+        _directory = app.config.get('COLUMNAR_STORE_DIR', os.environ.get(
+            'COLUMNAR_STORE_DIR', _default_directory(db.engine.url.database)))
+        if not _directory:
+            raise ValueError('COLUMNAR_STORE_DIR is required unless the database is a SQLite file')
+        os.makedirs(_directory, exist_ok=True)
+        if _current_generation() is None:
+            compact()
+
+
+@contextmanager
+def _locked():
+    with open(os.path.join(_directory, 'LOCK'), 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _current_generation():
+    try:
+        with open(os.path.join(_directory, 'CURRENT')) as handle:
+            return handle.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _generation_path(generation, name=''):
+    return os.path.join(_directory, generation, name)
+
+
+# Writes: collect the trips a transaction touched, append them once it commits
+
+def _record(trip, status=None, updated_at=None):
+    return (
+        trip.id,
+        trip.vehicle_id,
+        trip.driver_id,
+        trip.trip_date.toordinal() if trip.trip_date else 0,
+        STATUS_CODES.get(trip.status, DELETED) if status is None else status,
+        trip.distance if trip.distance is not None else np.nan,
+        trip.fuel_used if trip.fuel_used is not None else np.nan,
+        ((updated_at or trip.updated_at or datetime.utcnow()) - EPOCH).total_seconds()
+    )
+
+
+def _collect(target, status=None, updated_at=None):
+    if not _enabled:
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('columnar_pending', []).append(_record(target, status, updated_at))
+
+
+@event.listens_for(Trip, 'after_insert')
+def _trip_inserted(mapper, connection, target):
+    _collect(target)
+
+
+@event.listens_for(Trip, 'after_update')
+def _trip_updated(mapper, connection, target):
+    _collect(target)
+
+
+@event.listens_for(Trip, 'after_delete')
+def _trip_deleted(mapper, connection, target):
+    _collect(target, DELETED, datetime.utcnow())
+
+
+@event.listens_for(Session, 'after_commit')
+def _append_committed(session):
+    pending = session.info.pop('columnar_pending', None)
+    if pending and _enabled:
+        append(np.array(pending, dtype=RECORD))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('columnar_pending', None)
+
+
+def append(records):
+    """Append delta records to the live generation"""
+    with _locked():
+        generation = _current_generation()
+        if generation is None:
+            return
+        # One write per batch: O_APPEND keeps concurrent appends whole
+        with open(_generation_path(generation, 'delta'), 'ab') as handle:
+            handle.write(records.tobytes())
+
+
+# Compaction
+
+def _read_trips():
+    """Every hot and archived trip as column arrays, sorted by id"""
+    trips = trip_source()
+    statement = select(
+        trips.id, trips.vehicle_id, trips.driver_id, cast(trips.trip_date, String),
+        trips.status, trips.distance, trips.fuel_used, cast(trips.updated_at, String)
+    ).order_by(trips.id)
+
+    chunks = []
+    result = db.session.execute(statement.execution_options(yield_per=READ_BATCH_SIZE))
+    for rows in result.partitions():
+        ids, vehicles, drivers, dates, statuses, distances, fuel, updated = zip(*rows)
+        chunk = np.empty(len(rows), dtype=RECORD)
+        chunk['id'] = ids
+        chunk['vehicle_id'] = vehicles
+        chunk['driver_id'] = drivers
+        chunk['trip_date'] = np.array(dates, dtype='datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+        chunk['status'] = [STATUS_CODES.get(status, DELETED) for status in statuses]
+        chunk['distance'] = np.array(distances, dtype=np.float64)
+        chunk['fuel_used'] = np.array(fuel, dtype=np.float64)
+        updated = np.array([value or '1970-01-01' for value in updated], dtype='datetime64[us]')
+        chunk['updated_at'] = updated.astype(np.int64) / 1e6
+        chunks.append(chunk)
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD)
+
+
+def compact():
+    """Rewrite the base from the database into a new generation"""
+    started = time.monotonic()
+    with _locked():
+        started_from = _current_generation()
+        offset = _delta_size(started_from)
+
+    records = _read_trips()
+    generation = f'gen-{time.time_ns()}'
+    os.makedirs(_generation_path(generation))
+    for name in COLUMNS:
+        np.save(_generation_path(generation, f'{name}.npy'), np.ascontiguousarray(records[name]))
+
+    with _locked():
+        # Carry over what was appended while the base was being read
+        previous = _current_generation()
+        tail = b''
+        if previous is not None:
+            with open(_generation_path(previous, 'delta'), 'rb') as handle:
+                # Another compaction switched generations meanwhile: take all of it
+                handle.seek(offset if previous == started_from else 0)
+                tail = handle.read()
+        with open(_generation_path(generation, 'delta'), 'wb') as handle:
+            handle.write(tail)
+        with open(os.path.join(_directory, 'CURRENT.tmp'), 'w') as handle:
+            handle.write(generation)
+        os.replace(os.path.join(_directory, 'CURRENT.tmp'), os.path.join(_directory, 'CURRENT'))
+
+    # Processes still reading an old generation keep their mappings after the
+    # unlink; newer generations may belong to a compaction still in progress
+    for name in os.listdir(_directory):
+        if name.startswith('gen-') and name < generation:
+            shutil.rmtree(os.path.join(_directory, name), ignore_errors=True)
+
+    return {
+        'generation': generation,
+        'trips': int(records.size),
+        'carried_over': len(tail) // RECORD.itemsize,
+        'duration_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+def _delta_size(generation):
+    if generation is None:
+        return 0
+    try:
+        return os.path.getsize(_generation_path(generation, 'delta'))
+    except FileNotFoundError:
+        return 0
+
+
+# Reads
+
+class TripColumns:
+    """A consistent view of the store: the mmapped base plus the live delta rows"""
+
+    def __init__(self, generation, base, delta_records):
+        self.generation = generation
+        self.base = base
+        self.delta_records = delta_records
+        self.base_mask, self.delta = self._merge(base, delta_records)
+
+    @staticmethod
+    def _merge(base, records):
+        if records.size == 0:
+            return None, {name: np.empty(0, dtype=RECORD[name]) for name in COLUMNS}
+        # Newest record per id within the delta
+        order = np.lexsort((records['updated_at'], records['id']))
+        records = records[order]
+        last = np.r_[records['id'][1:] != records['id'][:-1], True]
+        records = records[last]
+
+        # ...then against the base row with the same id, if any
+        positions = np.searchsorted(base['id'], records['id'])
+        in_base = positions < base['id'].size
+        in_base[in_base] = base['id'][positions[in_base]] == records['id'][in_base]
+        newer = np.ones(records.size, dtype=bool)
+        newer[in_base] = records['updated_at'][in_base] >= base['updated_at'][positions[in_base]]
+
+        base_mask = np.ones(base['id'].size, dtype=bool)
+        base_mask[positions[in_base & newer]] = False
+        live = records[newer & (records['status'] != DELETED)]
+        return base_mask, {name: live[name] for name in COLUMNS}
+
+    def parts(self):
+        """`(columns, mask)` for the base and the delta; `mask` None means every row"""
+        return ((self.base, self.base_mask), (self.delta, None))
+
+    def group_sum(self, key, weights=None, where=None):
+        """Per-`key` sum of `weights` (row counts if None) over rows matching `where`"""
+        totals = np.zeros(0, dtype=np.int64 if weights is None else np.float64)
+        for columns, mask in self.parts():
+            selected = mask
+            if where is not None:
+                condition = where(columns)
+                selected = condition if selected is None else selected & condition
+            keys = columns[key] if selected is None else columns[key][selected]
+            values = None
+            if weights is not None:
+                values = columns[weights] if selected is None else columns[weights][selected]
+            partial = np.bincount(keys, weights=values)
+            if partial.size > totals.size:
+                partial[:totals.size] += totals
+                totals = partial
+            else:
+                totals[:partial.size] += partial
+        return totals
+
+    def distinct_count(self, key, value, where=None):
+        """Per-`key` number of distinct `value`s over rows matching `where`"""
+        pairs = []
+        for columns, mask in self.parts():
+            selected = mask
+            if where is not None:
+                condition = where(columns)
+                selected = condition if selected is None else selected & condition
+            keys = columns[key] if selected is None else columns[key][selected]
+            values = columns[value] if selected is None else columns[value][selected]
+            pairs.append(keys.astype(np.int64) << 32 | values.astype(np.int64))
+        unique = np.unique(np.concatenate(pairs))
+        return np.bincount((unique >> 32).astype(np.int64))
+
+
+def columns():
+    """The current `TripColumns`, or None when the store is off or not built yet"""
+    global _snapshot
+    if not _enabled:
+        return None
+    with _reader_lock:
+        generation = _current_generation()
+        if generation is None:
+            return None
+        snapshot = _snapshot
+        if snapshot is None or snapshot.generation != generation:
+            base = {name: np.load(_generation_path(generation, f'{name}.npy'), mmap_mode='r') for name in COLUMNS}
+            snapshot = TripColumns(generation, base, np.empty(0, dtype=RECORD))
+
+        size = _delta_size(generation) // RECORD.itemsize * RECORD.itemsize
+        known = snapshot.delta_records.size * RECORD.itemsize
+        if size > known:
+            fresh = np.fromfile(_generation_path(generation, 'delta'), dtype=RECORD,
+                                count=(size - known) // RECORD.itemsize, offset=known)
+            snapshot = TripColumns(generation, snapshot.base, np.concatenate([snapshot.delta_records, fresh]))
+        _snapshot = snapshot
+        return snapshot
+
+
+def at_least(values, size):
+    """`values` padded with zeros to `size` entries, so any id below `size` can index it"""
+    if values.size >= size:
+        return values
+    return np.concatenate([values, np.zeros(size - values.size, dtype=values.dtype)])
+
+
+if __name__ == '__main__':
+    from src.main import app
+
+    with app.app_context():
+        if not enabled():
+            print('The columnar store is off; set COLUMNAR_STORE=1.')
+        else:
+            summary = compact()
+            print(f"Compacted {summary['trips']} trips into {summary['generation']} "
+                  f"in {summary['duration_ms']} ms.")
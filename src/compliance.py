@@ -0,0 +1,233 @@
+"""Driver hours-of-service: rolling driving-hour limits over 24 hours and 7 days.
+
+A driver is driving during every trip's `[start_time, end_time)`; an
+in-progress trip without an end counts until now, and a planned trip counts
+once both its times are set. Overlapping trips count once. At no moment may
+the driving time within the trailing window exceed its limit:
+
+    24h  `HOS_DAILY_LIMIT_HOURS` (default 10)
+    7d   `HOS_WEEKLY_LIMIT_HOURS` (default 56)
+
+A `SlidingWindow` keeps one driver's trips inside the window and their total
+as the window's right edge moves forward, so scanning a driver's history is
+linear in the number of trips. The rolling sum only peaks when a trip ends
+or when the window's left edge enters a trip, so those are the only moments
+evaluated. `violations()` scans every driver in one ordered pass over the
+trips; `check_trip_hours()` runs the same scan over one driver's
+neighbouring trips before an open trip is created, rescheduled or started.
+"""
+
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import select, or_
+
+from src.models import db, Trip
+from src.availability import OPEN_TRIP_STATUSES
+
+DEFAULT_DAILY_LIMIT_HOURS = 10
+DEFAULT_WEEKLY_LIMIT_HOURS = 56
+
+# (name, window width, limit in hours)
+LIMITS = (
+    ('24h', timedelta(hours=24), float(os.environ.get('HOS_DAILY_LIMIT_HOURS', DEFAULT_DAILY_LIMIT_HOURS))),
+    ('7d', timedelta(days=7), float(os.environ.get('HOS_WEEKLY_LIMIT_HOURS', DEFAULT_WEEKLY_LIMIT_HOURS)))
+)
+LONGEST_WINDOW = max(width for _, width, _ in LIMITS)
+
+DRIVING_STATUSES = ('planned', 'in_progress', 'completed')
+# A trip checked without an end_time is assumed to last at least this long
+MIN_OPEN_TRIP = timedelta(minutes=15)
+EPOCH = datetime(1970, 1, 1)
+
+
+class HoursOfServiceViolation(Exception):
+    def __init__(self, message, violations):
+        super().__init__(message)
+        self.violations = violations
+
+
+class SlidingWindow:
+    """Driving time inside a window of fixed width whose right edge only moves forward"""
+
+    def __init__(self, width):
+        self.width = width
+        self.intervals = deque()
+        self.total = 0.0
+
+    def add(self, start, end):
+        """Add an interval; intervals must arrive in order of start (seconds)"""
+        if self.intervals and start <= self.intervals[-1][1]:
+            # Overlaps the previous one: extend it so the time counts once
+            previous_start, previous_end = self.intervals[-1]
+            if end > previous_end:
+                self.intervals[-1] = (previous_start, end)
+                self.total += end - previous_end
+        else:
+            self.intervals.append((start, end))
+            self.total += end - start
+
+    def hours_at(self, moment):
+        """Driving hours in `(moment - width, moment]`, counting intervals added so far"""
+        edge = moment - self.width
+        while self.intervals and self.intervals[0][1] <= edge:
+            start, end = self.intervals.popleft()
+            self.total -= end - start
+        inside = self.total
+        if self.intervals:
+            inside -= max(0.0, edge - self.intervals[0][0])
+            # Only the latest interval can still be running at `moment`
+            inside -= max(0.0, self.intervals[-1][1] - moment)
+        return inside / 3600
+
+
+def _seconds(moment):
+    return (moment - EPOCH).total_seconds()
+
+
+def _moment(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def scan(intervals, width, limit, since=None, until=None):
+    """Violations of one limit for one driver's intervals (seconds, sorted by start).
+
+    Yields `(first, last, peak_at, peak_hours)` for each run of evaluated
+    moments over the limit, considering window ends between `since` and
+    `until` only.
+    """
+    width = width.total_seconds()
+    moments = {end for _, end in intervals} | {start + width for start, _ in intervals}
+    if since is not None:
+        moments.add(since)
+    moments = sorted(moment for moment in moments
+                     if (since is None or moment >= since) and (until is None or moment <= until))
+
+    window = SlidingWindow(width)
+    position = 0
+    current = None
+    for moment in moments:
+        while position < len(intervals) and intervals[position][0] < moment:
+            window.add(*intervals[position])
+            position += 1
+        hours = window.hours_at(moment)
+        if hours > limit + 1e-9:
+            if current is None:
+                current = [moment, moment, moment, hours]
+            else:
+                current[1] = moment
+                if hours > current[3]:
+                    current[2], current[3] = moment, hours
+        elif current is not None:
+            yield tuple(current)
+            current = None
+    if current is not None:
+        yield tuple(current)
+
+
+def _violation(driver_id, name, limit, found):
+    first, last, peak_at, peak_hours = found
+    return {
+        'driver_id': driver_id,
+        'window': name,
+        'limit_hours': limit,
+        'peak_hours': round(peak_hours, 2),
+        'peak_at': _moment(peak_at).isoformat(),
+        'from': _moment(first).isoformat(),
+        'to': _moment(last).isoformat()
+    }
+
+
+def _driving_trips(start, end, driver_id=None, exclude_trip_id=None):
+    """Statement for `(driver_id, start_time, end_time, status)` of trips that may drive in `[start, end)`"""
+    statement = select(Trip.driver_id, Trip.start_time, Trip.end_time, Trip.status).where(
+        Trip.status.in_(DRIVING_STATUSES),
+        Trip.start_time.isnot(None),
+        Trip.start_time < end,
+        or_(Trip.end_time > start, Trip.end_time.is_(None))
+    )
+    if driver_id is not None:
+        statement = statement.where(Trip.driver_id == driver_id)
+    if exclude_trip_id is not None:
+        statement = statement.where(Trip.id != exclude_trip_id)
+    return statement.order_by(Trip.driver_id, Trip.start_time)
+
+
+def _intervals(rows, now):
+    intervals = []
+    for _, start_time, end_time, status in rows:
+        if end_time is None:
+            if status != 'in_progress':
+                continue  # planned without an end: its duration is unknown
+            end_time = max(now, start_time)
+        if end_time > start_time:
+            intervals.append((_seconds(start_time), _seconds(end_time)))
+    return intervals
+
+
+def violations(start, end, driver_id=None, now=None):
+    """Every limit exceeded by a window ending between `start` and `end`, for all drivers at once"""
+    now = now or datetime.utcnow()
+    rows = db.session.execute(_driving_trips(start - LONGEST_WINDOW, end, driver_id))
+    found = []
+    for trip_driver_id, driver_rows in groupby(rows, key=lambda row: row[0]):
+        intervals = _intervals(driver_rows, now)
+        for name, width, limit in LIMITS:
+            found.extend(_violation(trip_driver_id, name, limit, violation)
+                         for violation in scan(intervals, width, limit, _seconds(start), _seconds(end)))
+    return found
+
+
+def driving_hours(driver_id, at=None):
+    """Hours driven in each window ending at `at` (default now), with the limit and what is left"""
+    at = at or datetime.utcnow()
+    rows = db.session.execute(_driving_trips(at - LONGEST_WINDOW, at, driver_id)).all()
+    intervals = _intervals(rows, at)
+    hours = {}
+    for name, width, limit in LIMITS:
+        window = SlidingWindow(width.total_seconds())
+        for interval in intervals:
+            window.add(*interval)
+        driven = window.hours_at(_seconds(at))
+        hours[name] = {
+            'hours': round(driven, 2),
+            'limit_hours': limit,
+            'remaining_hours': round(max(0.0, limit - driven), 2)
+        }
+    return hours
+
+
+def check_driver_hours(driver_id, start_time, end_time=None, exclude_trip_id=None, now=None):
+    """Raise HoursOfServiceViolation if driving `[start_time, end_time)` breaks a limit.
+
+    Without an `end_time` the trip is taken to last `MIN_OPEN_TRIP`, so a
+    driver already at a limit cannot start one.
+    """
+    now = now or datetime.utcnow()
+    end_time = max(end_time or start_time + MIN_OPEN_TRIP, start_time)
+    rows = db.session.execute(_driving_trips(
+        start_time - LONGEST_WINDOW, end_time + LONGEST_WINDOW, driver_id, exclude_trip_id
+    )).all()
+    intervals = _intervals(rows, now)
+    intervals.append((_seconds(start_time), _seconds(end_time)))
+    intervals.sort()
+
+    found = []
+    for name, width, limit in LIMITS:
+        # Only windows that contain part of the new trip
+        found.extend(_violation(driver_id, name, limit, violation) for violation in scan(
+            intervals, width, limit, _seconds(start_time), _seconds(end_time + width)))
+    if found:
+        worst = max(found, key=lambda violation: violation['peak_hours'] - violation['limit_hours'])
+        raise HoursOfServiceViolation(
+            f"Driver would exceed {worst['limit_hours']:g} driving hours in {worst['window']} "
+            f"({worst['peak_hours']:g} h)", found)
+
+
+def check_trip_hours(start_time, end_time, status, driver_id, exclude_trip_id=None):
+    """`check_driver_hours()` for an open trip being assigned; trips without a start_time are not checked"""
+    if status not in OPEN_TRIP_STATUSES or start_time is None:
+        return
+    check_driver_hours(driver_id, start_time, end_time, exclude_trip_id)
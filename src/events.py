@@ -0,0 +1,155 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class Subscription(queue.Queue):
+    """A subscriber's event queue; `closed` once the broker has dropped it"""
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.closed = False
+
+
+class EventBroker:
+    """In-process pub/sub broker for entity change events.
+
+    Events get a monotonically increasing id and are kept in a bounded ring
+    buffer so that reconnecting clients can resume from `Last-Event-ID`.
+    Ids are `<epoch>-<sequence>`, where the epoch identifies this broker's
+    process start, so an id handed out before a restart is recognised as
+    such instead of being mistaken for a position in the new sequence.
+    The broker lives in the worker process, so with several worker processes
+    each one only sees the changes it committed itself.
+    """
+
+    def __init__(self, buffer_size=1000, subscriber_queue_size=256):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._subscriber_queue_size = subscriber_queue_size
+        self._last_id = 0
+        self.epoch = format(time.time_ns() // 1000, 'x')
+
+    def publish(self, event_type, entity, data, driver_user_id=None):
+        """Publish an event to every subscriber and record it in the buffer"""
+        with self._lock:
+            self._last_id += 1
+            event = {
+                'id': f'{self.epoch}-{self._last_id}',
+                'sequence': self._last_id,
+                'type': event_type,
+                'entity': entity,
+                'data': data,
+                'driver_user_id': driver_user_id,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Slow consumer: drop it and let its stream end, so the
+                # client reconnects and resumes from its Last-Event-ID
+                # through the ring buffer.
+                subscriber.closed = True
+                self.unsubscribe(subscriber)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber queue, returning it with any missed events.
+
+        Returns `(queue, backlog, complete)`; `complete` is False when the
+        requested id has already fallen out of the ring buffer or was issued
+        before this process started, in which case the client should do a
+        full reload. Raises ValueError for a malformed id.
+        """
+        position = parse_event_id(last_event_id) if last_event_id else None
+        subscriber = Subscription(maxsize=self._subscriber_queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            backlog = []
+            complete = True
+            if position is not None:
+                epoch, sequence = position
+                if epoch != self.epoch:
+                    complete = False
+                else:
+                    backlog = [event for event in self._buffer if event['sequence'] > sequence]
+                    oldest = self._buffer[0]['sequence'] if self._buffer else self._last_id + 1
+                    complete = sequence >= oldest - 1
+        return subscriber, backlog, complete
+
+    def unsubscribe(self, subscriber):
+        """Remove a subscriber queue"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def last_event_id(self):
+        return f'{self.epoch}-{self._last_id}'
+
+
+def parse_event_id(value):
+    """Return `(epoch, sequence)` for an event id; raises ValueError.
+
+    Plain numeric ids (from before ids carried an epoch) parse with an empty
+    epoch, so they never match and the client is told to reset.
+    """
+    epoch, _, sequence = value.rpartition('-')
+    return epoch, int(sequence)
+
+
+def can_receive(user, event):
+    """Return whether `user` may see `event`.
+
+    Admins and managers see everything; drivers only see events about trips
+    assigned to the driver profile linked to their account.
+    """
+    if user.role in ('admin', 'manager'):
+        return True
+    return event['entity'] == 'trip' and event['driver_user_id'] == user.id
+
+
+def format_sse(event):
+    """Serialize an event in the text/event-stream wire format"""
+    payload = {key: value for key, value in event.items() if key not in ('driver_user_id', 'sequence')}
+    return f"id: {event['id']}\ndata: {json.dumps(payload)}\n\n"
+
+
+broker = EventBroker()
+
+
+def publish_trip_event(trip, event_type, previous_status=None):
+    """Publish a change to a trip"""
+    return broker.publish(event_type, 'trip', {
+        'trip': trip.to_dict(),
+        'previous_status': previous_status
+    }, driver_user_id=trip.driver.user_id if trip.driver else None)
+
+
+def publish_maintenance_event(maintenance, event_type, previous_status=None):
+    """Publish a change to a maintenance record"""
+    return broker.publish(event_type, 'maintenance', {
+        'maintenance': maintenance.to_dict(),
+        'previous_status': previous_status
+    })
+
+
+def publish_vehicle_event(vehicle, event_type, previous_status=None):
+    """Publish a change to a vehicle"""
+    return broker.publish(event_type, 'vehicle', {
+        'vehicle': vehicle.to_dict(),
+        'previous_status': previous_status
+    })
+
+
+def publish_deleted_event(entity, entity_id, driver_user_id=None):
+    """Publish the deletion of an entity"""
+    return broker.publish(f'{entity}.deleted', entity, {'id': entity_id},
+                          driver_user_id=driver_user_id)
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""Synthetic fleet generator and bulk loader for load tests and benchmarks.
+
+Creates a deterministic (seeded) fleet of any size - vehicles, drivers, trips
+between real Angolan cities and maintenance history - with seasonal and
+weekly patterns, and loads it with bulk Core inserts in large transactions.
+
+    python src/generate_fleet.py --vehicles 5000 --drivers 10000 \\
+        --trips 10000000 --maintenance 500000
+
+By default the database is reset first (like init_db.py) and the default
+users are recreated; `--append` adds to the existing data instead. Tests and
+benchmarks can call `generate_fleet()` inside an app context.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import func, text
+
+from src.models import db, User, Vehicle, Driver, Trip, Maintenance
+from src import archive
+from src.search import SEARCH_INDEXES, install_search_indexes
+from src.listing import ensure_indexes
+from src.locations import rebuild_route_matrix
+from src.sketches import rebuild_sketches
+
+DEFAULT_BATCH_SIZE = 50000
+
+# name, latitude, longitude, relative share of trips starting or ending there
+LOCATIONS = (
+    ('Luanda', -8.839, 13.289, 30.0),
+    ('Viana', -8.904, 13.374, 6.0),
+    ('Cacuaco', -8.777, 13.369, 4.0),
+    ('Caxito', -8.578, 13.664, 2.0),
+    ('Benguela', -12.578, 13.407, 6.0),
+    ('Lobito', -12.364, 13.536, 5.0),
+    ('Huambo', -12.776, 15.739, 6.0),
+    ('Lubango', -14.917, 13.492, 5.0),
+    ('Namibe', -15.196, 12.152, 2.0),
+    ('Malanje', -9.540, 16.341, 3.0),
+    ('Uíge', -7.609, 15.061, 3.0),
+    ('Soyo', -6.135, 12.369, 3.0),
+    ('Cabinda', -5.550, 12.200, 3.0),
+    ('Sumbe', -11.206, 13.844, 2.0),
+    ("N'dalatando", -9.297, 14.911, 2.0),
+    ('Kuito', -12.383, 16.933, 2.0),
+    ('Saurimo', -9.660, 20.391, 1.5),
+    ('Dundo', -7.380, 20.830, 1.0),
+    ('Luena', -11.783, 19.917, 1.0),
+    ('Menongue', -14.658, 17.691, 1.0),
+    ('Ondjiva', -17.067, 15.733, 1.0),
+    ('Mbanza Kongo', -6.267, 14.240, 1.0),
+)
+# Roads are never straight lines
+ROAD_FACTOR = 1.3
+
+# model, fuel type, typical km per litre
+VEHICLE_MODELS = (
+    ('Toyota Hilux', 'diesel', 10.5),
+    ('Toyota Land Cruiser', 'diesel', 8.0),
+    ('Ford Ranger', 'diesel', 10.0),
+    ('Nissan Navara', 'diesel', 10.2),
+    ('Mitsubishi L200', 'diesel', 10.8),
+    ('Isuzu D-Max', 'diesel', 11.0),
+    ('Toyota HiAce', 'diesel', 9.0),
+    ('Mercedes-Benz Sprinter', 'diesel', 8.5),
+    ('Kia Rio', 'petrol', 15.5),
+    ('Hyundai i10', 'petrol', 17.0),
+    ('Suzuki Swift', 'petrol', 16.5),
+    ('Toyota Corolla', 'petrol', 14.5),
+)
+PROVINCE_PREFIXES = ('LD', 'LA', 'BE', 'HO', 'HL', 'BO', 'CA', 'ZE', 'UE', 'MA', 'CS', 'KN')
+
+FIRST_NAMES = ('João', 'Ana', 'Carlos', 'Maria', 'António', 'Isabel', 'Manuel', 'Teresa', 'José', 'Joana',
+               'Paulo', 'Rosa', 'Domingos', 'Luísa', 'Francisco', 'Esperança', 'Pedro', 'Madalena',
+               'Afonso', 'Graça', 'Mateus', 'Lurdes', 'Adão', 'Celeste', 'Miguel', 'Fátima')
+LAST_NAMES = ('Silva', 'Pereira', 'Santos', 'Costa', 'Fernandes', 'Gomes', 'Neto', 'Dos Santos', 'Lopes',
+              'Baptista', 'Domingos', 'Kiala', 'Mbala', 'Tchimbali', 'Kassoma', 'Chipenda', 'Cassule',
+              'Muteka', 'Sapalo', 'Nzinga', 'Mendes', 'Cardoso', 'Vieira', 'Tavares')
+
+MAINTENANCE_TYPES = ('routine', 'repair', 'emergency')
+MAINTENANCE_TYPE_SHARES = (0.70, 0.25, 0.05)
+# Median cost in Kwanza per maintenance type
+MAINTENANCE_MEDIAN_COST = (25000.0, 60000.0, 180000.0)
+MAINTENANCE_DESCRIPTIONS = (
+    ('Mudança de óleo e substituição de filtros.', 'Revisão periódica completa.',
+     'Rotação, alinhamento e calibragem de pneus.', 'Verificação dos travões e do sistema de arrefecimento.'),
+    ('Substituição das pastilhas e discos de travão.', 'Substituição da bateria e verificação do alternador.',
+     'Reparação da suspensão dianteira.', 'Substituição da embraiagem.'),
+    ('Reparação da junta do cabeçote do motor.', 'Reboque e reparação após avaria na estrada.',
+     'Substituição da bomba injectora.', 'Reparação do sistema eléctrico após curto-circuito.'),
+)
+SERVICE_PROVIDERS = ('Oficina Central de Luanda', 'AutoSul Benguela', 'Mecânica do Planalto', 'Toyota de Angola',
+                     'Auto-Reparadora Kilamba', 'Oficina Namibe Motors', None)
+
+# Rainy season (November to April) means fewer trips and worse consumption
+MONTH_VOLUME = (0.85, 0.85, 0.9, 0.9, 1.05, 1.1, 1.15, 1.15, 1.1, 1.05, 0.9, 0.95)
+MONTH_EFFICIENCY = (0.93, 0.93, 0.94, 0.95, 1.0, 1.0, 1.0, 1.0, 1.0, 0.98, 0.95, 0.93)
+# Monday to Sunday
+WEEKDAY_VOLUME = (1.0, 1.0, 1.0, 1.0, 1.05, 0.7, 0.35)
+
+
+def create_app(database_uri=None):
+    """Create a minimal app bound to the application's database (or `database_uri`)"""
+    app = Flask(__name__)
+    db_path = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri or f"sqlite:///{db_path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    # Trip history (sketches) is read across the hot and archived tables
+    archive.init_app(app)
+    return app
+
+
+def _distance_matrix():
+    latitude = np.radians([location[1] for location in LOCATIONS])
+    longitude = np.radians([location[2] for location in LOCATIONS])
+    d_lat = latitude[:, None] - latitude[None, :]
+    d_lon = longitude[:, None] - longitude[None, :]
+    a = np.sin(d_lat / 2) ** 2 + np.cos(latitude[:, None]) * np.cos(latitude[None, :]) * np.sin(d_lon / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a)) * ROAD_FACTOR
+
+
+def _day_weights(start, days):
+    dates = [start + timedelta(days=offset) for offset in range(days)]
+    weights = np.array([MONTH_VOLUME[day.month - 1] * WEEKDAY_VOLUME[day.weekday()] for day in dates])
+    return dates, weights / weights.sum()
+
+
+def _insert(connection, table, columns, batch_size):
+    """Bulk insert parallel column lists in batches of `batch_size` rows"""
+    names = list(columns)
+    total = len(columns[names[0]])
+    for offset in range(0, total, batch_size):
+        chunk = [columns[name][offset:offset + batch_size] for name in names]
+        rows = [dict(zip(names, row)) for row in zip(*chunk)]
+        if table.name in archive.ARCHIVED:
+            # Appended trips and maintenance must not reuse archived ids
+            archive.assign_ids(connection, table.name, rows)
+        connection.execute(table.insert(), rows)
+    return total
+
+
+def _ascii(value):
+    return unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _load_vehicles(connection, rng, count, first_id, batch_size):
+    index = np.arange(first_id, first_id + count)
+    models = rng.integers(0, len(VEHICLE_MODELS), count)
+    statuses = rng.choice(np.array(['active', 'maintenance', 'inactive']), count, p=(0.9, 0.06, 0.04))
+    # PP-NN-NN-XY with X and Y from K-Z, so generated plates never clash with
+    # the hand-written sample data
+    reg_nos = [
+        f'{PROVINCE_PREFIXES[i % len(PROVINCE_PREFIXES)]}-{(i // 100) % 100:02d}-{i % 100:02d}-'
+        f'{chr(75 + (i // 10000) % 16)}{chr(75 + (i // 160000) % 16)}'
+        for i in index.tolist()
+    ]
+    now = datetime.utcnow()
+    _insert(connection, Vehicle.__table__, {
+        'id': index.tolist(),
+        'reg_no': reg_nos,
+        'model': [VEHICLE_MODELS[m][0] for m in models.tolist()],
+        'fuel_type': [VEHICLE_MODELS[m][1] for m in models.tolist()],
+        'status': statuses.tolist(),
+        'created_at': [now] * count,
+        'updated_at': [now] * count
+    }, batch_size)
+    return index, models
+
+
+def _load_drivers(connection, rng, count, first_id, batch_size):
+    index = np.arange(first_id, first_id + count)
+    first = rng.integers(0, len(FIRST_NAMES), count).tolist()
+    last = rng.integers(0, len(LAST_NAMES), count).tolist()
+    phones = rng.integers(10000000, 99999999, count).tolist()
+    statuses = rng.choice(np.array(['active', 'inactive']), count, p=(0.93, 0.07)).tolist()
+    names = [f'{FIRST_NAMES[f]} {LAST_NAMES[l]}' for f, l in zip(first, last)]
+    now = datetime.utcnow()
+    _insert(connection, Driver.__table__, {
+        'id': index.tolist(),
+        'name': names,
+        'license_no': [f'{i:09d}KS{i % 997:03d}' for i in index.tolist()],
+        'phone': [f'+2449{phone}' for phone in phones],
+        'email': [f"{_ascii(name).lower().replace(' ', '.')}.{i}@exemplo.co.ao" for name, i in zip(names, index.tolist())],
+        'status': statuses,
+        'created_at': [now] * count,
+        'updated_at': [now] * count
+    }, batch_size)
+    return index
+
+
+def _load_trips(connection, rng, count, vehicle_ids, vehicle_models, driver_ids, start, end, batch_size):
+    distances = _distance_matrix()
+    shares = np.array([location[3] for location in LOCATIONS])
+    shares = shares / shares.sum()
+    efficiency = np.array([model[2] for model in VEHICLE_MODELS])
+    dates, day_weights = _day_weights(start, (end - start).days + 1)
+    today = date.today()
+    # Each vehicle mostly goes out with its own regular driver
+    regular_driver = driver_ids[rng.integers(0, driver_ids.size, vehicle_ids.size)]
+
+    loaded = 0
+    while loaded < count:
+        size = min(batch_size, count - loaded)
+        vehicle = rng.integers(0, vehicle_ids.size, size)
+        driver = np.where(rng.random(size) < 0.8, regular_driver[vehicle],
+                          driver_ids[rng.integers(0, driver_ids.size, size)])
+
+        source = rng.choice(len(LOCATIONS), size, p=shares)
+        destination = rng.choice(len(LOCATIONS), size, p=shares)
+        same = source == destination
+        # Same-place trips are short urban runs
+        distance = np.where(same, rng.uniform(5, 40, size),
+                            distances[source, destination] * rng.normal(1.0, 0.05, size))
+        distance = np.round(np.maximum(distance, 1.0), 1)
+
+        day = rng.choice(len(dates), size, p=day_weights)
+        month = np.array([dates[d].month - 1 for d in day.tolist()])
+        km_per_litre = (efficiency[vehicle_models[vehicle]] * np.array(MONTH_EFFICIENCY)[month]
+                        * rng.normal(1.0, 0.06, size))
+        fuel = distance / np.maximum(km_per_litre, 2.0)
+        # A sprinkling of siphoning/leaks for the anomaly detector to find
+        fuel = np.where(rng.random(size) < 0.002, fuel * rng.uniform(1.5, 2.5, size), fuel)
+        fuel = np.round(fuel, 2)
+
+        start_hour = rng.uniform(5, 18, size)
+        hours = distance / rng.uniform(40, 75, size)
+        cancelled = rng.random(size) < 0.03
+
+        trip_dates = [dates[d] for d in day.tolist()]
+        starts = [datetime.combine(d, datetime.min.time()) + timedelta(hours=h)
+                  for d, h in zip(trip_dates, start_hour.tolist())]
+        ends = [s + timedelta(hours=h) for s, h in zip(starts, hours.tolist())]
+        statuses = ['planned' if d > today else ('cancelled' if c else 'completed')
+                    for d, c in zip(trip_dates, cancelled.tolist())]
+        done = [status == 'completed' for status in statuses]
+
+        _insert(connection, Trip.__table__, {
+            'vehicle_id': vehicle_ids[vehicle].tolist(),
+            'driver_id': driver.tolist(),
+            'source': [LOCATIONS[s][0] for s in source.tolist()],
+            'destination': [LOCATIONS[d][0] for d in destination.tolist()],
+            'distance': [value if ok else None for value, ok in zip(distance.tolist(), done)],
+            'fuel_used': [value if ok else None for value, ok in zip(fuel.tolist(), done)],
+            'trip_date': trip_dates,
+            'start_time': [value if ok else None for value, ok in zip(starts, done)],
+            'end_time': [value if ok else None for value, ok in zip(ends, done)],
+            'status': statuses,
+            'notes': [None] * size,
+            'created_at': starts,
+            'updated_at': [value if ok else created for value, ok, created in zip(ends, done, starts)]
+        }, batch_size)
+        loaded += size
+    return loaded
+
+
+def _load_maintenance(connection, rng, count, vehicle_ids, start, end, batch_size):
+    days = (end - start).days + 1
+    vehicle = rng.integers(0, vehicle_ids.size, count)
+    day = rng.integers(0, days, count)
+    order = np.lexsort((day, vehicle))
+    vehicle, day = vehicle[order], day[order]
+
+    # Odometer: a starting reading per vehicle plus the km between services,
+    # accumulated within each vehicle's (date-sorted) records
+    increments = rng.gamma(4.0, 2000.0, count)
+    cumulative = np.cumsum(increments)
+    group_start = np.r_[True, vehicle[1:] != vehicle[:-1]]
+    offsets = np.maximum.accumulate(np.where(group_start, cumulative - increments, 0.0))
+    mileage = rng.integers(5000, 150000, vehicle_ids.size)[vehicle] + (cumulative - offsets)
+
+    kind = rng.choice(len(MAINTENANCE_TYPES), count, p=MAINTENANCE_TYPE_SHARES)
+    cost = np.round(np.array(MAINTENANCE_MEDIAN_COST)[kind] * rng.lognormal(0.0, 0.35, count), -2)
+    description = rng.integers(0, 4, count)
+    provider = rng.integers(0, len(SERVICE_PROVIDERS), count)
+
+    today = date.today()
+    service_dates = [start + timedelta(days=d) for d in day.tolist()]
+    statuses = ['scheduled' if d > today else ('in_progress' if (today - d).days < 2 else 'completed')
+                for d in service_dates]
+    # Routine services usually book the next one
+    next_service = [d + timedelta(days=180) if k == 0 and b else None
+                    for d, k, b in zip(service_dates, kind.tolist(), (rng.random(count) < 0.6).tolist())]
+    now = datetime.utcnow()
+
+    return _insert(connection, Maintenance.__table__, {
+        'vehicle_id': vehicle_ids[vehicle].tolist(),
+        'date': service_dates,
+        'cost': cost.tolist(),
+        'description': [MAINTENANCE_DESCRIPTIONS[k][d] for k, d in zip(kind.tolist(), description.tolist())],
+        'maintenance_type': [MAINTENANCE_TYPES[k] for k in kind.tolist()],
+        'service_provider': [SERVICE_PROVIDERS[p] for p in provider.tolist()],
+        'mileage': np.round(mileage).astype(np.int64).tolist(),
+        'next_service_date': next_service,
+        'status': statuses,
+        'created_at': [now] * count,
+        'updated_at': [now] * count
+    }, batch_size)
+
+
+def _create_default_users():
+    for username, email, role, password in (
+        ('admin', 'admin@crislina.co.ao', 'admin', 'admin123'),
+        ('manager', 'gestor@crislina.co.ao', 'manager', 'gestor123'),
+    ):
+        if User.query.filter_by(username=username).first() is None:
+            user = User(username=username, email=email, role=role)
+            user.set_password(password)
+            db.session.add(user)
+    db.session.commit()
+
+
+def generate_fleet(vehicles=100, drivers=200, trips=10000, maintenance=1000, seed=42,
+                   days=730, end_date=None, reset=False, batch_size=DEFAULT_BATCH_SIZE, log=print):
+    """Generate a synthetic fleet and bulk-load it into the current app's database.
+
+    The same arguments always produce the same data. Trips and maintenance
+    cover the `days` days up to `end_date` (default: today) plus two weeks of
+    planned/scheduled work after it. Returns row counts and load timings.
+    """
+    rng = np.random.default_rng(seed)
+    end = end_date or date.today()
+    start = end - timedelta(days=days - 1)
+    horizon = end + timedelta(days=14)
+    timings = {}
+
+    if reset:
+        db.drop_all()
+        db.create_all()
+        ensure_indexes()
+        # Archived rows of a previous fleet would otherwise outlive it
+        archive.archive_metadata.drop_all(db.engine)
+        archive.archive_metadata.create_all(db.engine)
+    _create_default_users()
+
+    sqlite = db.engine.dialect.name == 'sqlite'
+    if sqlite:
+        # Keeping the FTS index in sync row by row is by far the slowest part
+        # of a bulk load; drop the insert triggers and rebuild once at the end
+        with db.engine.begin() as connection:
+            for table, _ in SEARCH_INDEXES.values():
+                connection.execute(text(f'DROP TRIGGER IF EXISTS {table}_fts_ai'))
+
+    first_vehicle, first_driver = _next_id(Vehicle), _next_id(Driver)
+    db.session.remove()
+
+    with db.engine.begin() as connection:
+        if sqlite:
+            connection.execute(text('PRAGMA synchronous = OFF'))
+            connection.execute(text('PRAGMA temp_store = MEMORY'))
+            connection.execute(text('PRAGMA cache_size = -200000'))
+
+        started = time.monotonic()
+        vehicle_ids, vehicle_models = _load_vehicles(connection, rng, vehicles, first_vehicle, batch_size)
+        driver_ids = _load_drivers(connection, rng, drivers, first_driver, batch_size)
+        timings['vehicles_and_drivers'] = time.monotonic() - started
+        log(f'  {vehicles} vehicles and {drivers} drivers in {timings["vehicles_and_drivers"]:.1f}s')
+
+        started = time.monotonic()
+        _load_trips(connection, rng, trips, vehicle_ids, vehicle_models, driver_ids, start, horizon, batch_size)
+        timings['trips'] = time.monotonic() - started
+        log(f'  {trips} trips in {timings["trips"]:.1f}s')
+
+        started = time.monotonic()
+        _load_maintenance(connection, rng, maintenance, vehicle_ids, start, horizon, batch_size)
+        timings['maintenance'] = time.monotonic() - started
+        log(f'  {maintenance} maintenance records in {timings["maintenance"]:.1f}s')
+
+    started = time.monotonic()
+    install_search_indexes(rebuild=True)
+    # Bulk-loaded trips bypass the ORM hook that links them to locations
+    rebuild_route_matrix(tables=(Trip.__table__,))
+    rebuild_sketches()
+    with db.engine.begin() as connection:
+        connection.execute(text('ANALYZE'))
+    timings['indexes'] = time.monotonic() - started
+    log(f'  search indexes, route matrix, sketches and statistics in {timings["indexes"]:.1f}s')
+
+    return {
+        'vehicles': vehicles,
+        'drivers': drivers,
+        'trips': trips,
+        'maintenance': maintenance,
+        'seconds': {name: round(value, 2) for name, value in timings.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate and bulk-load a synthetic fleet.')
+    parser.add_argument('--vehicles', type=int, default=5000)
+    parser.add_argument('--drivers', type=int, default=10000)
+    parser.add_argument('--trips', type=int, default=1000000)
+    parser.add_argument('--maintenance', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=730, help='history length in days (default 730)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--database', help='SQLAlchemy URI (default: the application database)')
+    parser.add_argument('--append', action='store_true', help='keep existing data instead of resetting')
+    args = parser.parse_args()
+
+    app = create_app(args.database)
+    with app.app_context():
+        started = time.monotonic()
+        print(f"Generating fleet (seed {args.seed}) into {app.config['SQLALCHEMY_DATABASE_URI']}")
+        generate_fleet(args.vehicles, args.drivers, args.trips, args.maintenance, seed=args.seed,
+                       days=args.days, reset=not args.append, batch_size=args.batch_size)
+        print(f'Done in {time.monotonic() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
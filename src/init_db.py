@@ -16,6 +16,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from datetime import datetime, date, timedelta
 from src.models import db, User, Vehicle, Driver, Trip, Maintenance
+from src.search import install_search_indexes
 from flask import Flask
 
 def create_app():
@@ -42,6 +43,8 @@ def init_database():
         # Apaga todas as tabelas e recria a estrutura a partir dos modelos definidos
         db.drop_all()
         db.create_all()
+        # Recria os índices de pesquisa de texto (FTS) e os respectivos triggers
+        install_search_indexes(rebuild=True)
         
         # --- Criação de Utilizadores com diferentes perfis ---
         # (Admin, Gestor, Motorista) como previsto na arquitetura do sistema
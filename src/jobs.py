@@ -0,0 +1,74 @@
+"""Periodic jobs run by the in-process scheduler (see src/scheduler.py)."""
+
+from sqlalchemy import text
+
+from src.models import db
+from src.scheduler import scheduler
+from src.predictive import run_predictions
+from src.anomalies import backfill as backfill_fuel_anomalies
+from src.archive import archive_old_records
+from src.sync import prune_tombstones
+from src.locations import rebuild_route_matrix
+from src.scorecards import compute_scorecards
+from src.sketches import rebuild_sketches
+from src import columnar
+
+
+@scheduler.job('maintenance_predictions', cron='0 2 * * *')
+def maintenance_predictions():
+    run_predictions()
+
+
+@scheduler.job('fuel_anomaly_backfill', cron='30 2 * * 0')
+def fuel_anomaly_backfill():
+    # Trips are folded in as they become completed (_record_completion in
+    # src/routes/trip.py); the weekly replay restores trip order and picks up
+    # trips whose distance or fuel was edited afterwards
+    backfill_fuel_anomalies()
+
+
+@scheduler.job('archive_records', cron='45 2 * * *')
+def archive_records():
+    archive_old_records()
+
+
+@scheduler.job('sync_tombstone_prune', cron='15 2 * * *')
+def sync_tombstone_prune():
+    prune_tombstones()
+
+
+@scheduler.job('route_matrix', cron='0 4 * * *')
+def route_matrix():
+    # Trips becoming completed refresh their own pair (_record_completion);
+    # this links bulk-loaded trips and picks up edited distances and fuel
+    rebuild_route_matrix()
+
+
+@scheduler.job('driver_scorecards', cron='30 0 * * *')
+def driver_scorecards():
+    # Refresh right after midnight so the first request of the day finds them
+    compute_scorecards()
+
+
+@scheduler.job('trip_sketches', cron='15 4 * * *')
+def trip_sketches():
+    # Each trip is added as it becomes completed (_record_completion); the
+    # rebuild applies edits, deletions and bulk loads
+    rebuild_sketches()
+
+
+@scheduler.job('columnar_compact', cron='*/30 * * * *')
+def columnar_compact():
+    # Keeps the delta short and picks up trips written without the ORM
+    if columnar.enabled():
+        columnar.compact()
+
+
+@scheduler.job('database_optimize', cron='0 3 * * *')
+def database_optimize():
+    # Refresh the planner statistics the list and analytics queries rely on
+    with db.engine.begin() as connection:
+        if db.engine.dialect.name == 'sqlite':
+            connection.execute(text('PRAGMA optimize'))
+        else:
+            connection.execute(text('ANALYZE'))
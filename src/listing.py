@@ -0,0 +1,113 @@
+"""Search, sorting and pagination helpers shared by the list endpoints."""
+
+from sqlalchemy import func, or_, inspect, text
+from sqlalchemy.schema import CreateIndex
+from src.models import db
+
+MAX_PER_PAGE = 100
+
+
+def _prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with `prefix`"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def apply_prefix_search(query, columns, q):
+    """Filter `query` to rows where any of `columns` starts with `q`.
+
+    Matching is case-insensitive and written as a range over `lower(column)`
+    rather than `LIKE 'q%'`, so it can use the `lower()` expression indexes
+    declared on the models (SQLite never uses an index for case-insensitive
+    LIKE on a default-collation column).
+    """
+    prefix = (q or '').strip().lower()
+    if not prefix:
+        return query
+
+    upper = _prefix_upper_bound(prefix)
+    return query.filter(or_(*[
+        (func.lower(column) >= prefix) & (func.lower(column) < upper)
+        for column in columns
+    ]))
+
+
+def apply_sort(query, sort, allowed, default):
+    """Order `query` by a comma-separated `sort` spec such as `-status,reg_no`.
+
+    `allowed` maps public field names to columns; a leading `-` sorts that
+    field descending. Raises ValueError for unknown fields.
+    """
+    spec = sort or default
+    order_by = []
+    for field in (part.strip() for part in spec.split(',')):
+        if not field:
+            continue
+        descending = field.startswith('-')
+        name = field.lstrip('-+')
+        if name not in allowed:
+            raise ValueError(f'Invalid sort field: {name}. Must be one of: {sorted(allowed)}')
+        column = allowed[name]
+        order_by.append(column.desc() if descending else column.asc())
+    return query.order_by(*order_by)
+
+
+def paginated_response(query, page, per_page, serialize):
+    """Build the JSON body for one page of `query`"""
+    pagination = query.paginate(page=page, per_page=per_page, max_per_page=MAX_PER_PAGE, error_out=False)
+    items = [serialize(item) for item in pagination.items]
+    return {
+        'success': True,
+        'data': items,
+        'count': len(items),
+        'pagination': {
+            'page': pagination.page,
+            'per_page': pagination.per_page,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+    }
+
+
+def ensure_columns(metadata=None):
+    """Add nullable columns declared on the models but missing from their tables.
+
+    Like `ensure_indexes()` this only covers what `db.create_all()` leaves
+    out; a new NOT NULL column still needs a manual migration.
+    """
+    metadata = metadata if metadata is not None else db.metadata
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        preparer = connection.dialect.identifier_preparer
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name, schema=table.schema):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name, schema=table.schema)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f'Cannot add NOT NULL column {table.name}.{column.name} automatically')
+                connection.execute(text(
+                    f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN '
+                    f'{preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}'
+                ))
+
+
+# Indexes replaced by a differently named one; dropped from older databases
+RETIRED_INDEXES = ('ix_trip_vehicle_schedule', 'ix_trip_driver_schedule')
+
+
+def ensure_indexes():
+    """Create any indexes declared on the models but missing from the database.
+
+    `db.create_all()` only creates missing tables, so indexes added to an
+    existing table's model would otherwise never reach older databases.
+    """
+    # IF NOT EXISTS rather than checkfirst: reflection cannot see
+    # expression indexes such as lower(reg_no) on SQLite.
+    with db.engine.begin() as connection:
+        for name in RETIRED_INDEXES:
+            connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
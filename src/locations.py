@@ -0,0 +1,208 @@
+"""Normalized trip locations and the origin-destination distance matrix.
+
+Trip `source`/`destination` stay free text, but every trip is linked on
+flush to a `Location` per normalized name (case, accents and spacing do not
+matter), so "Luanda", " luanda" and "LUANDA" are one place. Location ids are
+memoized per process; locations are never deleted.
+
+`RouteDistance` holds, per (origin, destination) pair, the median distance
+and fuel of its most recent completed trips. `record_trip_route()` refreshes
+one pair when a trip is completed and `rebuild_route_matrix()` recomputes
+the whole matrix (and links trips loaded without going through the ORM).
+New trips without a distance get the pair's median (`route_estimate()`).
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import re
+import time
+import unicodedata
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import event, inspect, select, update, insert, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from src.models import db, Trip, Location, RouteDistance
+from src.archive import archived_trip
+
+# Completed trips per pair behind the medians; recent trips reflect road
+# works and detours better than the full history
+ROUTE_SAMPLE_SIZE = 200
+
+_location_ids = {}
+
+
+def location_key(name):
+    """Normalized form of a place name: accents stripped, case folded, single spaces"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r'\s+', ' ', stripped).strip().casefold()
+
+
+def find_location_id(name, session=None):
+    """Id of the location `name` normalizes to, or None if it was never seen"""
+    key = location_key(name)
+    if not key:
+        return None
+    if key not in _location_ids:
+        session = session or db.session
+        with session.no_autoflush:
+            location_id = session.execute(select(Location.id).where(Location.key == key)).scalar()
+        if location_id is None:
+            return None
+        _location_ids[key] = location_id
+    return _location_ids[key]
+
+
+def resolve_location_id(name, session=None):
+    """Id of the location for `name`, creating it if needed"""
+    location_id = find_location_id(name, session)
+    if location_id is not None or not location_key(name):
+        return location_id
+    session = session or db.session
+    # Another process may add the same place at the same time
+    dialect = postgresql if session.get_bind().dialect.name == 'postgresql' else sqlite
+    session.execute(dialect.insert(Location.__table__).values(
+        name=re.sub(r'\s+', ' ', name).strip(), key=location_key(name), created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['key']))
+    with session.no_autoflush:
+        # Not memoized: the insert is undone if this transaction rolls back
+        return session.execute(select(Location.id).where(Location.key == location_key(name))).scalar()
+
+
+@event.listens_for(Session, 'before_flush')
+def _link_trip_locations(session, flush_context, instances):
+    for trip in chain(session.new, session.dirty):
+        if not isinstance(trip, Trip):
+            continue
+        state = inspect(trip)
+        for name, id_name in (('source', 'source_location_id'), ('destination', 'destination_location_id')):
+            if getattr(trip, id_name) is None or state.attrs[name].history.has_changes():
+                setattr(trip, id_name, resolve_location_id(getattr(trip, name), session))
+
+
+def route_estimate(source, destination):
+    """The `RouteDistance` learned for a source/destination pair, or None"""
+    origin_id, destination_id = find_location_id(source), find_location_id(destination)
+    if origin_id is None or destination_id is None:
+        return None
+    return RouteDistance.query.filter_by(origin_id=origin_id, destination_id=destination_id).first()
+
+
+def _medians(distances, fuel):
+    distances = np.asarray([value for value in distances if value and value > 0], dtype=np.float64)
+    fuel = np.asarray([value for value in fuel if value and value > 0], dtype=np.float64)
+    return (float(np.median(distances)) if distances.size else None,
+            float(np.median(fuel)) if fuel.size else None)
+
+
+def record_trip_route(trip):
+    """Refresh the medians of a completed trip's pair (adds to the session, no commit)"""
+    if trip.source_location_id is None or trip.destination_location_id is None:
+        db.session.flush()
+    if trip.source_location_id is None or trip.destination_location_id is None:
+        return None
+
+    rows = db.session.query(Trip.distance, Trip.fuel_used).filter(
+        Trip.source_location_id == trip.source_location_id,
+        Trip.destination_location_id == trip.destination_location_id,
+        Trip.status == 'completed'
+    ).order_by(Trip.trip_date.desc(), Trip.id.desc()).limit(ROUTE_SAMPLE_SIZE).all()
+    median_distance, median_fuel = _medians([row[0] for row in rows], [row[1] for row in rows])
+
+    route = RouteDistance.query.filter_by(
+        origin_id=trip.source_location_id, destination_id=trip.destination_location_id
+    ).first()
+    if route is None:
+        route = RouteDistance(origin_id=trip.source_location_id, destination_id=trip.destination_location_id)
+        db.session.add(route)
+    route.trip_count = len(rows)
+    route.median_distance = median_distance
+    route.median_fuel = median_fuel
+    return route
+
+
+def link_unlinked_trips(tables=None):
+    """Set the location ids of trips written without the ORM (bulk loads, older rows)"""
+    linked = 0
+    for table in tables or (Trip.__table__, archived_trip):
+        for text_column, id_column in ((table.c.source, table.c.source_location_id),
+                                       (table.c.destination, table.c.destination_location_id)):
+            names = db.session.execute(select(text_column).where(id_column.is_(None)).distinct()).scalars().all()
+            try:
+                for name in names:
+                    linked += db.session.execute(
+                        update(table).where(id_column.is_(None), text_column == name)
+                        .values({id_column.name: resolve_location_id(name)})
+                    ).rowcount
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+    return linked
+
+
+def rebuild_route_matrix(tables=None):
+    """Link unlinked trips (in `tables`, default hot and archived), then recompute every pair's medians"""
+    started = time.monotonic()
+    linked = link_unlinked_trips(tables)
+
+    rows = db.session.query(
+        Trip.source_location_id, Trip.destination_location_id, Trip.distance, Trip.fuel_used
+    ).filter(
+        Trip.status == 'completed',
+        Trip.source_location_id.isnot(None),
+        Trip.destination_location_id.isnot(None)
+    ).order_by(
+        Trip.source_location_id, Trip.destination_location_id, Trip.trip_date.desc(), Trip.id.desc()
+    ).all()
+
+    routes = []
+    now = datetime.utcnow()
+    position = 0
+    while position < len(rows):
+        pair = rows[position][:2]
+        end = position
+        while end < len(rows) and rows[end][:2] == pair:
+            end += 1
+        sample = rows[position:min(end, position + ROUTE_SAMPLE_SIZE)]
+        median_distance, median_fuel = _medians([row[2] for row in sample], [row[3] for row in sample])
+        routes.append({
+            'origin_id': pair[0],
+            'destination_id': pair[1],
+            'trip_count': len(sample),
+            'median_distance': median_distance,
+            'median_fuel': median_fuel,
+            'updated_at': now
+        })
+        position = end
+
+    try:
+        db.session.execute(delete(RouteDistance))
+        if routes:
+            db.session.execute(insert(RouteDistance), routes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'linked_trips': linked,
+        'routes': len(routes),
+        'trips': len(rows),
+        'duration_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+if __name__ == '__main__':
+    from src.main import app
+
+    with app.app_context():
+        summary = rebuild_route_matrix()
+        print(f"Linked {summary['linked_trips']} trips; {summary['routes']} routes from "
+              f"{summary['trips']} completed trips in {summary['duration_ms']} ms.")
@@ -12,6 +12,15 @@ from src.routes.driver import driver_bp
 from src.routes.trip import trip_bp
 from src.routes.maintenance import maintenance_bp
 from src.routes.analytics import analytics_bp
+from src.routes.events import events_bp
+from src.routes.admin import admin_bp
+from src.routes.sync import sync_bp
+from src.routes.fuel_price import fuel_price_bp
+from src.search import install_search_indexes
+from src.listing import ensure_columns, ensure_indexes
+from src.scheduler import scheduler
+from src import metrics, slowlog, querybudget, admission, archive, columnar
+import src.jobs
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -19,6 +28,15 @@ app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 # Enable CORS for all routes
 CORS(app)
 
+# Latency, status and SQL metrics for every request
+metrics.init_app(app)
+# Log statements slower than SLOW_QUERY_THRESHOLD_MS with their query plan
+slowlog.init_app(app)
+# N+1 detection for development and tests (QUERY_BUDGET_MODE=log or raise)
+querybudget.init_app(app)
+# Per-user rate limits and concurrency limits (429/503 with Retry-After)
+admission.init_app(app)
+
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(vehicle_bp, url_prefix='/api')
@@ -26,13 +44,32 @@ app.register_blueprint(driver_bp, url_prefix='/api')
 app.register_blueprint(trip_bp, url_prefix='/api')
 app.register_blueprint(maintenance_bp, url_prefix='/api')
 app.register_blueprint(analytics_bp, url_prefix='/api')
+app.register_blueprint(events_bp, url_prefix='/api')
+app.register_blueprint(admin_bp, url_prefix='/api')
+app.register_blueprint(sync_bp, url_prefix='/api')
+app.register_blueprint(fuel_price_bp, url_prefix='/api')
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
+# Old closed trips and maintenance live in an attached archive database
+archive.init_app(app)
 with app.app_context():
     db.create_all()
+    ensure_columns()
+    ensure_indexes()
+    install_search_indexes()
+
+# Optional columnar trip snapshot for the analytics scans (COLUMNAR_STORE=1)
+columnar.init_app(app)
+
+# Background jobs; set SCHEDULER_ENABLED=0 to keep a process from running them
+scheduler.init_app(app)
+if os.environ.get('SCHEDULER_ENABLED', '1') != '0':
+    scheduler.start()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,187 @@
+"""Per-request performance instrumentation.
+
+Every request records its latency, status code and the number and duration
+of the SQL statements it ran (counted through SQLAlchemy cursor events).
+Totals are kept in process memory and rendered in the Prometheus text format
+by `GET /api/admin/metrics`; each response also carries a `Server-Timing`
+header so the numbers show up in the browser's network panel.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; roughly the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms keyed by label values"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _metric(self, name, kind, help_text, label_names, buckets=None):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = {'kind': kind, 'help': help_text, 'labels': label_names, 'buckets': buckets, 'values': {}}
+            self._metrics[name] = metric
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        with self._lock:
+            self._metric(name, 'counter', help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        with self._lock:
+            self._metric(name, 'gauge', help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        with self._lock:
+            self._metric(name, 'histogram', help_text, label_names, buckets)
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            values = self._metrics[name]['values']
+            values[labels] = values.get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            metric = self._metrics[name]
+            histogram = metric['values'].get(labels)
+            if histogram is None:
+                histogram = metric['values'][labels] = Histogram(metric['buckets'])
+            histogram.observe(value)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                lines.append(f'# HELP {name} {metric["help"]}')
+                lines.append(f'# TYPE {name} {metric["kind"]}')
+                label_names = metric['labels']
+                for labels, value in sorted(metric['values'].items()):
+                    if metric['kind'] != 'histogram':
+                        lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(metric['buckets'] + (float('inf'),), value.counts):
+                        cumulative += count
+                        le = f'le="{_number(bound)}"'
+                        lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(label_names, labels)} {_number(value.sum)}')
+                    lines.append(f'{name}_count{_labels(label_names, labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.counter('http_requests_total', 'HTTP requests by endpoint and status code.',
+                ('method', 'endpoint', 'status'))
+metrics.histogram('http_request_duration_seconds', 'HTTP request latency in seconds.',
+                  ('method', 'endpoint'))
+metrics.gauge('http_requests_in_flight', 'HTTP requests currently being served.')
+metrics.histogram('http_request_db_queries', 'SQL statements run per HTTP request.',
+                  ('method', 'endpoint'), buckets=QUERY_COUNT_BUCKETS)
+metrics.histogram('http_request_db_duration_seconds', 'Time spent in SQL per HTTP request, in seconds.',
+                  ('method', 'endpoint'))
+
+
+def _endpoint_label():
+    # The URL rule, not the path, so /vehicles/1 and /vehicles/2 share a series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+    metrics.inc('http_requests_in_flight')
+
+
+def _after_request(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+
+    elapsed = time.perf_counter() - started
+    labels = (request.method, _endpoint_label())
+    metrics.inc('http_requests_total', labels + (str(response.status_code),))
+    metrics.observe('http_request_duration_seconds', labels, elapsed)
+    metrics.observe('http_request_db_queries', labels, g.sql_queries)
+    metrics.observe('http_request_db_duration_seconds', labels, g.sql_seconds)
+
+    response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+    response.headers.add('Server-Timing', f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_queries} queries"')
+    return response
+
+
+def _teardown_request(exception=None):
+    if g.pop('metrics_started', None) is not None:
+        metrics.inc('http_requests_in_flight', amount=-1)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    # Only statements run while serving a request are attributed to it;
+    # background threads have no metrics_started in their g
+    if has_app_context() and 'metrics_started' in g:
+        g.sql_queries += 1
+        g.sql_seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # after_cursor_execute is skipped for failed statements
+    connection = context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def init_app(app):
+    """Install the request hooks on `app`"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
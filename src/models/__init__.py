@@ -3,6 +3,18 @@ from src.models.vehicle import Vehicle
 from src.models.driver import Driver
 from src.models.trip import Trip
 from src.models.maintenance import Maintenance
+from src.models.prediction import MaintenancePrediction
+from src.models.anomaly import VehicleEfficiencyStats, FuelAnomaly
+from src.models.job import ScheduledJob
+from src.models.archive import ArchivedTripRollup, ArchivedMaintenanceRollup
+from src.models.sync import SyncTombstone
+from src.models.location import Location, RouteDistance
+from src.models.scorecard import DriverScorecard
+from src.models.sketch import TripSketch
+from src.models.fuel_price import FuelPrice
 
-__all__ = ['db', 'User', 'Vehicle', 'Driver', 'Trip', 'Maintenance']
+__all__ = ['db', 'User', 'Vehicle', 'Driver', 'Trip', 'Maintenance', 'MaintenancePrediction',
+           'VehicleEfficiencyStats', 'FuelAnomaly', 'ScheduledJob', 'ArchivedTripRollup',
+           'ArchivedMaintenanceRollup', 'SyncTombstone', 'Location', 'RouteDistance', 'DriverScorecard',
+           'TripSketch', 'FuelPrice']
 
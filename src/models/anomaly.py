@@ -0,0 +1,60 @@
+from src.models.user import db
+from datetime import datetime
+
+class VehicleEfficiencyStats(db.Model):
+    # Rolling (exponentially weighted) km/l statistics, one row per vehicle
+    id = db.Column(db.Integer, primary_key=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False, unique=True)
+    ewma_mean = db.Column(db.Float, nullable=False)
+    ewma_variance = db.Column(db.Float, nullable=False, default=0.0)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    last_trip_id = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    vehicle = db.relationship('Vehicle')
+
+    def __repr__(self):
+        return f'<VehicleEfficiencyStats vehicle={self.vehicle_id} mean={self.ewma_mean:.2f}>'
+
+    def to_dict(self):
+        return {
+            'vehicle_id': self.vehicle_id,
+            'ewma_mean': round(self.ewma_mean, 2),
+            'ewma_std': round(self.ewma_variance ** 0.5, 2),
+            'sample_count': self.sample_count,
+            'last_trip_id': self.last_trip_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class FuelAnomaly(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    trip_id = db.Column(db.Integer, db.ForeignKey('trip.id'), nullable=False, unique=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False, index=True)
+    trip_date = db.Column(db.Date, nullable=False, index=True)
+    km_per_liter = db.Column(db.Float, nullable=False)
+    expected_km_per_liter = db.Column(db.Float, nullable=False)
+    expected_std = db.Column(db.Float, nullable=False)
+    z_score = db.Column(db.Float, nullable=False)
+    direction = db.Column(db.String(10), nullable=False)  # low (possible theft/leak), high (suspect reading)
+    detected_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    trip = db.relationship('Trip', backref=db.backref('fuel_anomaly', uselist=False, cascade='all, delete-orphan'))
+    vehicle = db.relationship('Vehicle')
+
+    def __repr__(self):
+        return f'<FuelAnomaly trip={self.trip_id} z={self.z_score:.2f}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'trip_id': self.trip_id,
+            'vehicle_id': self.vehicle_id,
+            'trip_date': self.trip_date.isoformat() if self.trip_date else None,
+            'km_per_liter': round(self.km_per_liter, 2),
+            'expected_km_per_liter': round(self.expected_km_per_liter, 2),
+            'expected_std': round(self.expected_std, 2),
+            'z_score': round(self.z_score, 2),
+            'direction': self.direction,
+            'detected_at': self.detected_at.isoformat() if self.detected_at else None,
+            'vehicle': self.vehicle.to_dict() if self.vehicle else None
+        }
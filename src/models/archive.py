@@ -0,0 +1,58 @@
+from src.models.user import db
+from datetime import datetime
+
+class ArchivedTripRollup(db.Model):
+    # Totals of the trips moved to the archive, so all-time figures stay exact
+    id = db.Column(db.Integer, primary_key=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False)
+    trip_count = db.Column(db.Integer, nullable=False, default=0)
+    total_distance = db.Column(db.Float, nullable=False, default=0.0)
+    total_fuel = db.Column(db.Float, nullable=False, default=0.0)
+    # Trips with both distance and fuel above zero, as used for km/l
+    efficiency_distance = db.Column(db.Float, nullable=False, default=0.0)
+    efficiency_fuel = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('vehicle_id', 'driver_id', 'status', name='uq_archived_trip_rollup'),
+    )
+
+    def __repr__(self):
+        return f'<ArchivedTripRollup vehicle={self.vehicle_id} driver={self.driver_id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'vehicle_id': self.vehicle_id,
+            'driver_id': self.driver_id,
+            'status': self.status,
+            'trip_count': self.trip_count,
+            'total_distance': round(self.total_distance, 2),
+            'total_fuel': round(self.total_fuel, 2),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ArchivedMaintenanceRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
+    maintenance_type = db.Column(db.String(50), nullable=False)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    total_cost = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('vehicle_id', 'maintenance_type', name='uq_archived_maintenance_rollup'),
+    )
+
+    def __repr__(self):
+        return f'<ArchivedMaintenanceRollup vehicle={self.vehicle_id} {self.maintenance_type}>'
+
+    def to_dict(self):
+        return {
+            'vehicle_id': self.vehicle_id,
+            'maintenance_type': self.maintenance_type,
+            'record_count': self.record_count,
+            'total_cost': round(self.total_cost, 2),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
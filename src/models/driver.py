@@ -2,14 +2,20 @@ from src.models.user import db
 from datetime import datetime
 
 class Driver(db.Model):
+    __table_args__ = (
+        # Case-insensitive prefix search on the drivers list
+        db.Index('ix_driver_name_lower', db.text('lower(name)')),
+        db.Index('ix_driver_license_no_lower', db.text('lower(license_no)')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     license_no = db.Column(db.String(50), unique=True, nullable=False)
     phone = db.Column(db.String(20), nullable=True)
     email = db.Column(db.String(120), nullable=True)
-    status = db.Column(db.String(20), nullable=False, default='active')  # active, inactive
+    status = db.Column(db.String(20), nullable=False, default='active', index=True)  # active, inactive
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Foreign key to link with User (optional - if driver has a user account)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
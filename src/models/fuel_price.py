@@ -0,0 +1,28 @@
+from src.models.user import db
+from datetime import datetime
+
+class FuelPrice(db.Model):
+    # Price per liter of a fuel type from `effective_date` until the next price change
+    __table_args__ = (
+        db.UniqueConstraint('fuel_type', 'effective_date', name='uq_fuel_price_effective'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    fuel_type = db.Column(db.String(20), nullable=False)  # petrol, diesel, electric
+    effective_date = db.Column(db.Date, nullable=False)
+    price_per_liter = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FuelPrice {self.fuel_type} {self.effective_date} {self.price_per_liter}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'fuel_type': self.fuel_type,
+            'effective_date': self.effective_date.isoformat() if self.effective_date else None,
+            'price_per_liter': self.price_per_liter,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,35 @@
+from src.models.user import db
+from datetime import datetime
+
+class ScheduledJob(db.Model):
+    # Lease and run history of a background job, shared by every worker process
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    lease_owner = db.Column(db.String(200), nullable=True)  # worker currently running the job
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_duration_ms = db.Column(db.Float, nullable=True)
+    last_status = db.Column(db.String(20), nullable=True)  # running, success, failed
+    last_error = db.Column(db.Text, nullable=True)
+    run_count = db.Column(db.Integer, nullable=False, default=0)
+    failure_count = db.Column(db.Integer, nullable=False, default=0)
+    consecutive_failures = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ScheduledJob {self.name}>'
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'last_started_at': self.last_started_at.isoformat() if self.last_started_at else None,
+            'last_finished_at': self.last_finished_at.isoformat() if self.last_finished_at else None,
+            'last_duration_ms': self.last_duration_ms,
+            'last_status': self.last_status,
+            'last_error': self.last_error,
+            'run_count': self.run_count,
+            'failure_count': self.failure_count,
+            'consecutive_failures': self.consecutive_failures
+        }
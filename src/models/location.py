@@ -0,0 +1,48 @@
+from src.models.user import db
+from datetime import datetime
+
+class Location(db.Model):
+    # Trip endpoints, one row per normalized place name (see src/locations.py)
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    key = db.Column(db.String(200), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Location {self.name}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name
+        }
+
+class RouteDistance(db.Model):
+    # Origin-destination matrix learned from completed trips
+    id = db.Column(db.Integer, primary_key=True)
+    origin_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    destination_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    trip_count = db.Column(db.Integer, nullable=False, default=0)  # trips behind the medians
+    median_distance = db.Column(db.Float, nullable=True)
+    median_fuel = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    origin = db.relationship('Location', foreign_keys=[origin_id])
+    destination = db.relationship('Location', foreign_keys=[destination_id])
+
+    __table_args__ = (
+        db.UniqueConstraint('origin_id', 'destination_id', name='uq_route_distance_pair'),
+    )
+
+    def __repr__(self):
+        return f'<RouteDistance {self.origin_id}->{self.destination_id}>'
+
+    def to_dict(self):
+        return {
+            'origin_id': self.origin_id,
+            'destination_id': self.destination_id,
+            'trip_count': self.trip_count,
+            'median_distance': round(self.median_distance, 2) if self.median_distance is not None else None,
+            'median_fuel': round(self.median_fuel, 2) if self.median_fuel is not None else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -13,7 +13,7 @@ class Maintenance(db.Model):
     next_service_date = db.Column(db.Date, nullable=True)
     status = db.Column(db.String(20), nullable=False, default='completed')  # scheduled, in_progress, completed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f'<Maintenance {self.vehicle.reg_no if self.vehicle else "Unknown"} - {self.maintenance_type}>'
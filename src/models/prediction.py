@@ -0,0 +1,37 @@
+from src.models.user import db
+from datetime import datetime
+
+class MaintenancePrediction(db.Model):
+    # Latest output of the predictive-maintenance batch job, one row per vehicle
+    id = db.Column(db.Integer, primary_key=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False, unique=True)
+    last_service_date = db.Column(db.Date, nullable=True)
+    predicted_next_service_date = db.Column(db.Date, nullable=False)
+    predicted_interval_days = db.Column(db.Float, nullable=False)
+    predicted_cost = db.Column(db.Float, nullable=False, default=0.0)
+    risk_score = db.Column(db.Float, nullable=False, default=0.0, index=True)  # 0 (low) to 1 (high)
+    service_count = db.Column(db.Integer, nullable=False, default=0)
+    km_since_service = db.Column(db.Float, nullable=True)
+    km_per_day = db.Column(db.Float, nullable=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    vehicle = db.relationship('Vehicle')
+
+    def __repr__(self):
+        return f'<MaintenancePrediction vehicle={self.vehicle_id} risk={self.risk_score:.2f}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'vehicle_id': self.vehicle_id,
+            'last_service_date': self.last_service_date.isoformat() if self.last_service_date else None,
+            'predicted_next_service_date': self.predicted_next_service_date.isoformat() if self.predicted_next_service_date else None,
+            'predicted_interval_days': round(self.predicted_interval_days, 1),
+            'predicted_cost': round(self.predicted_cost, 2),
+            'risk_score': round(self.risk_score, 3),
+            'service_count': self.service_count,
+            'km_since_service': round(self.km_since_service, 1) if self.km_since_service is not None else None,
+            'km_per_day': round(self.km_per_day, 2) if self.km_per_day is not None else None,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None,
+            'vehicle': self.vehicle.to_dict() if self.vehicle else None
+        }
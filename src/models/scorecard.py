@@ -0,0 +1,45 @@
+from src.models.user import db
+from datetime import datetime
+
+class DriverScorecard(db.Model):
+    # Latest output of the driver scorecard batch, one row per driver, recomputed once a day
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False, unique=True)
+    scorecard_date = db.Column(db.Date, nullable=False, index=True)
+    trips = db.Column(db.Integer, nullable=False, default=0)
+    completed_trips = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_trips = db.Column(db.Integer, nullable=False, default=0)
+    completion_rate = db.Column(db.Float, nullable=True)  # completed / (completed + cancelled)
+    median_duration_hours = db.Column(db.Float, nullable=True)
+    p95_duration_hours = db.Column(db.Float, nullable=True)
+    fuel_efficiency = db.Column(db.Float, nullable=True)  # km per liter
+    fleet_efficiency = db.Column(db.Float, nullable=True)  # fleet km/l on the same vehicle models
+    efficiency_vs_fleet = db.Column(db.Float, nullable=True)  # > 1: more efficient than the fleet
+    score = db.Column(db.Float, nullable=True)
+    rank = db.Column(db.Integer, nullable=False, index=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    driver = db.relationship('Driver')
+
+    def __repr__(self):
+        return f'<DriverScorecard driver={self.driver_id} rank={self.rank}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'driver_id': self.driver_id,
+            'driver_name': self.driver.name if self.driver else None,
+            'scorecard_date': self.scorecard_date.isoformat() if self.scorecard_date else None,
+            'trips': self.trips,
+            'completed_trips': self.completed_trips,
+            'cancelled_trips': self.cancelled_trips,
+            'completion_rate': round(self.completion_rate, 3) if self.completion_rate is not None else None,
+            'median_duration_hours': round(self.median_duration_hours, 2) if self.median_duration_hours is not None else None,
+            'p95_duration_hours': round(self.p95_duration_hours, 2) if self.p95_duration_hours is not None else None,
+            'fuel_efficiency': round(self.fuel_efficiency, 2) if self.fuel_efficiency is not None else None,
+            'fleet_efficiency': round(self.fleet_efficiency, 2) if self.fleet_efficiency is not None else None,
+            'efficiency_vs_fleet': round(self.efficiency_vs_fleet, 3) if self.efficiency_vs_fleet is not None else None,
+            'score': round(self.score, 3) if self.score is not None else None,
+            'rank': self.rank,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
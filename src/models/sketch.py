@@ -0,0 +1,39 @@
+from src.models.user import db
+from datetime import datetime
+
+class TripSketch(db.Model):
+    # Quantile sketch of one trip metric for one vehicle or driver on one day (see src/sketches.py)
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'scope', 'scope_id', 'day', name='uq_trip_sketch'),
+        # Range scans for one metric across every vehicle or driver
+        db.Index('ix_trip_sketch_metric_day', 'metric', 'scope', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(20), nullable=False)  # duration_hours, km_per_liter
+    scope = db.Column(db.String(10), nullable=False)  # vehicle, driver
+    scope_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    minimum = db.Column(db.Float, nullable=False)
+    maximum = db.Column(db.Float, nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    buckets = db.Column(db.LargeBinary, nullable=False)  # packed (key int16, count uint32) pairs
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TripSketch {self.metric} {self.scope}={self.scope_id} {self.day}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'metric': self.metric,
+            'scope': self.scope,
+            'scope_id': self.scope_id,
+            'day': self.day.isoformat() if self.day else None,
+            'count': self.count,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'mean': self.total / self.count if self.count else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,22 @@
+from src.models.user import db
+from datetime import datetime
+
+class SyncTombstone(db.Model):
+    # Records deleted (or taken away from a driver) since a client last synced
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # vehicle, driver, trip, maintenance (~pruned: see src/sync.py)
+    entity_id = db.Column(db.Integer, nullable=False)
+    driver_id = db.Column(db.Integer, nullable=True, index=True)  # trips: the driver it was assigned to
+    reason = db.Column(db.String(20), nullable=False, default='deleted')  # deleted, reassigned, pruned
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<SyncTombstone {self.entity} {self.entity_id} {self.reason}>'
+
+    def to_dict(self):
+        return {
+            'entity': self.entity,
+            'id': self.entity_id,
+            'reason': self.reason,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
@@ -2,11 +2,25 @@ from src.models.user import db
 from datetime import datetime
 
 class Trip(db.Model):
+    __table_args__ = (
+        # Overlap lookups for open trips (src/availability.py); trip_date is
+        # padded to the stored DATETIME format so both sides compare as one
+        db.Index('ix_trip_vehicle_busy', 'vehicle_id', 'status',
+                 db.text("coalesce(start_time, trip_date || ' 00:00:00.000000')")),
+        db.Index('ix_trip_driver_busy', 'driver_id', 'status',
+                 db.text("coalesce(start_time, trip_date || ' 00:00:00.000000')")),
+        # Route analytics and the distance matrix (src/locations.py)
+        db.Index('ix_trip_route', 'source_location_id', 'destination_location_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
     source = db.Column(db.String(200), nullable=False)
     destination = db.Column(db.String(200), nullable=False)
+    # Set from source/destination on flush
+    source_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)
+    destination_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)
     distance = db.Column(db.Float, nullable=True)  # in kilometers
     fuel_used = db.Column(db.Float, nullable=True)  # in liters
     trip_date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
@@ -15,7 +29,7 @@ class Trip(db.Model):
     status = db.Column(db.String(20), nullable=False, default='planned')  # planned, in_progress, completed, cancelled
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f'<Trip {self.source} to {self.destination}>'
@@ -27,6 +41,8 @@ class Trip(db.Model):
             'driver_id': self.driver_id,
             'source': self.source,
             'destination': self.destination,
+            'source_location_id': self.source_location_id,
+            'destination_location_id': self.destination_location_id,
             'distance': self.distance,
             'fuel_used': self.fuel_used,
             'trip_date': self.trip_date.isoformat() if self.trip_date else None,
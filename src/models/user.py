@@ -5,11 +5,17 @@ from datetime import datetime
 db = SQLAlchemy()
 
 class User(db.Model):
+    __table_args__ = (
+        # Case-insensitive prefix search on the users list
+        db.Index('ix_user_username_lower', db.text('lower(username)')),
+        db.Index('ix_user_email_lower', db.text('lower(email)')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), nullable=False, default='driver')  # admin, manager, driver
+    role = db.Column(db.String(20), nullable=False, default='driver', index=True)  # admin, manager, driver
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
 
@@ -2,13 +2,19 @@ from src.models.user import db
 from datetime import datetime
 
 class Vehicle(db.Model):
+    __table_args__ = (
+        # Case-insensitive prefix search on the vehicles list
+        db.Index('ix_vehicle_reg_no_lower', db.text('lower(reg_no)')),
+        db.Index('ix_vehicle_model_lower', db.text('lower(model)')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     reg_no = db.Column(db.String(20), unique=True, nullable=False)
     model = db.Column(db.String(100), nullable=False)
-    fuel_type = db.Column(db.String(20), nullable=False)  # petrol, diesel, electric
-    status = db.Column(db.String(20), nullable=False, default='active')  # active, maintenance, inactive
+    fuel_type = db.Column(db.String(20), nullable=False, index=True)  # petrol, diesel, electric
+    status = db.Column(db.String(20), nullable=False, default='active', index=True)  # active, maintenance, inactive
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     trips = db.relationship('Trip', backref='vehicle', lazy=True)
@@ -0,0 +1,298 @@
+"""Fleet-wide predictive maintenance batch job.
+
+Loads every vehicle's service history and recent trip distance into NumPy
+arrays, fits per-vehicle service-interval and cost models for the whole fleet
+at once, and writes the predictions back in bulk:
+
+* `MaintenancePrediction` holds one row per vehicle (next service date,
+  expected cost and a 0-1 risk score);
+* the latest maintenance record of each vehicle gets its `next_service_date`
+  filled in, unless someone already entered one by hand.
+
+Run it with `python src/predictive.py` or `POST /api/maintenance/predictions/run`.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import func, insert, update, delete
+
+from src.models import db, Vehicle, Trip, Maintenance, MaintenancePrediction
+from src.archive import trip_source, maintenance_source
+
+# Fallbacks when the fleet has no usable history yet
+DEFAULT_INTERVAL_DAYS = 180.0
+DEFAULT_SERVICE_KM = 10000.0
+# Pseudo-observations pulling a vehicle's own interval towards the fleet median
+INTERVAL_SHRINKAGE = 2.0
+# Window used to estimate how many km a day each vehicle currently drives
+USAGE_WINDOW_DAYS = 90
+UNPLANNED_TYPES = ('repair', 'emergency')
+
+
+def _load_vehicles():
+    ids = np.fromiter((vehicle_id for (vehicle_id,) in
+                       db.session.query(Vehicle.id).order_by(Vehicle.id)), dtype=np.int64)
+    return ids
+
+
+def _positions(vehicle_ids, ids):
+    """Positions of `ids` in `vehicle_ids`, and which of them are there at all"""
+    positions = np.minimum(np.searchsorted(vehicle_ids, ids), max(vehicle_ids.size - 1, 0))
+    # Archived records may belong to vehicles deleted since
+    known = vehicle_ids[positions] == ids if vehicle_ids.size else np.zeros(ids.size, dtype=bool)
+    return positions, known
+
+
+def _load_history(vehicle_ids, today):
+    """Service history as parallel arrays, sorted by vehicle then date"""
+    # The whole history, archived records included
+    records = maintenance_source()
+    rows = db.session.query(
+        records.id,
+        records.vehicle_id,
+        records.date,
+        records.cost,
+        records.mileage,
+        records.maintenance_type,
+        records.next_service_date
+    ).filter(
+        records.status != 'scheduled',
+        records.date <= today
+    ).order_by(records.vehicle_id, records.date, records.id).all()
+
+    count = len(rows)
+    history = {
+        'id': np.empty(count, dtype=np.int64),
+        'vehicle': np.empty(count, dtype=np.int64),
+        'day': np.empty(count, dtype=np.int64),
+        'cost': np.empty(count, dtype=np.float64),
+        'mileage': np.empty(count, dtype=np.float64),
+        'unplanned': np.empty(count, dtype=np.float64),
+        'has_next': np.empty(count, dtype=bool)
+    }
+    for i, (record_id, vehicle_id, day, cost, mileage, maintenance_type, next_service) in enumerate(rows):
+        history['id'][i] = record_id
+        history['vehicle'][i] = vehicle_id
+        history['day'][i] = day.toordinal()
+        history['cost'][i] = cost or 0.0
+        history['mileage'][i] = mileage if mileage is not None else np.nan
+        history['unplanned'][i] = maintenance_type in UNPLANNED_TYPES
+        history['has_next'][i] = next_service is not None
+
+    # Map vehicle ids to dense 0..V-1 indexes for bincount
+    history['vehicle'], known = _positions(vehicle_ids, history['vehicle'])
+    return {name: values[known] for name, values in history.items()}
+
+
+def _per_vehicle(index, weights, size):
+    return np.bincount(index, weights=weights, minlength=size)
+
+
+def _load_distances(vehicle_ids, today):
+    """Distance driven since each vehicle's last service, and recent km/day"""
+    size = vehicle_ids.size
+    records = maintenance_source()
+    last_service = db.session.query(
+        records.vehicle_id.label('vehicle_id'),
+        func.max(records.date).label('last_date')
+    ).filter(
+        records.status != 'scheduled',
+        records.date <= today
+    ).group_by(records.vehicle_id).subquery()
+
+    # The last service may predate the archive cut-off
+    trips = trip_source()
+    since_service = db.session.query(
+        trips.vehicle_id, func.sum(trips.distance)
+    ).outerjoin(
+        last_service, last_service.c.vehicle_id == trips.vehicle_id
+    ).filter(
+        trips.status == 'completed',
+        trips.distance.isnot(None),
+        (last_service.c.last_date.is_(None)) | (trips.trip_date > last_service.c.last_date)
+    ).group_by(trips.vehicle_id).all()
+
+    window_start = date.fromordinal(today.toordinal() - USAGE_WINDOW_DAYS)
+    trips = trip_source(window_start)
+    recent = db.session.query(
+        trips.vehicle_id, func.sum(trips.distance)
+    ).filter(
+        trips.status == 'completed',
+        trips.distance.isnot(None),
+        trips.trip_date > window_start,
+        trips.trip_date <= today
+    ).group_by(trips.vehicle_id).all()
+
+    km_since = np.zeros(size)
+    km_per_day = np.zeros(size)
+    for target, rows, scale in ((km_since, since_service, 1.0), (km_per_day, recent, USAGE_WINDOW_DAYS)):
+        if rows:
+            ids, totals = zip(*rows)
+            index, known = _positions(vehicle_ids, np.asarray(ids, dtype=np.int64))
+            target[index[known]] = np.asarray(totals, dtype=np.float64)[known] / scale
+    return km_since, km_per_day
+
+
+def fit_fleet(vehicle_ids, history, km_since, km_per_day, today):
+    """Fit every vehicle's interval and cost model with vectorized operations.
+
+    Returns a dict of arrays indexed like `vehicle_ids`.
+    """
+    size = vehicle_ids.size
+    today_day = today.toordinal()
+    vehicle = history['vehicle']
+    day = history['day']
+    cost = history['cost']
+
+    services = _per_vehicle(vehicle, None, size)
+    has_history = services > 0
+
+    # Last service per vehicle: rows are sorted, so take each group's last row
+    is_last = np.ones(vehicle.size, dtype=bool)
+    is_last[:-1] = vehicle[1:] != vehicle[:-1]
+    last_day = np.full(size, today_day, dtype=np.int64)
+    last_day[vehicle[is_last]] = day[is_last]
+
+    # Interval model: shrink each vehicle's mean gap towards the fleet median
+    same = vehicle[1:] == vehicle[:-1]
+    gaps = (day[1:] - day[:-1])[same].astype(np.float64)
+    gap_vehicle = vehicle[1:][same]
+    fleet_interval = float(np.median(gaps[gaps > 0])) if np.any(gaps > 0) else DEFAULT_INTERVAL_DAYS
+    gap_count = _per_vehicle(gap_vehicle, None, size)
+    gap_sum = _per_vehicle(gap_vehicle, gaps, size)
+    gap_sq = _per_vehicle(gap_vehicle, gaps ** 2, size)
+    interval = (gap_sum + INTERVAL_SHRINKAGE * fleet_interval) / (gap_count + INTERVAL_SHRINKAGE)
+    interval = np.maximum(interval, 1.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gap_mean = np.where(gap_count > 0, gap_sum / gap_count, 0.0)
+        gap_std = np.sqrt(np.maximum(np.where(gap_count > 0, gap_sq / gap_count, 0.0) - gap_mean ** 2, 0.0))
+        variability = np.clip(np.where(gap_mean > 0, gap_std / gap_mean, 0.0), 0.0, 1.0)
+
+    # Distance model: fleet median km between services (from odometer readings)
+    mileage = history['mileage']
+    same_mileage = same & np.isfinite(mileage[1:]) & np.isfinite(mileage[:-1])
+    km_gaps = (mileage[1:] - mileage[:-1])[same_mileage]
+    km_gaps = km_gaps[km_gaps > 0]
+    service_km = float(np.median(km_gaps)) if km_gaps.size else DEFAULT_SERVICE_KM
+
+    # Cost model: per-vehicle least-squares line of cost over time
+    x = (day - today_day).astype(np.float64)
+    sum_x = _per_vehicle(vehicle, x, size)
+    sum_y = _per_vehicle(vehicle, cost, size)
+    sum_xx = _per_vehicle(vehicle, x * x, size)
+    sum_xy = _per_vehicle(vehicle, x * cost, size)
+    denominator = services * sum_xx - sum_x ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where((services >= 2) & (denominator > 0),
+                         (services * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        mean_x = np.where(has_history, sum_x / services, 0.0)
+        mean_y = np.where(has_history, sum_y / services, 0.0)
+    fleet_cost = float(cost.mean()) if cost.size else 0.0
+
+    # Next service: whichever comes first, the time or the distance threshold
+    due_by_time = last_day + interval
+    remaining_km = np.maximum(service_km - km_since, 0.0)
+    with np.errstate(divide='ignore'):
+        due_by_distance = np.where(km_per_day > 0, today_day + remaining_km / km_per_day, np.inf)
+    next_day = np.minimum(due_by_time, due_by_distance)
+    next_day = np.maximum(np.rint(next_day), today_day).astype(np.int64)
+
+    predicted_cost = np.where(has_history, mean_y + slope * ((next_day - today_day) - mean_x), fleet_cost)
+    predicted_cost = np.maximum(predicted_cost, 0.0)
+
+    # Risk: how far along the service cycle the vehicle is (by time or by
+    # distance), raised by a history of repairs/emergencies and irregular gaps
+    elapsed_ratio = np.where(has_history, (today_day - last_day) / interval, 0.5)
+    usage_ratio = np.maximum(elapsed_ratio, km_since / service_km)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        unplanned_share = np.where(has_history, _per_vehicle(vehicle, history['unplanned'], size) / services, 0.0)
+    risk = 1.0 / (1.0 + np.exp(-(4.0 * (usage_ratio - 1.0) + 1.5 * unplanned_share + 0.5 * variability)))
+
+    return {
+        'services': services.astype(np.int64),
+        'has_history': has_history,
+        'last_day': last_day,
+        'interval': next_day - np.where(has_history, last_day, today_day),
+        'next_day': next_day,
+        'predicted_cost': predicted_cost,
+        'risk': risk,
+        'is_last': is_last
+    }
+
+
+def run_predictions(today=None):
+    """Recompute predictions for the whole fleet and store them.
+
+    Returns a short summary of the run.
+    """
+    started = time.monotonic()
+    today = today or date.today()
+
+    vehicle_ids = _load_vehicles()
+    history = _load_history(vehicle_ids, today)
+    km_since, km_per_day = _load_distances(vehicle_ids, today)
+    fit = fit_fleet(vehicle_ids, history, km_since, km_per_day, today)
+
+    computed_at = datetime.utcnow()
+    predictions = [
+        {
+            'vehicle_id': int(vehicle_ids[i]),
+            'last_service_date': date.fromordinal(int(fit['last_day'][i])) if fit['has_history'][i] else None,
+            'predicted_next_service_date': date.fromordinal(int(fit['next_day'][i])),
+            'predicted_interval_days': float(fit['interval'][i]),
+            'predicted_cost': float(fit['predicted_cost'][i]),
+            'risk_score': float(fit['risk'][i]),
+            'service_count': int(fit['services'][i]),
+            'km_since_service': float(km_since[i]),
+            'km_per_day': float(km_per_day[i]),
+            'computed_at': computed_at
+        }
+        for i in range(vehicle_ids.size)
+    ]
+
+    # Fill next_service_date on each vehicle's latest record, but never
+    # overwrite a date someone entered by hand
+    fill = fit['is_last'] & ~history['has_next']
+    updates = [
+        {'id': int(record_id), 'next_service_date': date.fromordinal(int(fit['next_day'][vehicle_index]))}
+        for record_id, vehicle_index in zip(history['id'][fill], history['vehicle'][fill])
+    ]
+    if updates:
+        # Archived records are read-only
+        hot = {record_id for (record_id,) in db.session.query(Maintenance.id).filter(
+            Maintenance.id.in_([item['id'] for item in updates]))}
+        updates = [item for item in updates if item['id'] in hot]
+
+    try:
+        db.session.execute(delete(MaintenancePrediction))
+        if predictions:
+            db.session.execute(insert(MaintenancePrediction), predictions)
+        if updates:
+            db.session.execute(update(Maintenance), updates)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'vehicles': int(vehicle_ids.size),
+        'service_records': int(history['id'].size),
+        'next_service_dates_filled': len(updates),
+        'duration_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+if __name__ == '__main__':
+    from src.main import app
+
+    with app.app_context():
+        summary = run_predictions()
+        print(f"Predictions computed for {summary['vehicles']} vehicles "
+              f"({summary['service_records']} service records) in {summary['duration_ms']} ms; "
+              f"{summary['next_service_dates_filled']} next_service_date values filled.")
@@ -0,0 +1,118 @@
+"""Per-endpoint SQL query budgets, to catch N+1 regressions.
+
+Declare a budget on a view with `@query_budget(n)`. With
+`QUERY_BUDGET_MODE` set to `log` (development) or `raise` (tests), every
+request counts its statements and, when a route goes over its budget, logs a
+report listing the statement shapes repeated within the request - the usual
+signature of an N+1 pattern. In `raise` mode the response is replaced by a
+500 carrying the same report. The default mode, `off`, adds no overhead.
+"""
+
+import logging
+import os
+from collections import Counter
+
+from flask import g, request, current_app, jsonify, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.slowlog import fingerprint
+
+MODES = ('off', 'log', 'raise')
+
+logger = logging.getLogger('crislina.query_budget')
+
+_mode = 'off'
+_default_budget = None
+
+
+def query_budget(max_queries):
+    """Decorator declaring how many SQL statements a view may run per request"""
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+    return decorator
+
+
+def _view_budget():
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(view, 'query_budget', _default_budget)
+
+
+def build_report(statements, budget, endpoint):
+    """Summarise a request's statements, most repeated shapes first"""
+    shapes = Counter()
+    samples = {}
+    for statement in statements:
+        key, normalised = fingerprint(statement)
+        shapes[key] += 1
+        samples.setdefault(key, normalised)
+    return {
+        'endpoint': endpoint,
+        'budget': budget,
+        'queries': len(statements),
+        'repeated': [
+            {'count': count, 'statement': samples[key]}
+            for key, count in shapes.most_common() if count > 1
+        ]
+    }
+
+
+def _before_request():
+    g.query_budget_statements = []
+
+
+def _after_request(response):
+    statements = g.pop('query_budget_statements', None)
+    if statements is None:
+        return response
+
+    budget = _view_budget()
+    response.headers['X-Query-Count'] = str(len(statements))
+    if budget is None:
+        return response
+    response.headers['X-Query-Budget'] = str(budget)
+    if len(statements) <= budget:
+        return response
+
+    endpoint = f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+    report = build_report(statements, budget, endpoint)
+    logger.warning('Query budget exceeded: %s ran %d statements (budget %d); repeated shapes: %s',
+                   endpoint, report['queries'], budget,
+                   '; '.join(f"{item['count']}x {item['statement'][:200]}" for item in report['repeated']) or 'none')
+    if _mode != 'raise':
+        return response
+
+    failure = jsonify({
+        'success': False,
+        'message': f'Query budget exceeded: {report["queries"]} statements (budget {budget})',
+        'query_report': report
+    })
+    failure.status_code = 500
+    return failure
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _mode == 'off' or conn.info.get('explaining') or not has_app_context():
+        return
+    statements = g.get('query_budget_statements')
+    if statements is not None:
+        statements.append(statement)
+
+
+def init_app(app):
+    """Enable budget checks according to `QUERY_BUDGET_MODE` (off, log or raise)"""
+    global _mode, _default_budget
+
+    mode = app.config.get('QUERY_BUDGET_MODE', os.environ.get('QUERY_BUDGET_MODE', 'off'))
+    if mode not in MODES:
+        raise ValueError(f'Invalid QUERY_BUDGET_MODE. Must be one of: {list(MODES)}')
+    _mode = mode
+    # Budget for views without @query_budget; None leaves them unchecked
+    default = app.config.get('QUERY_BUDGET_DEFAULT', os.environ.get('QUERY_BUDGET_DEFAULT'))
+    _default_budget = int(default) if default is not None else None
+
+    if _mode != 'off':
+        app.before_request(_before_request)
+        app.after_request(_after_request)
@@ -0,0 +1,100 @@
+from flask import Blueprint, Response, request, jsonify
+from src.auth import admin_required
+from src.scheduler import scheduler
+from src.metrics import metrics
+from src.slowlog import slow_queries
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/admin/jobs', methods=['GET'])
+@admin_required
+def get_jobs(current_user):
+    """Get background jobs with their last run, duration and failures (admin only)"""
+    try:
+        jobs = scheduler.describe_jobs()
+        
+        return jsonify({
+            'success': True,
+            'data': jobs,
+            'count': len(jobs)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching jobs: {str(e)}'
+        }), 500
+
+@admin_bp.route('/admin/jobs/<string:name>/run', methods=['POST'])
+@admin_required
+def run_job(name, current_user):
+    """Queue a background job to run now (admin only)"""
+    try:
+        if not scheduler.has_job(name):
+            return jsonify({
+                'success': False,
+                'message': 'Job not found'
+            }), 404
+        
+        if not scheduler.run_now(name):
+            return jsonify({
+                'success': False,
+                'message': 'Job is already running'
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'message': 'Job queued successfully'
+        }), 202
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error running job: {str(e)}'
+        }), 500
+
+@admin_bp.route('/admin/metrics', methods=['GET'])
+@admin_required
+def get_metrics(current_user):
+    """Get request and SQL metrics in the Prometheus text format (admin only)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/admin/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries(current_user):
+    """Get the slowest statement fingerprints seen by this process (admin only)"""
+    try:
+        limit = request.args.get('limit', default=20, type=int)
+        order = request.args.get('order', default='total')
+        
+        if order not in ('total', 'max', 'count'):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid order. Must be one of: total, max, count'
+            }), 400
+        
+        entries = slow_queries.top(max(1, min(limit, 100)), order)
+        
+        return jsonify({
+            'success': True,
+            'data': entries,
+            'count': len(entries),
+            'threshold_ms': slow_queries.threshold_ms
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching slow queries: {str(e)}'
+        }), 500
+
+@admin_bp.route('/admin/slow-queries', methods=['DELETE'])
+@admin_required
+def reset_slow_queries(current_user):
+    """Clear the slow-query statistics (admin only)"""
+    slow_queries.reset()
+    
+    return jsonify({
+        'success': True,
+        'message': 'Slow-query statistics cleared successfully'
+    }), 200
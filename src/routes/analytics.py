@@ -1,62 +1,106 @@
-from flask import Blueprint, request, jsonify
-from src.models import db, Trip, Vehicle, Driver, Maintenance
-from src.auth import token_required
+from flask import Blueprint, request, jsonify, current_app, g
+from src.models import db, Trip, Vehicle, Driver, Maintenance, VehicleEfficiencyStats, FuelAnomaly, Location, RouteDistance, DriverScorecard, TripSketch
+from src.auth import token_required, admin_or_manager_required
+from src.listing import apply_sort, paginated_response, MAX_PER_PAGE
+from src.anomalies import backfill as backfill_fuel_anomalies
+from src.scorecards import compute_scorecards, ensure_scorecards
+from src.sketches import METRICS as SKETCH_METRICS, RELATIVE_ERROR, merged_sketch
+from src.tco import tco_report
+from src.compliance import violations as hos_violations, LIMITS as HOS_LIMITS
+from src.querybudget import query_budget
+from src.slowlog import current_route
+from src.archive import trip_source, maintenance_source, archived_trip_totals
+from src import timeseries, columnar
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, extract
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from sqlalchemy import func, extract, case
+from sqlalchemy.orm import joinedload, aliased
+import threading
+import time
 
 analytics_bp = Blueprint('analytics', __name__)
 
+# Small shared pool for the dashboard bundle; each widget runs in its own
+# app context so it gets its own session and connection.
+DASHBOARD_BUNDLE_WORKERS = 4
+DASHBOARD_WIDGET_TIMEOUT = 10  # seconds
+
+_dashboard_executor = ThreadPoolExecutor(
+    max_workers=DASHBOARD_BUNDLE_WORKERS,
+    thread_name_prefix='dashboard-bundle'
+)
+_widget_accounting_lock = threading.Lock()
+
+def compute_dashboard_stats():
+    """Compute the headline counts and totals shown on the dashboard"""
+    # Basic counts
+    total_vehicles = Vehicle.query.count()
+    active_vehicles = Vehicle.query.filter_by(status='active').count()
+    total_drivers = Driver.query.count()
+    active_drivers = Driver.query.filter_by(status='active').count()
+    total_trips = Trip.query.count()
+    completed_trips = Trip.query.filter_by(status='completed').count()
+    
+    # Recent trips (last 30 days)
+    thirty_days_ago = date.today() - timedelta(days=30)
+    recent = trip_source(thirty_days_ago)
+    recent_trips = db.session.query(func.count(recent.id)).filter(recent.trip_date >= thirty_days_ago).scalar()
+    
+    # Total distance and fuel
+    total_distance = db.session.query(func.sum(Trip.distance)).filter(Trip.distance.isnot(None)).scalar() or 0
+    total_fuel = db.session.query(func.sum(Trip.fuel_used)).filter(Trip.fuel_used.isnot(None)).scalar() or 0
+    
+    # All-time totals also count the archived trips, through their rollups
+    archived = archived_trip_totals('status')
+    for status, count, distance, fuel in db.session.query(
+        archived.c.status, archived.c.trip_count, archived.c.total_distance, archived.c.total_fuel
+    ):
+        total_trips += count
+        completed_trips += count if status == 'completed' else 0
+        total_distance += distance or 0
+        total_fuel += fuel or 0
+    
+    # Maintenance costs (last 30 days)
+    records = maintenance_source(thirty_days_ago)
+    recent_maintenance_cost = db.session.query(func.sum(records.cost)).filter(
+        records.date >= thirty_days_ago
+    ).scalar() or 0
+    
+    stats = {
+        'vehicles': {
+            'total': total_vehicles,
+            'active': active_vehicles,
+            'maintenance': Vehicle.query.filter_by(status='maintenance').count(),
+            'inactive': Vehicle.query.filter_by(status='inactive').count()
+        },
+        'drivers': {
+            'total': total_drivers,
+            'active': active_drivers,
+            'inactive': Driver.query.filter_by(status='inactive').count()
+        },
+        'trips': {
+            'total': total_trips,
+            'completed': completed_trips,
+            'in_progress': Trip.query.filter_by(status='in_progress').count(),
+            'planned': Trip.query.filter_by(status='planned').count(),
+            'recent_30_days': recent_trips
+        },
+        'totals': {
+            'distance': round(total_distance, 2),
+            'fuel_used': round(total_fuel, 2),
+            'recent_maintenance_cost': round(recent_maintenance_cost, 2)
+        }
+    }
+    
+    return stats
+
 @analytics_bp.route('/analytics/dashboard', methods=['GET'])
+@query_budget(20)
 @token_required
 def get_dashboard_stats(current_user):
     """Get overall dashboard statistics"""
     try:
-        # Basic counts
-        total_vehicles = Vehicle.query.count()
-        active_vehicles = Vehicle.query.filter_by(status='active').count()
-        total_drivers = Driver.query.count()
-        active_drivers = Driver.query.filter_by(status='active').count()
-        total_trips = Trip.query.count()
-        completed_trips = Trip.query.filter_by(status='completed').count()
-        
-        # Recent trips (last 30 days)
-        thirty_days_ago = date.today() - timedelta(days=30)
-        recent_trips = Trip.query.filter(Trip.trip_date >= thirty_days_ago).count()
-        
-        # Total distance and fuel
-        total_distance = db.session.query(func.sum(Trip.distance)).filter(Trip.distance.isnot(None)).scalar() or 0
-        total_fuel = db.session.query(func.sum(Trip.fuel_used)).filter(Trip.fuel_used.isnot(None)).scalar() or 0
-        
-        # Maintenance costs (last 30 days)
-        recent_maintenance_cost = db.session.query(func.sum(Maintenance.cost)).filter(
-            Maintenance.date >= thirty_days_ago
-        ).scalar() or 0
-        
-        stats = {
-            'vehicles': {
-                'total': total_vehicles,
-                'active': active_vehicles,
-                'maintenance': Vehicle.query.filter_by(status='maintenance').count(),
-                'inactive': Vehicle.query.filter_by(status='inactive').count()
-            },
-            'drivers': {
-                'total': total_drivers,
-                'active': active_drivers,
-                'inactive': Driver.query.filter_by(status='inactive').count()
-            },
-            'trips': {
-                'total': total_trips,
-                'completed': completed_trips,
-                'in_progress': Trip.query.filter_by(status='in_progress').count(),
-                'planned': Trip.query.filter_by(status='planned').count(),
-                'recent_30_days': recent_trips
-            },
-            'totals': {
-                'distance': round(total_distance, 2),
-                'fuel_used': round(total_fuel, 2),
-                'recent_maintenance_cost': round(recent_maintenance_cost, 2)
-            }
-        }
+        stats = compute_dashboard_stats()
         
         return jsonify({
             'success': True,
@@ -69,79 +113,124 @@ def get_dashboard_stats(current_user):
             'message': f'Error fetching dashboard stats: {str(e)}'
         }), 500
 
+def _trend_periods(granularity, periods, days):
+    """Resolve how many buckets back a trend reaches from the legacy `days` argument"""
+    if periods is not None:
+        return max(periods, 0)
+    if granularity == 'week':
+        return max(days // 7, 1)
+    if granularity == 'month':
+        return max(days // 30, 1)
+    return days
+
+def _trend_group(dimensions, group_by):
+    """Look up the series dimension for `group_by`, if any"""
+    if not group_by:
+        return None, ()
+    if group_by not in dimensions:
+        raise ValueError(f'Invalid group_by. Must be one of: {list(dimensions)}')
+    return dimensions[group_by]
+
+# Series dimensions: group_by -> ((key column, label column), joins), for
+# the trip or maintenance source a trend reads from
+def trip_trend_dimensions(trips):
+    vehicle = (Vehicle, trips.vehicle_id == Vehicle.id)
+    return {
+        'vehicle': ((trips.vehicle_id, Vehicle.reg_no), (vehicle,)),
+        'driver': ((trips.driver_id, Driver.name), ((Driver, trips.driver_id == Driver.id),)),
+        'fuel_type': ((Vehicle.fuel_type, Vehicle.fuel_type), (vehicle,))
+    }
+
+def maintenance_trend_dimensions(records):
+    vehicle = (Vehicle, records.vehicle_id == Vehicle.id)
+    return {
+        'vehicle': ((records.vehicle_id, Vehicle.reg_no), (vehicle,)),
+        'fuel_type': ((Vehicle.fuel_type, Vehicle.fuel_type), (vehicle,))
+    }
+
+def compute_fuel_consumption_trends(days=30, granularity='day', group_by=None, periods=None):
+    """Compute fuel consumption per day, week or month"""
+    periods = _trend_periods(granularity, periods, days)
+    start_date, end_date = timeseries.window(granularity, periods)
+    trips = trip_source(start_date)
+    group, joins = _trend_group(trip_trend_dimensions(trips), group_by)
+    
+    return timeseries.series(
+        trips.trip_date, trips.fuel_used, granularity, start_date, end_date,
+        filters=(trips.fuel_used.isnot(None), trips.fuel_used > 0),
+        group=group, joins=joins
+    )
+
 @analytics_bp.route('/analytics/fuel-consumption', methods=['GET'])
+@query_budget(4)
 @token_required
 def get_fuel_consumption_trends(current_user):
     """Get fuel consumption trends over time"""
     try:
         days = request.args.get('days', default=30, type=int)
-        start_date = date.today() - timedelta(days=days)
-        
-        # Query trips with fuel consumption data
-        trips = Trip.query.filter(
-            Trip.trip_date >= start_date,
-            Trip.fuel_used.isnot(None),
-            Trip.fuel_used > 0
-        ).all()
-        
-        # Group by date
-        daily_consumption = {}
-        for trip in trips:
-            date_str = trip.trip_date.isoformat()
-            if date_str not in daily_consumption:
-                daily_consumption[date_str] = 0
-            daily_consumption[date_str] += trip.fuel_used
-        
-        # Fill missing dates with 0
-        current_date = start_date
-        while current_date <= date.today():
-            date_str = current_date.isoformat()
-            if date_str not in daily_consumption:
-                daily_consumption[date_str] = 0
-            current_date += timedelta(days=1)
-        
-        # Sort by date
-        sorted_data = sorted(daily_consumption.items())
+        granularity = request.args.get('granularity', default='day')
+        group_by = request.args.get('group_by')
+        periods = request.args.get('periods', type=int)
         
         return jsonify({
             'success': True,
-            'data': {
-                'labels': [item[0] for item in sorted_data],
-                'values': [round(item[1], 2) for item in sorted_data]
-            }
+            'data': compute_fuel_consumption_trends(days, granularity, group_by, periods)
         }), 200
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error fetching fuel consumption trends: {str(e)}'
         }), 500
 
+def compute_trips_per_vehicle():
+    """Compute the number of trips per vehicle"""
+    store = columnar.columns()
+    if store is not None:
+        counts = store.group_sum('vehicle_id')
+        vehicles = db.session.query(Vehicle.id, Vehicle.reg_no, Vehicle.model).order_by(Vehicle.id).all()
+        counts = columnar.at_least(counts, max((vehicle.id for vehicle in vehicles), default=0) + 1)
+        return {
+            'labels': [f"{reg_no} ({model})" for _, reg_no, model in vehicles],
+            'values': [int(counts[vehicle_id]) for vehicle_id, _, _ in vehicles]
+        }
+    
+    # Query trips grouped by vehicle, plus the archived trips' rollups
+    archived = archived_trip_totals('vehicle_id')
+    results = db.session.query(
+        Vehicle.reg_no,
+        Vehicle.model,
+        (func.count(Trip.id) + func.coalesce(func.max(archived.c.trip_count), 0)).label('trip_count')
+    ).outerjoin(Trip).outerjoin(
+        archived, archived.c.vehicle_id == Vehicle.id
+    ).group_by(Vehicle.id).all()
+    
+    vehicles = []
+    trip_counts = []
+    
+    for reg_no, model, count in results:
+        vehicles.append(f"{reg_no} ({model})")
+        trip_counts.append(count)
+    
+    return {
+        'labels': vehicles,
+        'values': trip_counts
+    }
+
 @analytics_bp.route('/analytics/trips-per-vehicle', methods=['GET'])
+@query_budget(3)
 @token_required
 def get_trips_per_vehicle(current_user):
     """Get number of trips per vehicle"""
     try:
-        # Query trips grouped by vehicle
-        results = db.session.query(
-            Vehicle.reg_no,
-            Vehicle.model,
-            func.count(Trip.id).label('trip_count')
-        ).outerjoin(Trip).group_by(Vehicle.id).all()
-        
-        vehicles = []
-        trip_counts = []
-        
-        for reg_no, model, count in results:
-            vehicles.append(f"{reg_no} ({model})")
-            trip_counts.append(count)
-        
         return jsonify({
             'success': True,
-            'data': {
-                'labels': vehicles,
-                'values': trip_counts
-            }
+            'data': compute_trips_per_vehicle()
         }), 200
         
     except Exception as e:
@@ -151,15 +240,32 @@ def get_trips_per_vehicle(current_user):
         }), 500
 
 @analytics_bp.route('/analytics/trips-per-driver', methods=['GET'])
+@query_budget(3)
 @token_required
 def get_trips_per_driver(current_user):
     """Get number of trips per driver"""
     try:
-        # Query trips grouped by driver
+        store = columnar.columns()
+        if store is not None:
+            counts = store.group_sum('driver_id')
+            drivers = db.session.query(Driver.id, Driver.name).order_by(Driver.id).all()
+            counts = columnar.at_least(counts, max((driver.id for driver in drivers), default=0) + 1)
+            return jsonify({
+                'success': True,
+                'data': {
+                    'labels': [name for _, name in drivers],
+                    'values': [int(counts[driver_id]) for driver_id, _ in drivers]
+                }
+            }), 200
+        
+        # Query trips grouped by driver, plus the archived trips' rollups
+        archived = archived_trip_totals('driver_id')
         results = db.session.query(
             Driver.name,
-            func.count(Trip.id).label('trip_count')
-        ).outerjoin(Trip).group_by(Driver.id).all()
+            (func.count(Trip.id) + func.coalesce(func.max(archived.c.trip_count), 0)).label('trip_count')
+        ).outerjoin(Trip).outerjoin(
+            archived, archived.c.driver_id == Driver.id
+        ).group_by(Driver.id).all()
         
         drivers = []
         trip_counts = []
@@ -182,87 +288,196 @@ def get_trips_per_driver(current_user):
             'message': f'Error fetching trips per driver: {str(e)}'
         }), 500
 
+ROUTE_SORT_FIELDS = ('trips', 'distance', 'fuel', 'efficiency')
+
+def compute_top_routes(days=90, sort='trips', limit=20):
+    """Busiest origin-destination pairs of the last `days` days"""
+    if sort not in ROUTE_SORT_FIELDS:
+        raise ValueError(f'Invalid sort field: {sort}. Must be one of: {list(ROUTE_SORT_FIELDS)}')
+    start_date = date.today() - timedelta(days=days)
+    trips = trip_source(start_date)
+    efficient = (trips.distance > 0) & (trips.fuel_used > 0)
+    
+    # One grouped pass over the window, served by the (origin, destination) index
+    totals = db.session.query(
+        trips.source_location_id.label('origin_id'),
+        trips.destination_location_id.label('destination_id'),
+        func.count(trips.id).label('trips'),
+        func.coalesce(func.sum(trips.distance), 0).label('distance'),
+        func.coalesce(func.sum(trips.fuel_used), 0).label('fuel'),
+        func.sum(case((efficient, trips.distance), else_=0)).label('efficiency_distance'),
+        func.sum(case((efficient, trips.fuel_used), else_=0)).label('efficiency_fuel')
+    ).filter(
+        trips.trip_date >= start_date,
+        trips.status != 'cancelled',
+        trips.source_location_id.isnot(None),
+        trips.destination_location_id.isnot(None)
+    ).group_by(trips.source_location_id, trips.destination_location_id).subquery()
+    
+    efficiency = totals.c.efficiency_distance / func.nullif(totals.c.efficiency_fuel, 0)
+    order = {
+        'trips': totals.c.trips,
+        'distance': totals.c.distance,
+        'fuel': totals.c.fuel,
+        'efficiency': func.coalesce(efficiency, 0)
+    }[sort]
+    
+    origin = aliased(Location)
+    destination = aliased(Location)
+    results = db.session.query(
+        origin.name.label('source'),
+        destination.name.label('destination'),
+        totals,
+        efficiency.label('efficiency'),
+        RouteDistance.median_distance,
+        RouteDistance.median_fuel
+    ).join(
+        origin, origin.id == totals.c.origin_id
+    ).join(
+        destination, destination.id == totals.c.destination_id
+    ).outerjoin(
+        RouteDistance, (RouteDistance.origin_id == totals.c.origin_id) &
+                       (RouteDistance.destination_id == totals.c.destination_id)
+    ).order_by(order.desc(), totals.c.origin_id, totals.c.destination_id).limit(limit).all()
+    
+    routes = []
+    for row in results:
+        routes.append({
+            'source': row.source,
+            'destination': row.destination,
+            'origin_id': row.origin_id,
+            'destination_id': row.destination_id,
+            'trips': row.trips,
+            'total_distance': round(row.distance, 2),
+            'total_fuel': round(row.fuel, 2),
+            'efficiency': round(row.efficiency, 2) if row.efficiency is not None else None,
+            'median_distance': round(row.median_distance, 2) if row.median_distance is not None else None,
+            'median_fuel': round(row.median_fuel, 2) if row.median_fuel is not None else None
+        })
+    return routes
+
+@analytics_bp.route('/analytics/routes', methods=['GET'])
+@query_budget(3)
+@token_required
+def get_top_routes(current_user):
+    """Get the top origin-destination pairs by volume, fuel or efficiency"""
+    try:
+        days = request.args.get('days', default=90, type=int)
+        sort = request.args.get('sort', default='trips')
+        limit = min(max(request.args.get('limit', default=20, type=int), 1), 100)
+        
+        routes = compute_top_routes(days, sort, limit)
+        return jsonify({
+            'success': True,
+            'data': routes,
+            'count': len(routes)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching routes: {str(e)}'
+        }), 500
+
+def compute_maintenance_cost_trends(months=12, granularity='month', group_by=None, periods=None):
+    """Compute maintenance costs per calendar month (or day/week)"""
+    if periods is None and granularity == 'month':
+        # Exact calendar months: the current month plus `months - 1` before it
+        periods = max(months - 1, 0)
+    periods = _trend_periods(granularity, periods, months * 30)
+    start_date, end_date = timeseries.window(granularity, periods)
+    records = maintenance_source(start_date)
+    group, joins = _trend_group(maintenance_trend_dimensions(records), group_by)
+    
+    return timeseries.series(
+        records.date, records.cost, granularity, start_date, end_date,
+        group=group, joins=joins
+    )
+
 @analytics_bp.route('/analytics/maintenance-costs', methods=['GET'])
+@query_budget(4)
 @token_required
 def get_maintenance_cost_trends(current_user):
     """Get maintenance cost trends over time"""
     try:
         months = request.args.get('months', default=12, type=int)
-        start_date = date.today() - timedelta(days=months * 30)
-        
-        # Query maintenance records
-        records = Maintenance.query.filter(Maintenance.date >= start_date).all()
-        
-        # Group by month
-        monthly_costs = {}
-        for record in records:
-            month_key = record.date.strftime('%Y-%m')
-            if month_key not in monthly_costs:
-                monthly_costs[month_key] = 0
-            monthly_costs[month_key] += record.cost
-        
-        # Fill missing months with 0
-        current_date = start_date.replace(day=1)
-        while current_date <= date.today():
-            month_key = current_date.strftime('%Y-%m')
-            if month_key not in monthly_costs:
-                monthly_costs[month_key] = 0
-            # Move to next month
-            if current_date.month == 12:
-                current_date = current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                current_date = current_date.replace(month=current_date.month + 1)
-        
-        # Sort by month
-        sorted_data = sorted(monthly_costs.items())
+        granularity = request.args.get('granularity', default='month')
+        group_by = request.args.get('group_by')
+        periods = request.args.get('periods', type=int)
         
         return jsonify({
             'success': True,
-            'data': {
-                'labels': [item[0] for item in sorted_data],
-                'values': [round(item[1], 2) for item in sorted_data]
-            }
+            'data': compute_maintenance_cost_trends(months, granularity, group_by, periods)
         }), 200
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error fetching maintenance cost trends: {str(e)}'
         }), 500
 
+def compute_vehicle_utilization(days=30):
+    """Compute the share of the last `days` days each vehicle was on a trip"""
+    start_date = date.today() - timedelta(days=days)
+    store = columnar.columns()
+    if store is not None:
+        start = start_date.toordinal()
+        counts = store.distinct_count('vehicle_id', 'trip_date', where=lambda trips: trips['trip_date'] >= start)
+        vehicles = db.session.query(Vehicle.id, Vehicle.reg_no, Vehicle.model).all()
+        counts = columnar.at_least(counts, max((vehicle.id for vehicle in vehicles), default=0) + 1)
+        results = [(reg_no, model, int(counts[vehicle_id])) for vehicle_id, reg_no, model in vehicles]
+    else:
+        # Unique days with trips, for every vehicle in one grouped query
+        trips = trip_source(start_date)
+        days_used = db.session.query(
+            trips.vehicle_id.label('vehicle_id'),
+            func.count(func.distinct(trips.trip_date)).label('days_used')
+        ).filter(trips.trip_date >= start_date).group_by(trips.vehicle_id).subquery()
+        
+        results = db.session.query(
+            Vehicle.reg_no,
+            Vehicle.model,
+            func.coalesce(days_used.c.days_used, 0)
+        ).outerjoin(days_used, days_used.c.vehicle_id == Vehicle.id).all()
+    
+    utilization_data = []
+    
+    for reg_no, model, trip_dates in results:
+        utilization_rate = (trip_dates / days) * 100 if days > 0 else 0
+        
+        utilization_data.append({
+            'vehicle': f"{reg_no} ({model})",
+            'utilization_rate': round(utilization_rate, 1),
+            'days_used': trip_dates,
+            'total_days': days
+        })
+    
+    # Sort by utilization rate
+    utilization_data.sort(key=lambda x: x['utilization_rate'], reverse=True)
+    
+    return utilization_data
+
 @analytics_bp.route('/analytics/vehicle-utilization', methods=['GET'])
+@query_budget(4)
 @token_required
 def get_vehicle_utilization(current_user):
     """Get vehicle utilization rates"""
     try:
         days = request.args.get('days', default=30, type=int)
-        start_date = date.today() - timedelta(days=days)
-        
-        vehicles = Vehicle.query.all()
-        utilization_data = []
-        
-        for vehicle in vehicles:
-            # Count unique days with trips
-            trip_dates = db.session.query(func.distinct(Trip.trip_date)).filter(
-                Trip.vehicle_id == vehicle.id,
-                Trip.trip_date >= start_date
-            ).count()
-            
-            utilization_rate = (trip_dates / days) * 100 if days > 0 else 0
-            
-            utilization_data.append({
-                'vehicle': f"{vehicle.reg_no} ({vehicle.model})",
-                'utilization_rate': round(utilization_rate, 1),
-                'days_used': trip_dates,
-                'total_days': days
-            })
-        
-        # Sort by utilization rate
-        utilization_data.sort(key=lambda x: x['utilization_rate'], reverse=True)
         
         return jsonify({
             'success': True,
-            'data': utilization_data
+            'data': compute_vehicle_utilization(days)
         }), 200
         
     except Exception as e:
@@ -271,24 +486,56 @@ def get_vehicle_utilization(current_user):
             'message': f'Error fetching vehicle utilization: {str(e)}'
         }), 500
 
+def _sql_fuel_totals():
+    """`(reg_no, model, fuel_type, total_distance, total_fuel)` per vehicle, from SQL"""
+    # Sum trips with both distance and fuel data per vehicle, then add
+    # the archived trips' rollups
+    current = db.session.query(
+        Trip.vehicle_id.label('vehicle_id'),
+        func.sum(Trip.distance).label('total_distance'),
+        func.sum(Trip.fuel_used).label('total_fuel')
+    ).filter(
+        Trip.distance.isnot(None),
+        Trip.fuel_used.isnot(None),
+        Trip.distance > 0,
+        Trip.fuel_used > 0
+    ).group_by(Trip.vehicle_id).subquery()
+    archived = archived_trip_totals('vehicle_id')
+    return db.session.query(
+        Vehicle.reg_no,
+        Vehicle.model,
+        Vehicle.fuel_type,
+        func.coalesce(current.c.total_distance, 0) + func.coalesce(archived.c.efficiency_distance, 0),
+        func.coalesce(current.c.total_fuel, 0) + func.coalesce(archived.c.efficiency_fuel, 0)
+    ).outerjoin(
+        current, current.c.vehicle_id == Vehicle.id
+    ).outerjoin(
+        archived, archived.c.vehicle_id == Vehicle.id
+    ).all()
+
+def _columnar_fuel_totals(store):
+    """Same as `_sql_fuel_totals`, from the columnar store"""
+    # NaN (unknown) compares false, like NULL does in SQL
+    measured = lambda trips: (trips['distance'] > 0) & (trips['fuel_used'] > 0)
+    distance = store.group_sum('vehicle_id', weights='distance', where=measured)
+    fuel = store.group_sum('vehicle_id', weights='fuel_used', where=measured)
+    vehicles = db.session.query(Vehicle.id, Vehicle.reg_no, Vehicle.model, Vehicle.fuel_type).all()
+    size = max((vehicle.id for vehicle in vehicles), default=0) + 1
+    distance, fuel = columnar.at_least(distance, size), columnar.at_least(fuel, size)
+    return [(reg_no, model, fuel_type, float(distance[vehicle_id]), float(fuel[vehicle_id]))
+            for vehicle_id, reg_no, model, fuel_type in vehicles]
+
 @analytics_bp.route('/analytics/fuel-efficiency', methods=['GET'])
+@query_budget(3)
 @token_required
 def get_fuel_efficiency(current_user):
     """Get fuel efficiency data for vehicles"""
     try:
-        # Query trips with both distance and fuel data
-        results = db.session.query(
-            Vehicle.reg_no,
-            Vehicle.model,
-            Vehicle.fuel_type,
-            func.sum(Trip.distance).label('total_distance'),
-            func.sum(Trip.fuel_used).label('total_fuel')
-        ).join(Trip).filter(
-            Trip.distance.isnot(None),
-            Trip.fuel_used.isnot(None),
-            Trip.distance > 0,
-            Trip.fuel_used > 0
-        ).group_by(Vehicle.id).all()
+        store = columnar.columns()
+        if store is not None:
+            results = _columnar_fuel_totals(store)
+        else:
+            results = _sql_fuel_totals()
         
         efficiency_data = []
         for reg_no, model, fuel_type, total_distance, total_fuel in results:
@@ -316,3 +563,527 @@ def get_fuel_efficiency(current_user):
             'message': f'Error fetching fuel efficiency: {str(e)}'
         }), 500
 
+@analytics_bp.route('/analytics/fuel-efficiency/rolling', methods=['GET'])
+@query_budget(3)
+@token_required
+def get_rolling_fuel_efficiency(current_user):
+    """Get each vehicle's rolling (exponentially weighted) km/l statistics"""
+    try:
+        stats = VehicleEfficiencyStats.query.options(
+            joinedload(VehicleEfficiencyStats.vehicle)
+        ).order_by(VehicleEfficiencyStats.vehicle_id).all()
+        
+        data = []
+        for entry in stats:
+            item = entry.to_dict()
+            item['vehicle'] = f"{entry.vehicle.reg_no} ({entry.vehicle.model})" if entry.vehicle else None
+            data.append(item)
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'count': len(data)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching rolling fuel efficiency: {str(e)}'
+        }), 500
+
+FUEL_ANOMALY_SORT_FIELDS = {
+    'trip_date': FuelAnomaly.trip_date,
+    'z_score': FuelAnomaly.z_score,
+    'km_per_liter': FuelAnomaly.km_per_liter,
+    'detected_at': FuelAnomaly.detected_at,
+    'vehicle_id': FuelAnomaly.vehicle_id
+}
+
+@analytics_bp.route('/analytics/fuel-anomalies', methods=['GET'])
+@query_budget(4)
+@token_required
+def get_fuel_anomalies(current_user):
+    """Get trips whose km/l deviated from the vehicle's rolling average"""
+    try:
+        vehicle_id = request.args.get('vehicle_id', type=int)
+        direction = request.args.get('direction')
+        min_z = request.args.get('min_z', type=float)
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        sort = request.args.get('sort')
+        page = request.args.get('page', default=1, type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
+        
+        query = FuelAnomaly.query.options(joinedload(FuelAnomaly.vehicle))
+        
+        if vehicle_id:
+            query = query.filter(FuelAnomaly.vehicle_id == vehicle_id)
+        if direction:
+            if direction not in ('low', 'high'):
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid direction. Must be one of: low, high'
+                }), 400
+            query = query.filter(FuelAnomaly.direction == direction)
+        if min_z is not None:
+            query = query.filter(func.abs(FuelAnomaly.z_score) >= min_z)
+        try:
+            if start_date:
+                query = query.filter(FuelAnomaly.trip_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
+            if end_date:
+                query = query.filter(FuelAnomaly.trip_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid date format. Use YYYY-MM-DD'
+            }), 400
+        
+        query = apply_sort(query, sort, FUEL_ANOMALY_SORT_FIELDS, default='-trip_date,-detected_at')
+        
+        return jsonify(paginated_response(query, page, per_page, lambda anomaly: anomaly.to_dict())), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching fuel anomalies: {str(e)}'
+        }), 500
+
+@analytics_bp.route('/analytics/fuel-anomalies/backfill', methods=['POST'])
+@admin_or_manager_required
+def run_fuel_anomaly_backfill(current_user):
+    """Rebuild rolling fuel statistics and anomalies from the full trip history (admin/manager only)"""
+    try:
+        summary = backfill_fuel_anomalies()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Fuel anomaly backfill completed successfully',
+            'data': summary
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error running fuel anomaly backfill: {str(e)}'
+        }), 500
+
+DRIVER_SCORECARD_SORT_FIELDS = {
+    'rank': DriverScorecard.rank,
+    'score': DriverScorecard.score,
+    'trips': DriverScorecard.trips,
+    'completed_trips': DriverScorecard.completed_trips,
+    'cancelled_trips': DriverScorecard.cancelled_trips,
+    'completion_rate': DriverScorecard.completion_rate,
+    'median_duration_hours': DriverScorecard.median_duration_hours,
+    'p95_duration_hours': DriverScorecard.p95_duration_hours,
+    'fuel_efficiency': DriverScorecard.fuel_efficiency,
+    'efficiency_vs_fleet': DriverScorecard.efficiency_vs_fleet,
+    'driver_id': DriverScorecard.driver_id
+}
+
+@analytics_bp.route('/analytics/driver-scorecards', methods=['GET'])
+# The first request of the day recomputes every scorecard in a fixed number of queries
+@query_budget(12)
+@admin_or_manager_required
+def get_driver_scorecards(current_user):
+    """Get every driver's scorecard (trips, completion, durations, fuel efficiency, rank), best first"""
+    try:
+        sort = request.args.get('sort')
+        page = request.args.get('page', default=1, type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
+        
+        ensure_scorecards()
+        
+        query = DriverScorecard.query.options(joinedload(DriverScorecard.driver))
+        query = apply_sort(query, sort, DRIVER_SCORECARD_SORT_FIELDS, default='rank')
+        
+        return jsonify(paginated_response(query, page, per_page, lambda scorecard: scorecard.to_dict())), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching driver scorecards: {str(e)}'
+        }), 500
+
+@analytics_bp.route('/analytics/driver-scorecards/run', methods=['POST'])
+@admin_or_manager_required
+def run_driver_scorecards(current_user):
+    """Recompute every driver's scorecard now instead of waiting for the next day (admin/manager only)"""
+    try:
+        summary = compute_scorecards()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Driver scorecards updated successfully',
+            'data': summary
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error computing driver scorecards: {str(e)}'
+        }), 500
+
+DISTRIBUTION_GROUPS = ('model', 'vehicle', 'driver')
+DEFAULT_PERCENTILES = '50,90,95,99'
+MAX_HISTOGRAM_BINS = 100
+
+def _parse_percentiles(value):
+    try:
+        percentiles = [float(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError('Invalid percentiles. Use comma-separated numbers between 0 and 100')
+    if not percentiles or any(p < 0 or p > 100 for p in percentiles):
+        raise ValueError('Invalid percentiles. Use comma-separated numbers between 0 and 100')
+    return percentiles
+
+def _distribution_summary(sketch, percentiles):
+    values = sketch.quantiles([p / 100 for p in percentiles])
+    return {
+        'count': sketch.count,
+        'min': sketch.minimum if sketch.count else None,
+        'max': sketch.maximum if sketch.count else None,
+        'mean': sketch.total / sketch.count if sketch.count else None,
+        'percentiles': {f'p{p:g}': value for p, value in zip(percentiles, values)}
+    }
+
+@analytics_bp.route('/analytics/distributions/<metric>', methods=['GET'])
+@query_budget(2)
+@token_required
+def get_metric_distribution(metric, current_user):
+    """Get percentiles and a histogram of trip duration or km/l from the merged quantile sketches"""
+    try:
+        if metric not in SKETCH_METRICS:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid metric. Must be one of: {list(SKETCH_METRICS)}'
+            }), 400
+        
+        vehicle_id = request.args.get('vehicle_id', type=int)
+        driver_id = request.args.get('driver_id', type=int)
+        model = request.args.get('model')
+        group_by = request.args.get('group_by')
+        percentiles = _parse_percentiles(request.args.get('percentiles', DEFAULT_PERCENTILES))
+        bins = max(1, min(request.args.get('bins', default=20, type=int), MAX_HISTOGRAM_BINS))
+        
+        if group_by and group_by not in DISTRIBUTION_GROUPS:
+            raise ValueError(f'Invalid group_by. Must be one of: {list(DISTRIBUTION_GROUPS)}')
+        # Sketches are kept per vehicle and per driver, never per pair
+        scope = 'driver' if driver_id or group_by == 'driver' else 'vehicle'
+        if scope == 'driver' and (vehicle_id or model or group_by in ('model', 'vehicle')):
+            raise ValueError('Driver and vehicle filters or groupings cannot be combined')
+        
+        columns = [TripSketch.scope_id, TripSketch.minimum, TripSketch.maximum, TripSketch.total, TripSketch.buckets]
+        if scope == 'driver':
+            query = db.session.query(*columns, Driver.name.label('label')).join(
+                Driver, Driver.id == TripSketch.scope_id)
+        else:
+            query = db.session.query(*columns, Vehicle.model, Vehicle.reg_no).join(
+                Vehicle, Vehicle.id == TripSketch.scope_id)
+        query = query.filter(TripSketch.metric == metric, TripSketch.scope == scope)
+        
+        if vehicle_id:
+            query = query.filter(TripSketch.scope_id == vehicle_id)
+        if driver_id:
+            query = query.filter(TripSketch.scope_id == driver_id)
+        if model:
+            query = query.filter(Vehicle.model == model)
+        try:
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            if start_date:
+                query = query.filter(TripSketch.day >= datetime.strptime(start_date, '%Y-%m-%d').date())
+            if end_date:
+                query = query.filter(TripSketch.day <= datetime.strptime(end_date, '%Y-%m-%d').date())
+        except ValueError:
+            raise ValueError('Invalid date format. Use YYYY-MM-DD')
+        
+        rows = query.all()
+        
+        if not group_by:
+            sketch = merged_sketch(rows)
+            data = _distribution_summary(sketch, percentiles)
+            edges, counts = sketch.histogram(bins)
+            data['histogram'] = {'edges': edges, 'counts': counts}
+        else:
+            groups = {}
+            for row in rows:
+                if group_by == 'model':
+                    key = row.model
+                elif group_by == 'vehicle':
+                    key = (row.scope_id, f"{row.reg_no} ({row.model})")
+                else:
+                    key = (row.scope_id, row.label)
+                groups.setdefault(key, []).append(row)
+            data = []
+            for key, group_rows in groups.items():
+                item = _distribution_summary(merged_sketch(group_rows), percentiles)
+                if group_by == 'model':
+                    item['model'] = key
+                else:
+                    item[f'{group_by}_id'], item[group_by] = key
+                data.append(item)
+            data.sort(key=lambda item: item['count'], reverse=True)
+        
+        return jsonify({
+            'success': True,
+            'metric': metric,
+            'relative_error': RELATIVE_ERROR,
+            'data': data
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching {metric} distribution: {str(e)}'
+        }), 500
+
+TCO_SORT_FIELDS = ('month', 'vehicle_id', 'distance', 'fuel_cost', 'maintenance_cost', 'total_cost', 'cost_per_km')
+MAX_TCO_MONTHS = 60
+
+def _sort_rows(rows, sort, allowed, default):
+    """Sort report rows by a `-field,field` spec like `apply_sort`; None sorts last"""
+    for field in reversed([part.strip() for part in (sort or default).split(',') if part.strip()]):
+        descending = field.startswith('-')
+        name = field.lstrip('-+')
+        if name not in allowed:
+            raise ValueError(f'Invalid sort field: {name}. Must be one of: {sorted(allowed)}')
+        present = [row for row in rows if row[name] is not None]
+        missing = [row for row in rows if row[name] is None]
+        rows = sorted(present, key=lambda row: row[name], reverse=descending) + missing
+    return rows
+
+@analytics_bp.route('/analytics/tco', methods=['GET'])
+@query_budget(8)
+@admin_or_manager_required
+def get_tco_report(current_user):
+    """Get fuel, maintenance and total cost (and cost per km) per vehicle and month"""
+    try:
+        months = request.args.get('months', default=12, type=int)
+        vehicle_id = request.args.get('vehicle_id', type=int)
+        fuel_type = request.args.get('fuel_type')
+        sort = request.args.get('sort')
+        page = max(request.args.get('page', default=1, type=int), 1)
+        per_page = max(1, min(request.args.get('per_page', default=50, type=int), MAX_PER_PAGE))
+        
+        if months < 1 or months > MAX_TCO_MONTHS:
+            raise ValueError(f'months must be between 1 and {MAX_TCO_MONTHS}')
+        # The current calendar month plus `months - 1` before it
+        start_date, end_date = timeseries.window('month', months - 1)
+        
+        rows = tco_report(start_date, end_date)
+        if vehicle_id:
+            rows = [row for row in rows if row['vehicle_id'] == vehicle_id]
+        if fuel_type:
+            rows = [row for row in rows if row['fuel_type'] == fuel_type]
+        rows = _sort_rows(rows, sort, TCO_SORT_FIELDS, default='vehicle_id,month')
+        
+        distance = sum(row['distance'] for row in rows)
+        total_cost = sum(row['total_cost'] for row in rows)
+        summary = {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'distance': round(distance, 2),
+            'fuel_cost': round(sum(row['fuel_cost'] for row in rows), 2),
+            'maintenance_cost': round(sum(row['maintenance_cost'] for row in rows), 2),
+            'total_cost': round(total_cost, 2),
+            'unpriced_fuel': round(sum(row['unpriced_fuel'] for row in rows), 2),
+            'cost_per_km': round(total_cost / distance, 4) if distance > 0 else None
+        }
+        
+        items = rows[(page - 1) * per_page:page * per_page]
+        return jsonify({
+            'success': True,
+            'data': items,
+            'count': len(items),
+            'summary': summary,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': len(rows),
+                'pages': (len(rows) + per_page - 1) // per_page
+            }
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching TCO report: {str(e)}'
+        }), 500
+
+MAX_HOS_DAYS = 90
+
+@analytics_bp.route('/analytics/hos-violations', methods=['GET'])
+@query_budget(3)
+@admin_or_manager_required
+def get_hos_violations(current_user):
+    """Get every time a driver went over the 24-hour or 7-day driving limit in the last days, latest first"""
+    try:
+        days = request.args.get('days', default=30, type=int)
+        driver_id = request.args.get('driver_id', type=int)
+        
+        if days < 1 or days > MAX_HOS_DAYS:
+            raise ValueError(f'days must be between 1 and {MAX_HOS_DAYS}')
+        end = datetime.utcnow()
+        start = end - timedelta(days=days)
+        
+        found = hos_violations(start, end, driver_id, now=end)
+        drivers = {driver.id: driver.name for driver in Driver.query.filter(
+            Driver.id.in_({violation['driver_id'] for violation in found})
+        )} if found else {}
+        for violation in found:
+            violation['driver'] = drivers.get(violation['driver_id'])
+        found.sort(key=lambda violation: violation['peak_at'], reverse=True)
+        
+        return jsonify({
+            'success': True,
+            'data': found,
+            'count': len(found),
+            'limits': {name: limit for name, _, limit in HOS_LIMITS},
+            'period': {'start': start.isoformat(), 'end': end.isoformat()}
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching hours-of-service violations: {str(e)}'
+        }), 500
+
+def compute_recent_trips(limit=5):
+    """Return the most recent trips, newest first"""
+    trips = Trip.query.options(
+        joinedload(Trip.vehicle),
+        joinedload(Trip.driver)
+    ).order_by(Trip.trip_date.desc(), Trip.id.desc()).limit(limit).all()
+    return [trip.to_dict() for trip in trips]
+
+def compute_recent_maintenance(limit=5):
+    """Return the most recent maintenance records, newest first"""
+    records = Maintenance.query.options(
+        joinedload(Maintenance.vehicle)
+    ).order_by(Maintenance.date.desc(), Maintenance.id.desc()).limit(limit).all()
+    return [record.to_dict() for record in records]
+
+def _run_widget(app, request_g, route, compute, kwargs):
+    """Run a single dashboard widget inside its own application context.
+
+    The SQL hooks count a request's statements in `g`, which the widget's
+    context does not share: the counters are started afresh here and added to
+    the request's when the widget finishes, so the bundle's query budget,
+    request metrics and slow-query routes include the widgets' statements.
+    """
+    with app.app_context():
+        g.slow_query_route = route
+        if 'metrics_started' in request_g:
+            g.metrics_started, g.sql_queries, g.sql_seconds = request_g.metrics_started, 0, 0.0
+        if 'query_budget_statements' in request_g:
+            g.query_budget_statements = []
+        try:
+            return compute(**kwargs)
+        finally:
+            with _widget_accounting_lock:
+                if 'metrics_started' in g:
+                    request_g.sql_queries += g.sql_queries
+                    request_g.sql_seconds += g.sql_seconds
+                # Gone once the response is sent, e.g. after a widget timed out
+                statements = request_g.get('query_budget_statements')
+                if statements is not None:
+                    statements.extend(g.query_budget_statements)
+
+@analytics_bp.route('/analytics/dashboard/bundle', methods=['GET'])
+@query_budget(30)  # every widget's statements count towards the bundle
+@token_required
+def get_dashboard_bundle(current_user):
+    """Get every dashboard widget in one request, computed concurrently"""
+    try:
+        days = request.args.get('days', default=30, type=int)
+        months = request.args.get('months', default=6, type=int)
+        limit = request.args.get('limit', default=5, type=int)
+        timeout = request.args.get('timeout', default=DASHBOARD_WIDGET_TIMEOUT, type=float)
+        timeout = max(0.1, min(timeout, DASHBOARD_WIDGET_TIMEOUT))
+        
+        widgets = {
+            'stats': (compute_dashboard_stats, {}),
+            'fuel_consumption': (compute_fuel_consumption_trends, {'days': days}),
+            'trips_per_vehicle': (compute_trips_per_vehicle, {}),
+            'maintenance_costs': (compute_maintenance_cost_trends, {'months': months}),
+            'vehicle_utilization': (compute_vehicle_utilization, {'days': days}),
+            'recent_trips': (compute_recent_trips, {'limit': limit}),
+            'recent_maintenance': (compute_recent_maintenance, {'limit': limit})
+        }
+        
+        # Optional subset, e.g. ?widgets=stats,recent_trips
+        requested = request.args.get('widgets')
+        if requested:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            unknown = [name for name in names if name not in widgets]
+            if unknown:
+                return jsonify({
+                    'success': False,
+                    'message': f'Unknown widgets: {unknown}. Must be among: {list(widgets)}'
+                }), 400
+            widgets = {name: widgets[name] for name in names}
+        
+        app = current_app._get_current_object()
+        request_g = g._get_current_object()
+        route = current_route()
+        started = time.monotonic()
+        futures = {
+            name: _dashboard_executor.submit(_run_widget, app, request_g, route, compute, kwargs)
+            for name, (compute, kwargs) in widgets.items()
+        }
+        
+        # Every widget shares the same deadline, so the response takes as long
+        # as the slowest widget (capped by the timeout) rather than their sum.
+        data = {}
+        errors = {}
+        for name, future in futures.items():
+            remaining = max(0, timeout - (time.monotonic() - started))
+            try:
+                data[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                errors[name] = f'Timed out after {timeout:g}s'
+            except Exception as e:
+                errors[name] = str(e)
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'errors': errors,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching dashboard bundle: {str(e)}'
+        }), 500
@@ -1,20 +1,48 @@
 from flask import Blueprint, request, jsonify
 from src.models import db, Driver
 from src.auth import token_required, admin_required, admin_or_manager_required
+from src.listing import apply_prefix_search, apply_sort, paginated_response
+from src.querybudget import query_budget
+from src.admission import admission_class
+from src.archive import has_archived_trips, archived_trip_totals
+from src.availability import parse_window, available_drivers
+from src.compliance import driving_hours
 from datetime import datetime
 
 driver_bp = Blueprint('driver', __name__)
 
+DRIVER_SORT_FIELDS = {
+    'id': Driver.id,
+    'name': Driver.name,
+    'license_no': Driver.license_no,
+    'status': Driver.status,
+    'created_at': Driver.created_at,
+    'updated_at': Driver.updated_at
+}
+
 @driver_bp.route('/drivers', methods=['GET'])
+@query_budget(3)
 def get_drivers():
     """Get all drivers with optional filtering"""
     try:
         status = request.args.get('status')
+        q = request.args.get('q', '').strip()
+        sort = request.args.get('sort')
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
         
         query = Driver.query
         
         if status:
             query = query.filter(Driver.status == status)
+        if q:
+            query = apply_prefix_search(query, [Driver.name, Driver.license_no], q)
+            page = page or 1
+        
+        query = apply_sort(query, sort, DRIVER_SORT_FIELDS, default='id')
+        
+        if page:
+            return jsonify(paginated_response(query, page, per_page, lambda driver: driver.to_dict())), 200
             
         drivers = query.all()
         return jsonify({
@@ -23,13 +51,44 @@ def get_drivers():
             'count': len(drivers)
         }), 200
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error fetching drivers: {str(e)}'
         }), 500
 
+@driver_bp.route('/drivers/available', methods=['GET'])
+@query_budget(2)
+def get_available_drivers():
+    """Get active drivers with no open trip between from and to"""
+    try:
+        start, end = parse_window(request.args.get('from'), request.args.get('to'))
+        
+        drivers = available_drivers(start, end)
+        return jsonify({
+            'success': True,
+            'data': [driver.to_dict() for driver in drivers],
+            'count': len(drivers)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching available drivers: {str(e)}'
+        }), 500
+
 @driver_bp.route('/drivers/<int:driver_id>', methods=['GET'])
+@query_budget(3)
 def get_driver(driver_id):
     """Get a specific driver by ID"""
     try:
@@ -163,8 +222,8 @@ def delete_driver(driver_id):
     try:
         driver = Driver.query.get_or_404(driver_id)
         
-        # Check if driver has associated trips
-        if driver.trips:
+        # Check if driver has associated trips, archived ones included
+        if driver.trips or has_archived_trips(driver_id=driver_id):
             return jsonify({
                 'success': False,
                 'message': 'Cannot delete driver with associated trips'
@@ -185,16 +244,43 @@ def delete_driver(driver_id):
             'message': f'Error deleting driver: {str(e)}'
         }), 500
 
+@driver_bp.route('/drivers/<int:driver_id>/hours', methods=['GET'])
+@query_budget(2)
+def get_driver_hours(driver_id):
+    """Get the hours a driver drove in the last 24 hours and 7 days, against the limits"""
+    try:
+        driver = Driver.query.get_or_404(driver_id)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'driver_id': driver.id,
+                'hours': driving_hours(driver.id)
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching driver hours: {str(e)}'
+        }), 500
+
 @driver_bp.route('/drivers/<int:driver_id>/stats', methods=['GET'])
+@query_budget(3)
+@admission_class('analytics')
 def get_driver_stats(driver_id):
     """Get statistics for a specific driver"""
     try:
         driver = Driver.query.get_or_404(driver_id)
         
+        # Archived trips count through their rollups
+        archived = archived_trip_totals('driver_id')
+        archived_trips = db.session.query(archived).filter(archived.c.driver_id == driver_id).first()
+        
         stats = {
-            'total_trips': driver.get_total_trips(),
-            'total_distance': driver.get_total_distance(),
-            'total_fuel_used': driver.get_total_fuel_used()
+            'total_trips': driver.get_total_trips() + (archived_trips.trip_count if archived_trips else 0),
+            'total_distance': driver.get_total_distance() + (archived_trips.total_distance if archived_trips else 0),
+            'total_fuel_used': driver.get_total_fuel_used() + (archived_trips.total_fuel if archived_trips else 0)
         }
         
         return jsonify({
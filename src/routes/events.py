@@ -0,0 +1,85 @@
+from flask import Blueprint, Response, request, jsonify
+from src.models import User
+from src.auth import AuthManager
+from src.events import broker, can_receive, format_sse
+import json
+import queue
+from types import SimpleNamespace
+
+events_bp = Blueprint('events', __name__)
+
+HEARTBEAT_INTERVAL = 15  # seconds
+
+def _authenticate_stream():
+    """Resolve the user for an event stream.
+
+    EventSource cannot send an Authorization header, so the token may also be
+    passed as the `token` query parameter.
+    """
+    user = AuthManager.get_current_user()
+    if user:
+        return user
+
+    token = request.args.get('token')
+    if not token:
+        return None
+
+    payload = AuthManager.verify_token(token)
+    if not payload:
+        return None
+
+    return User.query.get(payload['user_id'])
+
+@events_bp.route('/events/stream', methods=['GET'])
+def stream_events():
+    """Stream entity change events as Server-Sent Events"""
+    user = _authenticate_stream()
+    if not user:
+        return jsonify({
+            'success': False,
+            'message': 'Token is missing or invalid'
+        }), 401
+
+    # Browsers resend the last id they saw in the Last-Event-ID header when
+    # they reconnect; allow the query string too for the initial connection.
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        subscriber, backlog, complete = broker.subscribe(last_event_id)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Invalid Last-Event-ID'
+        }), 400
+
+    # Snapshot what the generator needs: it runs after the request context
+    # (and the user's session) is gone.
+    viewer = SimpleNamespace(id=user.id, role=user.role)
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if not complete:
+                # The client missed more than the ring buffer holds
+                yield f"event: reset\ndata: {json.dumps({'last_event_id': broker.last_event_id})}\n\n"
+            for event in backlog:
+                if can_receive(viewer, event):
+                    yield format_sse(event)
+            while not subscriber.closed:
+                try:
+                    event = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if subscriber.closed:
+                    # Dropped as a slow consumer: end the stream so the
+                    # browser reconnects and resumes from Last-Event-ID
+                    return
+                if can_receive(viewer, event):
+                    yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,161 @@
+from flask import Blueprint, request, jsonify
+from src.models import db, FuelPrice
+from src.auth import token_required, admin_or_manager_required
+from src.querybudget import query_budget
+from datetime import datetime
+
+fuel_price_bp = Blueprint('fuel_price', __name__)
+
+VALID_FUEL_TYPES = ['petrol', 'diesel', 'electric']
+
+def _validate_price(value):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid price_per_liter. Must be a number')
+    if price < 0:
+        raise ValueError('Invalid price_per_liter. Must not be negative')
+    return price
+
+@fuel_price_bp.route('/fuel-prices', methods=['GET'])
+@query_budget(2)
+@token_required
+def get_fuel_prices(current_user):
+    """Get the fuel price history, newest first per fuel type"""
+    try:
+        fuel_type = request.args.get('fuel_type')
+        
+        query = FuelPrice.query
+        if fuel_type:
+            query = query.filter(FuelPrice.fuel_type == fuel_type)
+        prices = query.order_by(FuelPrice.fuel_type, FuelPrice.effective_date.desc()).all()
+        
+        return jsonify({
+            'success': True,
+            'data': [price.to_dict() for price in prices],
+            'count': len(prices)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching fuel prices: {str(e)}'
+        }), 500
+
+@fuel_price_bp.route('/fuel-prices', methods=['POST'])
+@admin_or_manager_required
+def create_fuel_price(current_user):
+    """Record a fuel price change effective from a date (admin/manager only)"""
+    try:
+        data = request.get_json() or {}
+        
+        required_fields = ['fuel_type', 'effective_date', 'price_per_liter']
+        for field in required_fields:
+            if field not in data or data[field] in (None, ''):
+                return jsonify({
+                    'success': False,
+                    'message': f'Missing required field: {field}'
+                }), 400
+        
+        if data['fuel_type'] not in VALID_FUEL_TYPES:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid fuel_type. Must be one of: {VALID_FUEL_TYPES}'
+            }), 400
+        
+        try:
+            effective_date = datetime.strptime(data['effective_date'], '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid effective_date format. Use YYYY-MM-DD'
+            }), 400
+        
+        existing = FuelPrice.query.filter_by(fuel_type=data['fuel_type'], effective_date=effective_date).first()
+        if existing:
+            return jsonify({
+                'success': False,
+                'message': 'A price for this fuel type and effective_date already exists'
+            }), 400
+        
+        price = FuelPrice(
+            fuel_type=data['fuel_type'],
+            effective_date=effective_date,
+            price_per_liter=_validate_price(data['price_per_liter'])
+        )
+        
+        db.session.add(price)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Fuel price created successfully',
+            'data': price.to_dict()
+        }), 201
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error creating fuel price: {str(e)}'
+        }), 500
+
+@fuel_price_bp.route('/fuel-prices/<int:price_id>', methods=['PUT'])
+@admin_or_manager_required
+def update_fuel_price(price_id, current_user):
+    """Correct a recorded fuel price (admin/manager only)"""
+    try:
+        price = FuelPrice.query.get_or_404(price_id)
+        data = request.get_json() or {}
+        
+        if 'price_per_liter' in data:
+            price.price_per_liter = _validate_price(data['price_per_liter'])
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Fuel price updated successfully',
+            'data': price.to_dict()
+        }), 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error updating fuel price: {str(e)}'
+        }), 500
+
+@fuel_price_bp.route('/fuel-prices/<int:price_id>', methods=['DELETE'])
+@admin_or_manager_required
+def delete_fuel_price(price_id, current_user):
+    """Delete a fuel price change (admin/manager only)"""
+    try:
+        price = FuelPrice.query.get_or_404(price_id)
+        
+        db.session.delete(price)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Fuel price deleted successfully'
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error deleting fuel price: {str(e)}'
+        }), 500
@@ -1,10 +1,22 @@
 from flask import Blueprint, request, jsonify
-from src.models import db, Maintenance, Vehicle
+from src.models import db, Maintenance, Vehicle, MaintenancePrediction
+from src.auth import token_required, admin_or_manager_required
+from src.events import publish_maintenance_event, publish_deleted_event
+from src.search import ranked_matches
+from src.listing import apply_sort, paginated_response
+from src.predictive import run_predictions
+from src.querybudget import query_budget
+from src.admission import admission_class
+from src.archive import maintenance_source, find_archived
+from src import timeseries
 from datetime import datetime, date
+from sqlalchemy import func, literal, cast, or_, tuple_, Integer
+from sqlalchemy.orm import joinedload
 
 maintenance_bp = Blueprint('maintenance', __name__)
 
 @maintenance_bp.route('/maintenance', methods=['GET'])
+@query_budget(4)
 def get_maintenance_records():
     """Get all maintenance records with optional filtering"""
     try:
@@ -13,35 +25,61 @@ def get_maintenance_records():
         status = request.args.get('status')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        q = request.args.get('q', '').strip()
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
         
-        query = Maintenance.query
+        try:
+            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid start_date format. Use YYYY-MM-DD'
+            }), 400
+        try:
+            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid end_date format. Use YYYY-MM-DD'
+            }), 400
+        
+        # Archived records are included only when the range reaches back to them
+        records = maintenance_source(start_date_obj)
+        
+        # to_dict() embeds the vehicle: load it in the same query
+        query = db.session.query(records).options(joinedload(records.vehicle))
         
         if vehicle_id:
-            query = query.filter(Maintenance.vehicle_id == vehicle_id)
+            query = query.filter(records.vehicle_id == vehicle_id)
         if maintenance_type:
-            query = query.filter(Maintenance.maintenance_type == maintenance_type)
+            query = query.filter(records.maintenance_type == maintenance_type)
         if status:
-            query = query.filter(Maintenance.status == status)
-        if start_date:
-            try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(Maintenance.date >= start_date_obj)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'message': 'Invalid start_date format. Use YYYY-MM-DD'
-                }), 400
-        if end_date:
-            try:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(Maintenance.date <= end_date_obj)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'message': 'Invalid end_date format. Use YYYY-MM-DD'
-                }), 400
-        
-        maintenance_records = query.order_by(Maintenance.date.desc()).all()
+            query = query.filter(records.status == status)
+        if start_date_obj:
+            query = query.filter(records.date >= start_date_obj)
+        if end_date_obj:
+            query = query.filter(records.date <= end_date_obj)
+        
+        if q:
+            # Full-text search: best matches first, newest first among ties
+            matches = ranked_matches('maintenance', q)
+            if matches is None:
+                query = query.filter(db.false())
+            else:
+                # Only hot records are indexed, so archived ones never match
+                query = query.join(matches, matches.c.id == records.id).order_by(
+                    matches.c.rank, records.date.desc()
+                )
+                # Searches are always paginated
+                page = page or 1
+        else:
+            query = query.order_by(records.date.desc())
+        
+        if page:
+            return jsonify(paginated_response(query, page, per_page, lambda record: record.to_dict())), 200
+        
+        maintenance_records = query.all()
         return jsonify({
             'success': True,
             'data': [record.to_dict() for record in maintenance_records],
@@ -55,10 +93,17 @@ def get_maintenance_records():
         }), 500
 
 @maintenance_bp.route('/maintenance/<int:maintenance_id>', methods=['GET'])
+@query_budget(3)
 def get_maintenance_record(maintenance_id):
     """Get a specific maintenance record by ID"""
     try:
-        maintenance = Maintenance.query.get_or_404(maintenance_id)
+        maintenance = db.session.get(Maintenance, maintenance_id) or find_archived(Maintenance, maintenance_id)
+        if not maintenance:
+            return jsonify({
+                'success': False,
+                'message': 'Maintenance record not found'
+            }), 404
+        
         return jsonify({
             'success': True,
             'data': maintenance.to_dict()
@@ -146,6 +191,7 @@ def create_maintenance_record():
         
         db.session.add(maintenance)
         db.session.commit()
+        publish_maintenance_event(maintenance, 'maintenance.created')
         
         return jsonify({
             'success': True,
@@ -166,6 +212,7 @@ def update_maintenance_record(maintenance_id):
     try:
         maintenance = Maintenance.query.get_or_404(maintenance_id)
         data = request.get_json()
+        previous_status = maintenance.status
         
         # Validate vehicle if provided
         if 'vehicle_id' in data:
@@ -231,6 +278,7 @@ def update_maintenance_record(maintenance_id):
         
         maintenance.updated_at = datetime.utcnow()
         db.session.commit()
+        publish_maintenance_event(maintenance, 'maintenance.updated', previous_status)
         
         return jsonify({
             'success': True,
@@ -253,6 +301,7 @@ def delete_maintenance_record(maintenance_id):
         
         db.session.delete(maintenance)
         db.session.commit()
+        publish_deleted_event('maintenance', maintenance_id)
         
         return jsonify({
             'success': True,
@@ -266,44 +315,183 @@ def delete_maintenance_record(maintenance_id):
             'message': f'Error deleting maintenance record: {str(e)}'
         }), 500
 
+# Cost percentiles reported per maintenance type
+STATS_PERCENTILES = (0.5, 0.9, 0.95)
+
+def _percentile_key(fraction):
+    return f'p{round(fraction * 100):g}'
+
+def _grouped_stats_rows(records, filters):
+    """Fetch overall, per-type and per-month totals in a single statement.
+
+    PostgreSQL computes all three levels (and the per-type percentiles) with
+    GROUPING SETS; SQLite has no grouping sets, so the levels are combined
+    with UNION ALL instead. `records` is `Maintenance` or an alias that also
+    covers the archive. Yields `(level, key, count, cost)` tuples.
+    """
+    month = timeseries.bucket_expression(records.date, 'month')
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect == 'postgresql':
+        percentile_columns = [
+            func.percentile_cont(fraction).within_group(records.cost).label(_percentile_key(fraction))
+            for fraction in STATS_PERCENTILES
+        ]
+        query = db.session.query(
+            func.grouping(records.maintenance_type).label('by_type'),
+            func.grouping(month).label('by_month'),
+            records.maintenance_type,
+            month.label('month'),
+            func.count(records.id),
+            func.sum(records.cost),
+            *percentile_columns
+        ).filter(*filters).group_by(
+            func.grouping_sets(tuple_(), tuple_(records.maintenance_type), tuple_(month))
+        )
+        percentiles = {}
+        rows = []
+        for type_grouped, month_grouped, maintenance_type, month_key, count, cost, *values in query.all():
+            if type_grouped and month_grouped:
+                rows.append(('total', None, count, cost))
+            elif not type_grouped:
+                rows.append(('type', maintenance_type, count, cost))
+                percentiles[maintenance_type] = values
+            else:
+                rows.append(('month', month_key, count, cost))
+        return rows, percentiles
+    
+    total = db.session.query(
+        literal('total').label('level'), literal(None).label('key'),
+        func.count(records.id), func.sum(records.cost)
+    ).filter(*filters)
+    by_type = db.session.query(
+        literal('type'), records.maintenance_type,
+        func.count(records.id), func.sum(records.cost)
+    ).filter(*filters).group_by(records.maintenance_type)
+    by_month = db.session.query(
+        literal('month'), month,
+        func.count(records.id), func.sum(records.cost)
+    ).filter(*filters).group_by(month)
+    
+    rows = [tuple(row) for row in total.union_all(by_type, by_month).all()]
+    return rows, _type_cost_percentiles(records, filters)
+
+def _type_cost_percentiles(records, filters):
+    """Per-type cost percentiles using window functions (for SQLite).
+
+    Only the (at most two) rows around each percentile rank leave the
+    database; values are linearly interpolated like percentile_cont.
+    """
+    ranked = db.session.query(
+        records.maintenance_type.label('maintenance_type'),
+        records.cost.label('cost'),
+        (func.row_number().over(
+            partition_by=records.maintenance_type,
+            order_by=records.cost
+        ) - 1).label('rank'),
+        func.count(records.id).over(
+            partition_by=records.maintenance_type
+        ).label('total')
+    ).filter(*filters).subquery()
+    
+    # CAST truncates towards zero in SQLite, i.e. floor() for these positives
+    wanted = []
+    for fraction in STATS_PERCENTILES:
+        lower = cast(fraction * (ranked.c.total - 1), Integer)
+        wanted.append(ranked.c.rank.between(lower, lower + 1))
+    
+    rows = db.session.query(
+        ranked.c.maintenance_type, ranked.c.rank, ranked.c.total, ranked.c.cost
+    ).filter(or_(*wanted)).all()
+    
+    costs_by_rank = {}
+    totals = {}
+    for maintenance_type, rank, total, cost in rows:
+        costs_by_rank.setdefault(maintenance_type, {})[rank] = cost
+        totals[maintenance_type] = total
+    
+    percentiles = {}
+    for maintenance_type, costs in costs_by_rank.items():
+        values = []
+        for fraction in STATS_PERCENTILES:
+            position = fraction * (totals[maintenance_type] - 1)
+            lower = int(position)
+            upper_cost = costs.get(lower + 1, costs[lower])
+            values.append(costs[lower] + (upper_cost - costs[lower]) * (position - lower))
+        percentiles[maintenance_type] = values
+    return percentiles
+
 @maintenance_bp.route('/maintenance/stats', methods=['GET'])
+@query_budget(5)
+@admission_class('analytics')
 def get_maintenance_stats():
     """Get maintenance statistics"""
     try:
         vehicle_id = request.args.get('vehicle_id', type=int)
+        status = request.args.get('status')
+        maintenance_type = request.args.get('maintenance_type')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
         
-        query = Maintenance.query
-        if vehicle_id:
-            query = query.filter(Maintenance.vehicle_id == vehicle_id)
+        try:
+            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid start_date format. Use YYYY-MM-DD'
+            }), 400
+        try:
+            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid end_date format. Use YYYY-MM-DD'
+            }), 400
+        
+        # Percentiles need the individual records, so a range reaching the
+        # archive reads it rather than the rollups
+        records = maintenance_source(start_date_obj)
         
-        records = query.all()
+        filters = []
+        if vehicle_id:
+            filters.append(records.vehicle_id == vehicle_id)
+        if status:
+            filters.append(records.status == status)
+        if maintenance_type:
+            filters.append(records.maintenance_type == maintenance_type)
+        if start_date_obj:
+            filters.append(records.date >= start_date_obj)
+        if end_date_obj:
+            filters.append(records.date <= end_date_obj)
         
-        total_cost = sum(record.cost for record in records)
-        total_records = len(records)
+        rows, percentiles = _grouped_stats_rows(records, filters)
         
-        # Group by maintenance type
+        total_cost = 0
+        total_records = 0
         type_stats = {}
-        for record in records:
-            if record.maintenance_type not in type_stats:
-                type_stats[record.maintenance_type] = {'count': 0, 'cost': 0}
-            type_stats[record.maintenance_type]['count'] += 1
-            type_stats[record.maintenance_type]['cost'] += record.cost
-        
-        # Group by month for trend analysis
         monthly_stats = {}
-        for record in records:
-            month_key = record.date.strftime('%Y-%m')
-            if month_key not in monthly_stats:
-                monthly_stats[month_key] = {'count': 0, 'cost': 0}
-            monthly_stats[month_key]['count'] += 1
-            monthly_stats[month_key]['cost'] += record.cost
+        for level, key, count, cost in rows:
+            cost = cost or 0
+            if level == 'total':
+                total_cost = cost
+                total_records = count
+            elif level == 'type':
+                type_stats[key] = {
+                    'count': count,
+                    'cost': cost,
+                    'average_cost': cost / count if count > 0 else 0
+                }
+                for fraction, value in zip(STATS_PERCENTILES, percentiles.get(key, ())):
+                    type_stats[key][_percentile_key(fraction)] = round(value, 2) if value is not None else None
+            elif key is not None:
+                monthly_stats[key] = {'count': count, 'cost': cost}
         
         stats = {
             'total_cost': total_cost,
             'total_records': total_records,
             'average_cost': total_cost / total_records if total_records > 0 else 0,
             'by_type': type_stats,
-            'by_month': monthly_stats
+            'by_month': dict(sorted(monthly_stats.items()))
         }
         
         return jsonify({
@@ -317,3 +505,70 @@ def get_maintenance_stats():
             'message': f'Error fetching maintenance stats: {str(e)}'
         }), 500
 
+PREDICTION_SORT_FIELDS = {
+    'risk_score': MaintenancePrediction.risk_score,
+    'predicted_next_service_date': MaintenancePrediction.predicted_next_service_date,
+    'predicted_cost': MaintenancePrediction.predicted_cost,
+    'vehicle_id': MaintenancePrediction.vehicle_id
+}
+
+@maintenance_bp.route('/maintenance/predictions', methods=['GET'])
+@query_budget(4)
+@token_required
+def get_maintenance_predictions(current_user):
+    """Get predicted next service dates and risk scores, riskiest first"""
+    try:
+        min_risk = request.args.get('min_risk', type=float)
+        due_before = request.args.get('due_before')
+        sort = request.args.get('sort')
+        page = request.args.get('page', default=1, type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
+        
+        query = MaintenancePrediction.query.options(joinedload(MaintenancePrediction.vehicle))
+        
+        if min_risk is not None:
+            query = query.filter(MaintenancePrediction.risk_score >= min_risk)
+        if due_before:
+            try:
+                due_before_obj = datetime.strptime(due_before, '%Y-%m-%d').date()
+                query = query.filter(MaintenancePrediction.predicted_next_service_date <= due_before_obj)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid due_before format. Use YYYY-MM-DD'
+                }), 400
+        
+        query = apply_sort(query, sort, PREDICTION_SORT_FIELDS, default='-risk_score,predicted_next_service_date')
+        
+        return jsonify(paginated_response(query, page, per_page, lambda prediction: prediction.to_dict())), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching maintenance predictions: {str(e)}'
+        }), 500
+
+@maintenance_bp.route('/maintenance/predictions/run', methods=['POST'])
+@admin_or_manager_required
+def run_maintenance_predictions(current_user):
+    """Recompute predictions for the whole fleet (admin/manager only)"""
+    try:
+        summary = run_predictions()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Maintenance predictions updated successfully',
+            'data': summary
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error running maintenance predictions: {str(e)}'
+        }), 500
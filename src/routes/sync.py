@@ -0,0 +1,43 @@
+from flask import Blueprint, request, jsonify
+from src.auth import token_required
+from src.querybudget import query_budget
+from src.sync import changes_since, CursorExpired, DEFAULT_PER_PAGE
+
+sync_bp = Blueprint('sync', __name__)
+
+@sync_bp.route('/sync', methods=['GET'])
+@query_budget(9)
+@token_required
+def get_changes(current_user):
+    """Get the vehicles, drivers, trips and maintenance changed since a cursor"""
+    try:
+        since = request.args.get('since')
+        per_page = request.args.get('per_page', default=DEFAULT_PER_PAGE, type=int)
+        
+        page = changes_since(current_user, since, per_page)
+        return jsonify({
+            'success': True,
+            'data': page['data'],
+            'count': page['count'],
+            'sync': {
+                'cursor': page['cursor'],
+                'has_more': page['has_more']
+            }
+        }), 200
+        
+    except CursorExpired as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'reset': True
+        }), 410
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching changes: {str(e)}'
+        }), 500
@@ -1,10 +1,34 @@
 from flask import Blueprint, request, jsonify
 from src.models import db, Trip, Vehicle, Driver
+from src.events import publish_trip_event, publish_deleted_event
+from src.search import ranked_matches
+from src.listing import paginated_response
+from src.anomalies import record_trip_efficiency
+from src.querybudget import query_budget
+from src.archive import trip_source, find_archived
+from src.availability import check_trip_booking, BookingConflict
+from src.compliance import check_trip_hours, HoursOfServiceViolation
+from src.locations import route_estimate, record_trip_route
+from src.sketches import record_trip_sketches
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date
 
 trip_bp = Blueprint('trip', __name__)
 
+def _record_completion(trip):
+    """Bookkeeping for a trip that has just become completed (adds to the session, no commit)"""
+    if trip.id is None:
+        db.session.flush()
+    # Score the trip against the vehicle's rolling km/l in the same transaction
+    anomaly = record_trip_efficiency(trip)
+    # Keep the route's learned distance and fuel current
+    record_trip_route(trip)
+    # ...and the duration and km/l distributions
+    record_trip_sketches(trip)
+    return anomaly
+
 @trip_bp.route('/trips', methods=['GET'])
+@query_budget(4)
 def get_trips():
     """Get all trips with optional filtering"""
     try:
@@ -13,35 +37,61 @@ def get_trips():
         status = request.args.get('status')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        q = request.args.get('q', '').strip()
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
+        
+        try:
+            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid start_date format. Use YYYY-MM-DD'
+            }), 400
+        try:
+            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid end_date format. Use YYYY-MM-DD'
+            }), 400
         
-        query = Trip.query
+        # Archived trips are included only when the range reaches back to them
+        trips = trip_source(start_date_obj)
+        
+        # to_dict() embeds the vehicle and driver: load them in the same query
+        query = db.session.query(trips).options(joinedload(trips.vehicle), joinedload(trips.driver))
         
         if vehicle_id:
-            query = query.filter(Trip.vehicle_id == vehicle_id)
+            query = query.filter(trips.vehicle_id == vehicle_id)
         if driver_id:
-            query = query.filter(Trip.driver_id == driver_id)
+            query = query.filter(trips.driver_id == driver_id)
         if status:
-            query = query.filter(Trip.status == status)
-        if start_date:
-            try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(Trip.trip_date >= start_date_obj)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'message': 'Invalid start_date format. Use YYYY-MM-DD'
-                }), 400
-        if end_date:
-            try:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(Trip.trip_date <= end_date_obj)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'message': 'Invalid end_date format. Use YYYY-MM-DD'
-                }), 400
-        
-        trips = query.order_by(Trip.trip_date.desc()).all()
+            query = query.filter(trips.status == status)
+        if start_date_obj:
+            query = query.filter(trips.trip_date >= start_date_obj)
+        if end_date_obj:
+            query = query.filter(trips.trip_date <= end_date_obj)
+        
+        if q:
+            # Full-text search: best matches first, newest first among ties
+            matches = ranked_matches('trip', q)
+            if matches is None:
+                query = query.filter(db.false())
+            else:
+                # Only hot trips are indexed, so archived ones never match
+                query = query.join(matches, matches.c.id == trips.id).order_by(
+                    matches.c.rank, trips.trip_date.desc()
+                )
+                # Searches are always paginated
+                page = page or 1
+        else:
+            query = query.order_by(trips.trip_date.desc())
+        
+        if page:
+            return jsonify(paginated_response(query, page, per_page, lambda trip: trip.to_dict())), 200
+        
+        trips = query.all()
         return jsonify({
             'success': True,
             'data': [trip.to_dict() for trip in trips],
@@ -54,11 +104,49 @@ def get_trips():
             'message': f'Error fetching trips: {str(e)}'
         }), 500
 
+@trip_bp.route('/trips/estimate', methods=['GET'])
+@query_budget(3)
+def get_trip_estimate():
+    """Get the median distance and fuel of completed trips between two places"""
+    try:
+        source = request.args.get('source', '').strip()
+        destination = request.args.get('destination', '').strip()
+        if not source or not destination:
+            return jsonify({
+                'success': False,
+                'message': 'Both source and destination are required'
+            }), 400
+        
+        estimate = route_estimate(source, destination)
+        if estimate is None:
+            return jsonify({
+                'success': False,
+                'message': 'No completed trips on this route yet'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': estimate.to_dict()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error estimating trip: {str(e)}'
+        }), 500
+
 @trip_bp.route('/trips/<int:trip_id>', methods=['GET'])
+@query_budget(4)
 def get_trip(trip_id):
     """Get a specific trip by ID"""
     try:
-        trip = Trip.query.get_or_404(trip_id)
+        trip = db.session.get(Trip, trip_id) or find_archived(Trip, trip_id)
+        if not trip:
+            return jsonify({
+                'success': False,
+                'message': 'Trip not found'
+            }), 404
+        
         return jsonify({
             'success': True,
             'data': trip.to_dict()
@@ -141,13 +229,25 @@ def create_trip():
                     'message': 'Invalid end_time format. Use ISO format'
                 }), 400
         
+        # Reject a vehicle or driver already booked for an overlapping open trip
+        check_trip_booking(trip_date, start_time, end_time, data.get('status', 'planned'),
+                           vehicle.id, driver.id)
+        # ...and a driver it would take over the driving-hour limits
+        check_trip_hours(start_time, end_time, data.get('status', 'planned'), driver.id)
+        
+        # Fill in a missing distance from the route's completed trips
+        distance = data.get('distance')
+        estimate = route_estimate(data['source'], data['destination'])
+        if distance is None and estimate is not None:
+            distance = estimate.median_distance
+        
         # Create new trip
         trip = Trip(
             vehicle_id=data['vehicle_id'],
             driver_id=data['driver_id'],
             source=data['source'],
             destination=data['destination'],
-            distance=data.get('distance'),
+            distance=distance,
             fuel_used=data.get('fuel_used'),
             trip_date=trip_date,
             start_time=start_time,
@@ -157,14 +257,38 @@ def create_trip():
         )
         
         db.session.add(trip)
+        anomaly = _record_completion(trip) if trip.status == 'completed' else None
         db.session.commit()
+        publish_trip_event(trip, 'trip.created')
         
         return jsonify({
             'success': True,
             'message': 'Trip created successfully',
-            'data': trip.to_dict()
+            'data': trip.to_dict(),
+            'route_estimate': estimate.to_dict() if estimate else None,
+            'fuel_anomaly': anomaly.to_dict() if anomaly else None
         }), 201
         
+    except BookingConflict as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'conflicts': [trip.id for trip in e.trips]
+        }), 409
+    except HoursOfServiceViolation as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'violations': e.violations
+        }), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -178,6 +302,7 @@ def update_trip(trip_id):
     try:
         trip = Trip.query.get_or_404(trip_id)
         data = request.get_json()
+        previous_status = trip.status
         
         # Validate vehicle if provided
         if 'vehicle_id' in data:
@@ -254,15 +379,48 @@ def update_trip(trip_id):
         if 'notes' in data:
             trip.notes = data['notes']
         
+        # Re-check bookings when the schedule, assignment or status changed
+        schedule_fields = ('vehicle_id', 'driver_id', 'trip_date', 'start_time', 'end_time', 'status')
+        if any(field in data for field in schedule_fields):
+            with db.session.no_autoflush:
+                check_trip_booking(trip.trip_date, trip.start_time, trip.end_time, trip.status,
+                                   trip.vehicle_id, trip.driver_id, exclude_trip_id=trip.id)
+                check_trip_hours(trip.start_time, trip.end_time, trip.status, trip.driver_id,
+                                 exclude_trip_id=trip.id)
+        
         trip.updated_at = datetime.utcnow()
+        completed = trip.status == 'completed' and previous_status != 'completed'
+        anomaly = _record_completion(trip) if completed else None
         db.session.commit()
+        publish_trip_event(trip, 'trip.updated', previous_status)
         
         return jsonify({
             'success': True,
             'message': 'Trip updated successfully',
-            'data': trip.to_dict()
+            'data': trip.to_dict(),
+            'fuel_anomaly': anomaly.to_dict() if anomaly else None
         }), 200
         
+    except BookingConflict as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'conflicts': [trip.id for trip in e.trips]
+        }), 409
+    except HoursOfServiceViolation as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'violations': e.violations
+        }), 409
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -275,9 +433,11 @@ def delete_trip(trip_id):
     """Delete a trip"""
     try:
         trip = Trip.query.get_or_404(trip_id)
+        driver_user_id = trip.driver.user_id if trip.driver else None
         
         db.session.delete(trip)
         db.session.commit()
+        publish_deleted_event('trip', trip_id, driver_user_id)
         
         return jsonify({
             'success': True,
@@ -303,11 +463,17 @@ def start_trip(trip_id):
                 'message': 'Trip can only be started if it is in planned status'
             }), 400
         
+        started_at = datetime.utcnow()
+        # A planned end already passed no longer says how long the trip runs
+        planned_end = trip.end_time if trip.end_time and trip.end_time > started_at else None
+        check_trip_hours(started_at, planned_end, 'in_progress', trip.driver_id, exclude_trip_id=trip.id)
+        
         trip.status = 'in_progress'
-        trip.start_time = datetime.utcnow()
+        trip.start_time = started_at
         trip.updated_at = datetime.utcnow()
         
         db.session.commit()
+        publish_trip_event(trip, 'trip.started', 'planned')
         
         return jsonify({
             'success': True,
@@ -315,6 +481,13 @@ def start_trip(trip_id):
             'data': trip.to_dict()
         }), 200
         
+    except HoursOfServiceViolation as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'violations': e.violations
+        }), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -335,6 +508,7 @@ def complete_trip(trip_id):
                 'message': 'Trip can only be completed if it is in planned or in_progress status'
             }), 400
         
+        previous_status = trip.status
         trip.status = 'completed'
         trip.end_time = datetime.utcnow()
         trip.updated_at = datetime.utcnow()
@@ -347,12 +521,16 @@ def complete_trip(trip_id):
         if 'notes' in data:
             trip.notes = data['notes']
         
+        anomaly = _record_completion(trip)
+        
         db.session.commit()
+        publish_trip_event(trip, 'trip.completed', previous_status)
         
         return jsonify({
             'success': True,
             'message': 'Trip completed successfully',
-            'data': trip.to_dict()
+            'data': trip.to_dict(),
+            'fuel_anomaly': anomaly.to_dict() if anomaly else None
         }), 200
         
     except Exception as e:
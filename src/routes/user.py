@@ -1,10 +1,21 @@
 from flask import Blueprint, request, jsonify
 from src.models import db, User
 from src.auth import AuthManager, token_required, admin_required
+from src.listing import apply_prefix_search, apply_sort, paginated_response
+from src.querybudget import query_budget
 from datetime import datetime
 
 user_bp = Blueprint('user', __name__)
 
+USER_SORT_FIELDS = {
+    'id': User.id,
+    'username': User.username,
+    'email': User.email,
+    'role': User.role,
+    'is_active': User.is_active,
+    'created_at': User.created_at
+}
+
 @user_bp.route('/auth/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -163,17 +174,42 @@ def change_password(current_user):
         }), 500
 
 @user_bp.route('/users', methods=['GET'])
+@query_budget(3)
 @admin_required
 def get_users(current_user):
     """Get all users (admin only)"""
     try:
-        users = User.query.all()
+        role = request.args.get('role')
+        q = request.args.get('q', '').strip()
+        sort = request.args.get('sort')
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
+        
+        query = User.query
+        
+        if role:
+            query = query.filter(User.role == role)
+        if q:
+            query = apply_prefix_search(query, [User.username, User.email], q)
+            page = page or 1
+        
+        query = apply_sort(query, sort, USER_SORT_FIELDS, default='id')
+        
+        if page:
+            return jsonify(paginated_response(query, page, per_page, lambda user: user.to_dict())), 200
+        
+        users = query.all()
         return jsonify({
             'success': True,
             'data': [user.to_dict() for user in users],
             'count': len(users)
         }), 200
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -181,6 +217,7 @@ def get_users(current_user):
         }), 500
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
+@query_budget(3)
 @admin_required
 def get_user(user_id, current_user):
     """Get a specific user by ID (admin only)"""
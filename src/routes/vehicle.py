@@ -1,17 +1,38 @@
 from flask import Blueprint, request, jsonify
 from src.models import db, Vehicle
+from src.events import publish_vehicle_event, publish_deleted_event
+from src.listing import apply_prefix_search, apply_sort, paginated_response
 from src.auth import token_required, admin_required, admin_or_manager_required
+from src.querybudget import query_budget
+from src.admission import admission_class
+from src.archive import has_archived_trips, has_archived_maintenance, archived_trip_totals, archived_maintenance_totals
+from src.availability import parse_window, available_vehicles
 from datetime import datetime
 
 vehicle_bp = Blueprint('vehicle', __name__)
 
+VEHICLE_SORT_FIELDS = {
+    'id': Vehicle.id,
+    'reg_no': Vehicle.reg_no,
+    'model': Vehicle.model,
+    'fuel_type': Vehicle.fuel_type,
+    'status': Vehicle.status,
+    'created_at': Vehicle.created_at,
+    'updated_at': Vehicle.updated_at
+}
+
 @vehicle_bp.route('/vehicles', methods=['GET'])
+@query_budget(3)
 @token_required
 def get_vehicles(current_user):
     """Get all vehicles with optional filtering"""
     try:
         status = request.args.get('status')
         fuel_type = request.args.get('fuel_type')
+        q = request.args.get('q', '').strip()
+        sort = request.args.get('sort')
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', default=20, type=int)
         
         query = Vehicle.query
         
@@ -19,6 +40,14 @@ def get_vehicles(current_user):
             query = query.filter(Vehicle.status == status)
         if fuel_type:
             query = query.filter(Vehicle.fuel_type == fuel_type)
+        if q:
+            query = apply_prefix_search(query, [Vehicle.reg_no, Vehicle.model], q)
+            page = page or 1
+        
+        query = apply_sort(query, sort, VEHICLE_SORT_FIELDS, default='id')
+        
+        if page:
+            return jsonify(paginated_response(query, page, per_page, lambda vehicle: vehicle.to_dict())), 200
             
         vehicles = query.all()
         return jsonify({
@@ -27,13 +56,46 @@ def get_vehicles(current_user):
             'count': len(vehicles)
         }), 200
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error fetching vehicles: {str(e)}'
         }), 500
 
+@vehicle_bp.route('/vehicles/available', methods=['GET'])
+@query_budget(2)
+@token_required
+def get_available_vehicles(current_user):
+    """Get active vehicles with no open trip between from and to"""
+    try:
+        start, end = parse_window(request.args.get('from'), request.args.get('to'))
+        fuel_type = request.args.get('fuel_type')
+        
+        vehicles = available_vehicles(start, end, fuel_type)
+        return jsonify({
+            'success': True,
+            'data': [vehicle.to_dict() for vehicle in vehicles],
+            'count': len(vehicles)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error fetching available vehicles: {str(e)}'
+        }), 500
+
 @vehicle_bp.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@query_budget(3)
 @token_required
 def get_vehicle(vehicle_id, current_user):
     """Get a specific vehicle by ID"""
@@ -100,6 +162,7 @@ def create_vehicle(current_user):
         
         db.session.add(vehicle)
         db.session.commit()
+        publish_vehicle_event(vehicle, 'vehicle.created')
         
         return jsonify({
             'success': True,
@@ -121,6 +184,7 @@ def update_vehicle(vehicle_id, current_user):
     try:
         vehicle = Vehicle.query.get_or_404(vehicle_id)
         data = request.get_json()
+        previous_status = vehicle.status
         
         # Validate fuel_type if provided
         if 'fuel_type' in data:
@@ -161,6 +225,7 @@ def update_vehicle(vehicle_id, current_user):
         
         vehicle.updated_at = datetime.utcnow()
         db.session.commit()
+        publish_vehicle_event(vehicle, 'vehicle.updated', previous_status)
         
         return jsonify({
             'success': True,
@@ -182,15 +247,22 @@ def delete_vehicle(vehicle_id, current_user):
     try:
         vehicle = Vehicle.query.get_or_404(vehicle_id)
         
-        # Check if vehicle has associated trips
-        if vehicle.trips:
+        # Check if vehicle has associated trips, archived ones included
+        if vehicle.trips or has_archived_trips(vehicle_id=vehicle_id):
             return jsonify({
                 'success': False,
                 'message': 'Cannot delete vehicle with associated trips'
             }), 400
+        # Archived maintenance feeds its all-time costs and service history
+        if has_archived_maintenance(vehicle_id):
+            return jsonify({
+                'success': False,
+                'message': 'Cannot delete vehicle with archived maintenance records'
+            }), 400
         
         db.session.delete(vehicle)
         db.session.commit()
+        publish_deleted_event('vehicle', vehicle_id)
         
         return jsonify({
             'success': True,
@@ -205,18 +277,25 @@ def delete_vehicle(vehicle_id, current_user):
         }), 500
 
 @vehicle_bp.route('/vehicles/<int:vehicle_id>/stats', methods=['GET'])
+@query_budget(7)
+@admission_class('analytics')
 @token_required
 def get_vehicle_stats(vehicle_id, current_user):
     """Get statistics for a specific vehicle"""
     try:
         vehicle = Vehicle.query.get_or_404(vehicle_id)
         
+        # Archived trips and maintenance count through their rollups
+        archived = archived_trip_totals('vehicle_id')
+        archived_trips = db.session.query(archived).filter(archived.c.vehicle_id == vehicle_id).first()
+        archived_maintenance_count, archived_maintenance_cost = archived_maintenance_totals(vehicle_id)
+        
         stats = {
-            'total_trips': vehicle.get_total_trips(),
-            'total_distance': vehicle.get_total_distance(),
-            'total_fuel_used': vehicle.get_total_fuel_used(),
-            'maintenance_count': len(vehicle.maintenance_records),
-            'total_maintenance_cost': sum(m.cost for m in vehicle.maintenance_records)
+            'total_trips': vehicle.get_total_trips() + (archived_trips.trip_count if archived_trips else 0),
+            'total_distance': vehicle.get_total_distance() + (archived_trips.total_distance if archived_trips else 0),
+            'total_fuel_used': vehicle.get_total_fuel_used() + (archived_trips.total_fuel if archived_trips else 0),
+            'maintenance_count': len(vehicle.maintenance_records) + archived_maintenance_count,
+            'total_maintenance_cost': sum(m.cost for m in vehicle.maintenance_records) + archived_maintenance_cost
         }
         
         return jsonify({
@@ -0,0 +1,309 @@
+"""Lightweight in-process scheduler for periodic background jobs.
+
+Jobs are registered with an interval or a cron-style trigger and run on a
+small thread pool inside an application context. Every worker process runs
+its own scheduler loop, so before a job starts the worker must take the job's
+lease row in `ScheduledJob`, which prevents overlapping runs. Triggers fire at
+the same moments in every worker (interval triggers count from the Unix
+epoch), and a scheduled run only takes the lease if nobody has started the
+job since that fire time, so each fire runs once across workers however far
+apart their loops tick. The same row records the last run, its duration and
+failure counts for the admin endpoint.
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+
+from src.models import db, ScheduledJob
+
+DEFAULT_LEASE_SECONDS = 15 * 60
+MAX_ERROR_LENGTH = 2000
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class IntervalTrigger:
+    """Fire every `seconds` seconds, on multiples of `seconds` since the Unix epoch"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError('Interval must be a positive number of seconds')
+        self.seconds = seconds
+
+    def next_fire(self, after):
+        # Aligned to the epoch so that every worker computes the same fire times
+        fires = (after - EPOCH).total_seconds() // self.seconds + 1
+        return EPOCH + timedelta(seconds=fires * self.seconds)
+
+    def describe(self):
+        return f'every {self.seconds}s'
+
+
+class CronTrigger:
+    """Fire on a five-field cron expression: minute hour day month weekday.
+
+    Fields accept `*`, numbers, ranges (`1-5`), steps (`*/15`, `0-30/10`) and
+    comma-separated lists. Weekdays run 0-6 from Sunday (7 is also Sunday).
+    As in cron, when both day and weekday are restricted either may match.
+    Times are UTC, like every other timestamp in the application.
+    """
+
+    FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != len(self.FIELDS):
+            raise ValueError(f'Invalid cron expression "{expression}": expected 5 fields')
+        self.expression = expression
+        values = {}
+        for part, (name, low, high) in zip(parts, self.FIELDS):
+            values[name] = self._parse_field(part, name, low, high)
+        self.minutes = values['minute']
+        self.hours = values['hour']
+        self.days = values['day']
+        self.months = values['month']
+        self.weekdays = {day % 7 for day in values['weekday']}
+        self.day_restricted = parts[2] != '*'
+        self.weekday_restricted = parts[4] != '*'
+
+    @staticmethod
+    def _parse_field(field, name, low, high):
+        values = set()
+        for item in field.split(','):
+            step = 1
+            if '/' in item:
+                item, step_text = item.split('/', 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f'Invalid step in cron {name} field: {field}')
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start, end = (int(value) for value in item.split('-', 1))
+            else:
+                start = end = int(item)
+            if start < low or end > high or start > end:
+                raise ValueError(f'Invalid cron {name} field: {field} (allowed {low}-{high})')
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        in_days = moment.day in self.days
+        # Python: Monday=0; cron: Sunday=0
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def next_fire(self, after):
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skip whole months, days and hours that cannot match; five years
+        # bounds expressions such as "0 0 31 2 *" that never fire.
+        limit = moment + timedelta(days=5 * 366)
+        while moment <= limit:
+            if moment.month not in self.months:
+                year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+                moment = moment.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f'Cron expression "{self.expression}" never fires')
+
+    def describe(self):
+        return f'cron {self.expression}'
+
+
+class Job:
+    def __init__(self, name, func, trigger, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.lease_seconds = lease_seconds
+        self.next_run_at = None
+        self.running = False
+
+
+class Scheduler:
+    """Runs registered jobs on a thread pool, one lease-holding runner at a time"""
+
+    def __init__(self, max_workers=2, tick_seconds=1.0):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._max_workers = max_workers
+        self._tick_seconds = tick_seconds
+        self.app = None
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def job(self, name, interval=None, cron=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Decorator registering a job with an `interval` (seconds) or `cron` trigger"""
+        if (interval is None) == (cron is None):
+            raise ValueError('Pass exactly one of interval or cron')
+        trigger = IntervalTrigger(interval) if interval is not None else CronTrigger(cron)
+
+        def decorator(func):
+            job = Job(name, func, trigger, lease_seconds)
+            if self._thread is not None:
+                job.next_run_at = trigger.next_fire(datetime.utcnow())
+            self._jobs[name] = job
+            return func
+        return decorator
+
+    def init_app(self, app):
+        """Bind the scheduler to `app` and create a lease row for every job"""
+        self.app = app
+        with app.app_context():
+            for name in self._jobs:
+                if ScheduledJob.query.filter_by(name=name).first() is None:
+                    db.session.add(ScheduledJob(name=name))
+                    try:
+                        db.session.commit()
+                    except IntegrityError:
+                        # Another worker created it first
+                        db.session.rollback()
+
+    def start(self):
+        """Start the scheduler loop in a daemon thread"""
+        if self._thread is not None:
+            return
+        now = datetime.utcnow()
+        for job in self._jobs.values():
+            job.next_run_at = job.trigger.next_fire(now)
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='scheduler')
+        self._thread = threading.Thread(target=self._loop, name='scheduler-loop', daemon=True)
+        self._thread.start()
+
+    def shutdown(self, wait=True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _loop(self):
+        while not self._stop.wait(self._tick_seconds):
+            now = datetime.utcnow()
+            for job in list(self._jobs.values()):
+                if job.next_run_at is not None and job.next_run_at <= now:
+                    fire_time = job.next_run_at
+                    job.next_run_at = job.trigger.next_fire(now)
+                    self._submit(job, fire_time)
+
+    def _submit(self, job, fire_time=None):
+        with self._lock:
+            if job.running:
+                # Previous run still going in this worker: skip, don't queue up
+                return False
+            job.running = True
+        executor = self._executor
+        if executor is None:
+            # Not started (e.g. one-off scripts): run on a throwaway thread
+            threading.Thread(target=self._run, args=(job, fire_time), name=f'scheduler-{job.name}', daemon=True).start()
+        else:
+            executor.submit(self._run, job, fire_time)
+        return True
+
+    def run_now(self, name):
+        """Queue `name` to run immediately. Returns False if it is already running here."""
+        if name not in self._jobs:
+            raise KeyError(name)
+        return self._submit(self._jobs[name])
+
+    def _acquire_lease(self, job, now, fire_time=None):
+        """Take the job's lease; for a scheduled fire, only if no worker has started it since"""
+        conditions = [
+            ScheduledJob.name == job.name,
+            or_(ScheduledJob.lease_owner.is_(None), ScheduledJob.lease_expires_at < now)
+        ]
+        if fire_time is not None:
+            conditions.append(or_(ScheduledJob.last_started_at.is_(None), ScheduledJob.last_started_at < fire_time))
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(ScheduledJob).where(*conditions).values(
+                    lease_owner=self.owner,
+                    lease_expires_at=now + timedelta(seconds=job.lease_seconds),
+                    last_started_at=now,
+                    last_status='running'
+                )
+            )
+            return result.rowcount == 1
+
+    def _release_lease(self, job, duration_ms, error):
+        failed = error is not None
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(ScheduledJob).where(
+                    ScheduledJob.name == job.name,
+                    ScheduledJob.lease_owner == self.owner
+                ).values(
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    last_finished_at=datetime.utcnow(),
+                    last_duration_ms=round(duration_ms, 1),
+                    last_status='failed' if failed else 'success',
+                    last_error=error[-MAX_ERROR_LENGTH:] if failed else None,
+                    run_count=ScheduledJob.run_count + 1,
+                    failure_count=ScheduledJob.failure_count + (1 if failed else 0),
+                    consecutive_failures=(ScheduledJob.consecutive_failures + 1) if failed else 0
+                )
+            )
+
+    def _run(self, job, fire_time=None):
+        try:
+            with self.app.app_context():
+                started = datetime.utcnow()
+                if not self._acquire_lease(job, started, fire_time):
+                    # Another worker holds the lease or already ran this fire
+                    return
+                clock = time.monotonic()
+                error = None
+                try:
+                    job.func()
+                except Exception:
+                    db.session.rollback()
+                    error = traceback.format_exc()
+                self._release_lease(job, (time.monotonic() - clock) * 1000, error)
+        finally:
+            with self._lock:
+                job.running = False
+
+    def describe_jobs(self):
+        """Registered jobs merged with their shared run history"""
+        rows = {row.name: row for row in ScheduledJob.query.filter(ScheduledJob.name.in_(list(self._jobs))).all()}
+        jobs = []
+        for name, job in sorted(self._jobs.items()):
+            item = rows[name].to_dict() if name in rows else {'name': name}
+            item.update({
+                'trigger': job.trigger.describe(),
+                'lease_seconds': job.lease_seconds,
+                'next_run_at': job.next_run_at.isoformat() if job.next_run_at else None,
+                'running_here': job.running
+            })
+            jobs.append(item)
+        return jobs
+
+    def has_job(self, name):
+        return name in self._jobs
+
+
+scheduler = Scheduler()
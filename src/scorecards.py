@@ -0,0 +1,224 @@
+"""Driver scorecards, computed for every driver at once and kept for the day.
+
+Each scorecard covers the driver's whole history (archived trips included):
+
+* `trips`, `completed_trips`, `cancelled_trips` and `completion_rate`, the
+  share of closed trips (completed or cancelled) that were completed;
+* the median and 95th percentile duration of completed trips with both a
+  `start_time` and an `end_time` (as `Trip.get_duration_hours()`);
+* `fuel_efficiency` in km/l against `fleet_efficiency`, what the whole fleet
+  achieves on the same vehicle models weighted by the driver's distance on
+  each, so a driver is not penalized for being given thirstier vehicles;
+* `score`, the completion rate times `efficiency_vs_fleet` (1.0 without fuel
+  data), and `rank` by score. Drivers without closed trips rank last.
+
+Counts and per-model sums are grouped in SQL and only the durations (one
+number per completed trip) come back row by row; medians, percentiles and
+ranks are then computed on NumPy arrays for all drivers at once.
+`ensure_scorecards()` recomputes them when the stored ones are from an
+earlier day; the `driver_scorecards` job does so every night.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import threading
+import time
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import func, case, insert, delete
+
+from src.models import db, Driver, Vehicle, DriverScorecard
+from src.archive import trip_source
+from src.timeseries import hours_between
+
+DURATION_QUANTILES = (0.5, 0.95)
+
+_compute_lock = threading.Lock()
+
+
+def group_quantiles(groups, values, quantiles):
+    """Per-group quantiles (linear interpolation, as `np.quantile`).
+
+    Returns the distinct groups and one array per quantile, aligned with them.
+    """
+    if groups.size == 0:
+        return groups, [np.empty(0) for _ in quantiles]
+    order = np.lexsort((values, groups))
+    groups, values = groups[order], values[order]
+    keys, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    results = []
+    for quantile in quantiles:
+        position = starts + (counts - 1) * quantile
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        results.append(values[low] + (values[high] - values[low]) * (position - low))
+    return keys, results
+
+
+def _positions(index, driver_ids):
+    """Positions of `driver_ids` in `index`, and which of them are there at all"""
+    positions = np.minimum(np.searchsorted(index, driver_ids), max(index.size - 1, 0))
+    # Archived trips may belong to drivers deleted since
+    known = index[positions] == driver_ids if index.size else np.zeros(driver_ids.size, dtype=bool)
+    return positions, known
+
+
+def _load_counts(trips, index):
+    counts = np.zeros((3, index.size), dtype=np.int64)
+    rows = db.session.query(
+        trips.driver_id,
+        func.count(trips.id),
+        func.sum(case((trips.status == 'completed', 1), else_=0)),
+        func.sum(case((trips.status == 'cancelled', 1), else_=0))
+    ).group_by(trips.driver_id).all()
+    if rows:
+        columns = np.array(rows, dtype=np.int64).T
+        positions, known = _positions(index, columns[0])
+        counts[:, positions[known]] = columns[1:, known]
+    return counts
+
+
+def _load_durations(trips, index):
+    hours = hours_between(trips.start_time, trips.end_time)
+    rows = db.session.query(trips.driver_id, hours).filter(
+        trips.status == 'completed',
+        trips.start_time.isnot(None),
+        trips.end_time.isnot(None),
+        trips.end_time > trips.start_time
+    ).all()
+    quantiles = np.full((len(DURATION_QUANTILES), index.size), np.nan)
+    if rows:
+        driver_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+        keys, results = group_quantiles(driver_ids, values, DURATION_QUANTILES)
+        positions, known = _positions(index, keys)
+        for row, result in enumerate(results):
+            quantiles[row, positions[known]] = result[known]
+    return quantiles
+
+
+def _load_efficiency(trips, index):
+    """`(km/l, fleet km/l on the same models)` per driver; NaN without fuel data"""
+    rows = db.session.query(
+        trips.driver_id,
+        Vehicle.model,
+        func.sum(trips.distance),
+        func.sum(trips.fuel_used)
+    ).join(Vehicle, Vehicle.id == trips.vehicle_id).filter(
+        trips.distance > 0,
+        trips.fuel_used > 0
+    ).group_by(trips.driver_id, Vehicle.model).all()
+    efficiency = np.full(index.size, np.nan)
+    fleet = np.full(index.size, np.nan)
+    if not rows:
+        return efficiency, fleet
+
+    driver_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    models, model_index = np.unique(np.array([row[1] for row in rows], dtype=object).astype(str),
+                                    return_inverse=True)
+    distance = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+    fuel = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+
+    # Fleet km/l per model, then the fuel the fleet would have used on each
+    # driver's distance with the same models
+    model_efficiency = (np.bincount(model_index, weights=distance, minlength=models.size) /
+                        np.bincount(model_index, weights=fuel, minlength=models.size))
+    expected_fuel = distance / model_efficiency[model_index]
+
+    positions, known = _positions(index, driver_ids)
+    positions = positions[known]
+    total_distance = np.bincount(positions, weights=distance[known], minlength=index.size)
+    total_fuel = np.bincount(positions, weights=fuel[known], minlength=index.size)
+    total_expected = np.bincount(positions, weights=expected_fuel[known], minlength=index.size)
+    measured = total_fuel > 0
+    efficiency[measured] = total_distance[measured] / total_fuel[measured]
+    fleet[measured] = total_distance[measured] / total_expected[measured]
+    return efficiency, fleet
+
+
+def _optional(value):
+    return None if np.isnan(value) else float(value)
+
+
+def compute_scorecards(today=None):
+    """Recompute every driver's scorecard and store them; returns a short summary"""
+    started = time.monotonic()
+    today = today or date.today()
+
+    index = np.fromiter((driver_id for (driver_id,) in
+                         db.session.query(Driver.id).order_by(Driver.id)), dtype=np.int64)
+    trips = trip_source()
+    trip_counts, completed, cancelled = _load_counts(trips, index)
+    durations = _load_durations(trips, index)
+    efficiency, fleet = _load_efficiency(trips, index)
+
+    closed = completed + cancelled
+    completion_rate = np.full(index.size, np.nan)
+    completion_rate[closed > 0] = completed[closed > 0] / closed[closed > 0]
+    versus_fleet = efficiency / fleet
+    score = completion_rate * np.where(np.isnan(versus_fleet), 1.0, versus_fleet)
+
+    # Best score first, then more completed trips; unscored drivers last
+    order = np.lexsort((index, -completed, -np.nan_to_num(score, nan=-np.inf)))
+    rank = np.empty(index.size, dtype=np.int64)
+    rank[order] = np.arange(1, index.size + 1)
+
+    computed_at = datetime.utcnow()
+    scorecards = [
+        {
+            'driver_id': int(index[i]),
+            'scorecard_date': today,
+            'trips': int(trip_counts[i]),
+            'completed_trips': int(completed[i]),
+            'cancelled_trips': int(cancelled[i]),
+            'completion_rate': _optional(completion_rate[i]),
+            'median_duration_hours': _optional(durations[0, i]),
+            'p95_duration_hours': _optional(durations[1, i]),
+            'fuel_efficiency': _optional(efficiency[i]),
+            'fleet_efficiency': _optional(fleet[i]),
+            'efficiency_vs_fleet': _optional(versus_fleet[i]),
+            'score': _optional(score[i]),
+            'rank': int(rank[i]),
+            'computed_at': computed_at
+        }
+        for i in range(index.size)
+    ]
+
+    try:
+        db.session.execute(delete(DriverScorecard))
+        if scorecards:
+            db.session.execute(insert(DriverScorecard), scorecards)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'drivers': int(index.size),
+        'trips': int(trip_counts.sum()),
+        'scorecard_date': today.isoformat(),
+        'duration_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+
+def ensure_scorecards(today=None):
+    """Recompute the scorecards unless they were already computed `today`"""
+    today = today or date.today()
+    # Requests arriving while the first one of the day computes wait for it
+    with _compute_lock:
+        if db.session.query(func.min(DriverScorecard.scorecard_date)).scalar() == today:
+            return False
+        compute_scorecards(today)
+    return True
+
+
+if __name__ == '__main__':
+    from src.main import app
+
+    with app.app_context():
+        summary = compute_scorecards()
+        print(f"Scorecards computed for {summary['drivers']} drivers "
+              f"({summary['trips']} trips) in {summary['duration_ms']} ms.")
@@ -0,0 +1,164 @@
+"""Full-text search over trips and maintenance records.
+
+SQLite uses external-content FTS5 tables and PostgreSQL a `search_vector`
+tsvector column; both are kept in sync with the base tables by triggers and
+match accent-insensitively, so "uige" finds "Uíge".
+"""
+
+import re
+from sqlalchemy import text, Integer, Float
+from src.models import db
+
+# entity -> (base table, indexed columns)
+SEARCH_INDEXES = {
+    'trip': ('trip', ('source', 'destination', 'notes')),
+    'maintenance': ('maintenance', ('description', 'service_provider'))
+}
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Set by install_search_indexes(); without FTS support, search falls back to
+# (accent-sensitive, unranked) LIKE matching.
+_fts_enabled = False
+
+
+def _dialect_name():
+    return db.engine.dialect.name
+
+
+def _sqlite_has_fts5(connection):
+    try:
+        connection.execute(text('CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)'))
+        connection.execute(text('DROP TABLE temp._fts5_probe'))
+        return True
+    except Exception:
+        return False
+
+
+def _install_sqlite(connection, table, columns, rebuild):
+    fts = f'{table}_fts'
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': fts}
+    ).first() is not None
+
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column_list}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+    ))
+
+    if rebuild or not exists:
+        connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def _install_postgresql(connection, table, columns, rebuild):
+    document = " || ' ' || ".join(f"coalesce(NEW.{column}, '')" for column in columns)
+
+    connection.execute(text('CREATE EXTENSION IF NOT EXISTS unaccent'))
+    connection.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector'))
+    connection.execute(text(
+        f"CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$ "
+        f"BEGIN NEW.search_vector := to_tsvector('simple', unaccent({document})); RETURN NEW; END "
+        f"$$ LANGUAGE plpgsql"
+    ))
+    connection.execute(text(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}'))
+    connection.execute(text(
+        f"CREATE TRIGGER {table}_search_vector_trigger BEFORE INSERT OR UPDATE OF "
+        f"{', '.join(columns)} ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()"
+    ))
+    connection.execute(text(
+        f'CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)'
+    ))
+
+    # Touching an indexed column fires the trigger and fills in the vector
+    backfill = f'UPDATE {table} SET {columns[0]} = {columns[0]}'
+    if not rebuild:
+        backfill += ' WHERE search_vector IS NULL'
+    connection.execute(text(backfill))
+
+
+def install_search_indexes(rebuild=False):
+    """Create the search indexes and sync triggers if they are missing.
+
+    Safe to call on every start-up; existing rows are indexed the first time
+    (or every time, with `rebuild=True`).
+    """
+    global _fts_enabled
+
+    dialect = _dialect_name()
+    if dialect not in ('sqlite', 'postgresql'):
+        _fts_enabled = False
+        return False
+
+    with db.engine.begin() as connection:
+        if dialect == 'sqlite' and not _sqlite_has_fts5(connection):
+            _fts_enabled = False
+            return False
+        for table, columns in SEARCH_INDEXES.values():
+            if dialect == 'postgresql':
+                _install_postgresql(connection, table, columns, rebuild)
+            else:
+                _install_sqlite(connection, table, columns, rebuild)
+
+    _fts_enabled = True
+    return True
+
+
+def search_terms(q):
+    """Split a free-text query into words, dropping operators and punctuation"""
+    return _WORD.findall(q or '')
+
+
+def ranked_matches(entity, q):
+    """Return a `(id, rank)` subquery of rows matching `q`, or None.
+
+    Every word must match, each as a prefix. Lower ranks are better, on both
+    backends, so callers can simply order by `rank` ascending.
+    """
+    words = search_terms(q)
+    if not words:
+        return None
+
+    table, columns = SEARCH_INDEXES[entity]
+    if not _fts_enabled:
+        conditions = []
+        params = {}
+        for index, word in enumerate(words):
+            params[f'word_{index}'] = f'%{word}%'
+            conditions.append('(' + ' OR '.join(
+                f'{column} LIKE :word_{index}' for column in columns
+            ) + ')')
+        statement = text(
+            f"SELECT id, 0.0 AS rank FROM {table} WHERE {' AND '.join(conditions)}"
+        ).bindparams(**params)
+    elif _dialect_name() == 'postgresql':
+        statement = text(
+            f"SELECT id, -ts_rank(search_vector, query) AS rank "
+            f"FROM {table}, to_tsquery('simple', unaccent(:query)) AS query "
+            f"WHERE search_vector @@ query"
+        ).bindparams(query=' & '.join(f'{word}:*' for word in words))
+    else:
+        statement = text(
+            f"SELECT rowid AS id, bm25({table}_fts) AS rank "
+            f"FROM {table}_fts WHERE {table}_fts MATCH :query"
+        ).bindparams(query=' '.join(f'"{word}"*' for word in words))
+
+    return statement.columns(id=Integer, rank=Float).subquery(f'{entity}_search')
@@ -0,0 +1,225 @@
+"""Slow-query log with query-plan capture.
+
+Statements slower than the threshold (`SLOW_QUERY_THRESHOLD_MS`, 200 ms by
+default) are grouped by fingerprint: the SQL with literals and bind
+placeholders normalised, so the same statement with different values counts
+as one. The first slow run of a fingerprint, and at most one per
+`SLOW_QUERY_LOG_INTERVAL` seconds after that, is written as a JSON line to a
+rotating log together with its redacted parameters, the route that ran it
+and the database's query plan. `GET /api/admin/slow-queries` lists the
+slowest fingerprints.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import g, request, has_request_context, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_THRESHOLD_MS = 200
+DEFAULT_LOG_INTERVAL = 60  # seconds between full entries for one fingerprint
+MAX_ENTRIES_PER_MINUTE = 30  # across all fingerprints
+MAX_FINGERPRINTS = 500
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+logger = logging.getLogger('crislina.slow_query')
+logger.propagate = False
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\?')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """Return `(fingerprint, normalised_sql)` for a statement"""
+    normalised = _STRING_LITERAL.sub('?', statement)
+    normalised = _PLACEHOLDER.sub('?', normalised)
+    normalised = _NUMBER.sub('?', normalised)
+    normalised = _IN_LIST.sub('IN (?)', normalised)
+    normalised = _WHITESPACE.sub(' ', normalised).strip()
+    return hashlib.sha1(normalised.encode('utf-8')).hexdigest()[:16], normalised
+
+
+def redact(parameters):
+    """Keep numbers, booleans, dates and NULLs; hide every other value"""
+    def mask(value):
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        return f'<{type(value).__name__}:{len(value) if hasattr(value, "__len__") else "?"}>'
+
+    if isinstance(parameters, dict):
+        return {key: mask(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [mask(value) for value in parameters]
+    return mask(parameters)
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_logged = {}
+        self._window_started = 0.0
+        self._window_entries = 0
+        self.threshold_ms = DEFAULT_THRESHOLD_MS
+        self.log_interval = DEFAULT_LOG_INTERVAL
+        self.enabled = False
+
+    def configure(self, threshold_ms, log_interval, log_path):
+        self.threshold_ms = threshold_ms
+        self.log_interval = log_interval
+        if log_path and not logger.handlers:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.WARNING)
+        self.enabled = True
+
+    def _should_log(self, key, now):
+        """Per-fingerprint and global rate limit for full log entries"""
+        if now - self._last_logged.get(key, float('-inf')) < self.log_interval:
+            return False
+        if now - self._window_started >= 60:
+            self._window_started = now
+            self._window_entries = 0
+        if self._window_entries >= MAX_ENTRIES_PER_MINUTE:
+            return False
+        self._window_entries += 1
+        self._last_logged[key] = now
+        return True
+
+    def record(self, statement, duration_ms, route):
+        """Count a slow statement; returns True when a full entry should be written"""
+        key, normalised = fingerprint(statement)
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= MAX_FINGERPRINTS:
+                    # Forget the fingerprint that has cost the least overall
+                    cheapest = min(self._stats, key=lambda item: self._stats[item]['total_ms'])
+                    del self._stats[cheapest]
+                    self._last_logged.pop(cheapest, None)
+                stats = self._stats[key] = {
+                    'fingerprint': key,
+                    'statement': normalised,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'routes': {}
+                }
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['last_seen'] = datetime.utcnow().isoformat()
+            stats['routes'][route] = stats['routes'].get(route, 0) + 1
+            return key, self._should_log(key, now)
+
+    def top(self, limit=20, order='total'):
+        sort_key = {'total': 'total_ms', 'max': 'max_ms', 'count': 'count'}[order]
+        with self._lock:
+            entries = sorted(self._stats.values(), key=lambda item: item[sort_key], reverse=True)[:limit]
+            return [
+                dict(entry,
+                     total_ms=round(entry['total_ms'], 1),
+                     max_ms=round(entry['max_ms'], 1),
+                     average_ms=round(entry['total_ms'] / entry['count'], 1),
+                     routes=dict(entry['routes']))
+                for entry in entries
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._last_logged.clear()
+
+
+slow_queries = SlowQueryLog()
+
+
+def current_route():
+    if has_request_context():
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        return f'{request.method} {rule}'
+    if has_app_context() and 'slow_query_route' in g:
+        # A worker running part of a request (see the dashboard bundle)
+        return g.slow_query_route
+    return f'thread:{threading.current_thread().name}'
+
+
+def _explain(conn, statement, parameters):
+    """Query plan for a SELECT, run on the same connection"""
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    conn.info['explaining'] = True
+    try:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+        return [' | '.join(str(value) for value in row) for row in rows]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        conn.info['explaining'] = False
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info['slow_query_started'].pop()) * 1000
+    if not slow_queries.enabled or conn.info.get('explaining') or duration_ms < slow_queries.threshold_ms:
+        return
+
+    route = current_route()
+    key, write_entry = slow_queries.record(statement, duration_ms, route)
+    if not write_entry:
+        return
+
+    logger.warning(json.dumps({
+        'timestamp': datetime.utcnow().isoformat(),
+        'fingerprint': key,
+        'duration_ms': round(duration_ms, 1),
+        'route': route,
+        'statement': statement,
+        'parameters': None if executemany else redact(parameters),
+        'executemany': executemany,
+        'plan': None if executemany else _explain(conn, statement, parameters)
+    }, default=str))
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    connection = context.connection
+    if connection is not None and connection.info.get('slow_query_started'):
+        connection.info['slow_query_started'].pop()
+
+
+def init_app(app):
+    """Read the slow-query settings from `app.config` (or the environment)"""
+    slow_queries.configure(
+        threshold_ms=float(app.config.get('SLOW_QUERY_THRESHOLD_MS',
+                                          os.environ.get('SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS))),
+        log_interval=float(app.config.get('SLOW_QUERY_LOG_INTERVAL',
+                                          os.environ.get('SLOW_QUERY_LOG_INTERVAL', DEFAULT_LOG_INTERVAL))),
+        log_path=app.config.get('SLOW_QUERY_LOG',
+                                os.environ.get('SLOW_QUERY_LOG',
+                                               os.path.join(os.path.dirname(__file__), 'logs', 'slow_queries.log')))
+    )
@@ -1,7 +1,127 @@
 // API Utility Module
+
+// Client-side cache for GET responses, keyed by user and URL. While a
+// response is younger than `ttl` it is reused as is; up to `maxAge` it is
+// still returned immediately but refetched in the background
+// (stale-while-revalidate). The first matching prefix wins; endpoints
+// without a policy, or with a null one, are never cached. Times are in
+// milliseconds.
+const API_CACHE_POLICIES = [
+    // Availability feeds booking decisions, so it is always fetched live
+    { prefix: '/vehicles/available', ttl: null },
+    { prefix: '/drivers/available', ttl: null },
+    { prefix: '/analytics/dashboard/bundle', ttl: 15000, maxAge: 600000 },
+    { prefix: '/analytics', ttl: 60000, maxAge: 600000 },
+    { prefix: '/maintenance/predictions', ttl: 300000, maxAge: 3600000 },
+    { prefix: '/maintenance', ttl: 30000, maxAge: 600000 },
+    { prefix: '/vehicles', ttl: 30000, maxAge: 600000 },
+    { prefix: '/drivers', ttl: 30000, maxAge: 600000 },
+    { prefix: '/trips', ttl: 15000, maxAge: 300000 },
+    { prefix: '/users', ttl: 30000, maxAge: 600000 },
+    { prefix: '/fuel-prices', ttl: 300000, maxAge: 3600000 }
+];
+
+// Cached prefixes dropped after a successful POST, PUT or DELETE under a
+// prefix; mutations anywhere else (except /auth) clear the whole cache
+const API_CACHE_INVALIDATION = {
+    '/vehicles': ['/vehicles', '/trips', '/maintenance', '/analytics'],
+    '/drivers': ['/drivers', '/trips', '/users', '/analytics'],
+    '/trips': ['/trips', '/vehicles', '/drivers', '/analytics'],
+    '/maintenance': ['/maintenance', '/vehicles', '/analytics'],
+    '/fuel-prices': ['/fuel-prices', '/analytics'],
+    '/users': ['/users', '/drivers'],
+    '/auth': []
+};
+
+// Longest Retry-After (seconds) a GET waits out before its single retry
+const API_MAX_RETRY_AFTER = 5;
+
+// Cached responses kept across page reloads in IndexedDB. Every method
+// resolves (to undefined) instead of failing, so the cache simply stays
+// in memory where IndexedDB is unavailable, e.g. in some private windows.
+class ResponseStore {
+    constructor(name = 'crislina-api-cache') {
+        this.name = name;
+        this.db = null;
+    }
+
+    open() {
+        if (!this.db) {
+            this.db = new Promise((resolve) => {
+                if (typeof indexedDB === 'undefined') {
+                    resolve(null);
+                    return;
+                }
+                const request = indexedDB.open(this.name, 1);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore('responses', { keyPath: 'key' });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => resolve(null);
+            });
+        }
+        return this.db;
+    }
+
+    async run(mode, action) {
+        const db = await this.open();
+        if (!db) return undefined;
+        return new Promise((resolve) => {
+            let request;
+            try {
+                const transaction = db.transaction('responses', mode);
+                request = action(transaction.objectStore('responses'));
+                transaction.oncomplete = () => resolve(request ? request.result : undefined);
+                transaction.onerror = transaction.onabort = () => resolve(undefined);
+            } catch (error) {
+                resolve(undefined);
+            }
+        });
+    }
+
+    get(key) {
+        return this.run('readonly', store => store.get(key));
+    }
+
+    put(entry) {
+        return this.run('readwrite', store => store.put(entry));
+    }
+
+    // Delete entries matching `predicate(entry)`
+    deleteWhere(predicate) {
+        return this.run('readwrite', (store) => {
+            const cursorRequest = store.openCursor();
+            cursorRequest.onsuccess = () => {
+                const cursor = cursorRequest.result;
+                if (!cursor) return;
+                if (predicate(cursor.value)) cursor.delete();
+                cursor.continue();
+            };
+            return null;
+        });
+    }
+
+    clear() {
+        return this.run('readwrite', store => store.clear());
+    }
+}
+
+function cloneResponse(response) {
+    return typeof structuredClone === 'function' ? structuredClone(response) : JSON.parse(JSON.stringify(response));
+}
+
 class ApiClient {
     constructor() {
         this.baseUrl = '/api';
+        this.cache = new Map();
+        this.inFlight = new Map();
+        // Bumped by every invalidation, so responses requested before it are not stored
+        this.cacheGeneration = 0;
+        this.store = new ResponseStore();
+
+        // Drop entries too old to be shown even as stale data
+        const oldest = Math.max(...API_CACHE_POLICIES.map(policy => policy.maxAge));
+        this.store.deleteWhere(entry => Date.now() - entry.storedAt > oldest);
     }
 
     async request(endpoint, options = {}) {
@@ -31,6 +151,14 @@ class ApiClient {
             const response = await fetch(url, finalOptions);
             const data = await response.json();
 
+            // Rate limited or shed under load: a GET waits as told and retries once
+            const method = (finalOptions.method || 'GET').toUpperCase();
+            if ((response.status === 429 || response.status === 503) && method === 'GET' && !options.retried) {
+                const retryAfter = Math.min(parseInt(response.headers.get('Retry-After'), 10) || 1, API_MAX_RETRY_AFTER);
+                await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+                return this.request(endpoint, { ...options, retried: true });
+            }
+
             // Handle authentication errors
             if (response.status === 401) {
                 auth.logout();
@@ -52,14 +180,103 @@ class ApiClient {
         }
     }
 
-    // GET request
-    async get(endpoint) {
-        return this.request(endpoint, { method: 'GET' });
+    cachePolicy(endpoint) {
+        const policy = API_CACHE_POLICIES.find(policy => endpoint.startsWith(policy.prefix));
+        return policy && policy.ttl !== null ? policy : null;
+    }
+
+    cacheKey(endpoint) {
+        const user = auth.getUser();
+        return `${user ? user.id : 'anonymous'}:${endpoint}`;
+    }
+
+    async cachedEntry(key) {
+        if (this.cache.has(key)) return this.cache.get(key);
+        const stored = await this.store.get(key);
+        if (stored) this.cache.set(key, stored);
+        return stored || null;
+    }
+
+    // Fetch a GET endpoint, sharing one request between concurrent callers
+    fetchAndStore(key, endpoint) {
+        if (this.inFlight.has(key)) return this.inFlight.get(key);
+
+        const generation = this.cacheGeneration;
+        const promise = this.request(endpoint, { method: 'GET' }).then((response) => {
+            if (response && response.success && generation === this.cacheGeneration) {
+                const entry = { key, endpoint, storedAt: Date.now(), response: cloneResponse(response) };
+                this.cache.set(key, entry);
+                this.store.put(entry);
+            }
+            return response;
+        }).finally(() => {
+            this.inFlight.delete(key);
+        });
+        this.inFlight.set(key, promise);
+        return promise;
+    }
+
+    async revalidate(key, endpoint, entry, onUpdate) {
+        const response = await this.fetchAndStore(key, endpoint);
+        if (!onUpdate || !response || !response.success) return;
+        if (JSON.stringify(response.data) !== JSON.stringify(entry.response.data)) {
+            onUpdate(cloneResponse(response));
+        }
+    }
+
+    // Drop cached responses under the given prefixes (all of them if omitted)
+    invalidate(prefixes = null) {
+        this.cacheGeneration += 1;
+        const matches = endpoint => !prefixes || prefixes.some(prefix => endpoint.startsWith(prefix));
+        for (const [key, entry] of this.cache) {
+            if (matches(entry.endpoint)) this.cache.delete(key);
+        }
+        return this.store.deleteWhere(entry => matches(entry.endpoint));
+    }
+
+    clearCache() {
+        this.cacheGeneration += 1;
+        this.cache.clear();
+        return this.store.clear();
+    }
+
+    // GET request; `onUpdate(response)` is called if a stale cached response
+    // was returned and the background refresh brought different data
+    async get(endpoint, onUpdate = null) {
+        const policy = this.cachePolicy(endpoint);
+        if (!policy || !auth.isAuthenticated()) {
+            return this.request(endpoint, { method: 'GET' });
+        }
+
+        const key = this.cacheKey(endpoint);
+        const entry = await this.cachedEntry(key);
+        const age = entry ? Date.now() - entry.storedAt : Infinity;
+        if (age <= policy.ttl) {
+            return cloneResponse(entry.response);
+        }
+        if (age <= policy.maxAge) {
+            this.revalidate(key, endpoint, entry, onUpdate);
+            return cloneResponse(entry.response);
+        }
+        return this.fetchAndStore(key, endpoint);
+    }
+
+    // POST, PUT and DELETE invalidate the cached responses they may affect
+    async mutate(endpoint, options) {
+        const response = await this.request(endpoint, options);
+        if (response && response.success) {
+            const root = '/' + endpoint.split(/[/?]/)[1];
+            const prefixes = API_CACHE_INVALIDATION[root];
+            if (!prefixes || prefixes.length > 0) {
+                await this.invalidate(prefixes || null);
+            }
+        }
+        return response;
     }
 
     // POST request
     async post(endpoint, data) {
-        return this.request(endpoint, {
+        return this.mutate(endpoint, {
             method: 'POST',
             body: JSON.stringify(data)
         });
@@ -67,7 +284,7 @@ class ApiClient {
 
     // PUT request
     async put(endpoint, data) {
-        return this.request(endpoint, {
+        return this.mutate(endpoint, {
             method: 'PUT',
             body: JSON.stringify(data)
         });
@@ -75,13 +292,13 @@ class ApiClient {
 
     // DELETE request
     async delete(endpoint) {
-        return this.request(endpoint, { method: 'DELETE' });
+        return this.mutate(endpoint, { method: 'DELETE' });
     }
 
     // Vehicles API
-    async getVehicles(filters = {}) {
+    async getVehicles(filters = {}, onUpdate = null) {
         const params = new URLSearchParams(filters);
-        return this.get(`/vehicles?${params}`);
+        return this.get(`/vehicles?${params}`, onUpdate);
     }
 
     async getVehicle(id) {
@@ -104,10 +321,16 @@ class ApiClient {
         return this.get(`/vehicles/${id}/stats`);
     }
 
+    // Active vehicles with no open trip in [from, to) (ISO date or datetime)
+    async getAvailableVehicles(from, to, filters = {}) {
+        const params = new URLSearchParams({ ...filters, from: from, to: to });
+        return this.get(`/vehicles/available?${params}`);
+    }
+
     // Drivers API
-    async getDrivers(filters = {}) {
+    async getDrivers(filters = {}, onUpdate = null) {
         const params = new URLSearchParams(filters);
-        return this.get(`/drivers?${params}`);
+        return this.get(`/drivers?${params}`, onUpdate);
     }
 
     async getDriver(id) {
@@ -126,20 +349,36 @@ class ApiClient {
         return this.delete(`/drivers/${id}`);
     }
 
+    async getAvailableDrivers(from, to) {
+        const params = new URLSearchParams({ from: from, to: to });
+        return this.get(`/drivers/available?${params}`);
+    }
+
     async getDriverStats(id) {
         return this.get(`/drivers/${id}/stats`);
     }
 
+    // Hours driven in the last 24 hours and 7 days, with the limits
+    async getDriverHours(id) {
+        return this.get(`/drivers/${id}/hours`);
+    }
+
     // Trips API
-    async getTrips(filters = {}) {
+    async getTrips(filters = {}, onUpdate = null) {
         const params = new URLSearchParams(filters);
-        return this.get(`/trips?${params}`);
+        return this.get(`/trips?${params}`, onUpdate);
     }
 
     async getTrip(id) {
         return this.get(`/trips/${id}`);
     }
 
+    // Median distance and fuel of completed trips between two places
+    async getTripEstimate(source, destination) {
+        const params = new URLSearchParams({ source: source, destination: destination });
+        return this.get(`/trips/estimate?${params}`);
+    }
+
     async createTrip(tripData) {
         return this.post('/trips', tripData);
     }
@@ -161,9 +400,9 @@ class ApiClient {
     }
 
     // Maintenance API
-    async getMaintenance(filters = {}) {
+    async getMaintenance(filters = {}, onUpdate = null) {
         const params = new URLSearchParams(filters);
-        return this.get(`/maintenance?${params}`);
+        return this.get(`/maintenance?${params}`, onUpdate);
     }
 
     async getMaintenanceRecord(id) {
@@ -182,16 +421,57 @@ class ApiClient {
         return this.delete(`/maintenance/${id}`);
     }
 
+    // Fuel price history
+    async getFuelPrices(fuelType = null) {
+        const params = new URLSearchParams(fuelType ? { fuel_type: fuelType } : {});
+        return this.get(`/fuel-prices?${params}`);
+    }
+
+    async createFuelPrice(priceData) {
+        return this.post('/fuel-prices', priceData);
+    }
+
+    async updateFuelPrice(id, priceData) {
+        return this.put(`/fuel-prices/${id}`, priceData);
+    }
+
+    async deleteFuelPrice(id) {
+        return this.delete(`/fuel-prices/${id}`);
+    }
+
     async getMaintenanceStats(filters = {}) {
         const params = new URLSearchParams(filters);
         return this.get(`/maintenance/stats?${params}`);
     }
 
+    async getMaintenancePredictions(filters = {}) {
+        const params = new URLSearchParams(filters);
+        return this.get(`/maintenance/predictions?${params}`);
+    }
+
+    async runMaintenancePredictions() {
+        return this.post('/maintenance/predictions/run', {});
+    }
+
     // Analytics API
     async getDashboardStats() {
         return this.get('/analytics/dashboard');
     }
 
+    async getFuelAnomalies(filters = {}) {
+        const params = new URLSearchParams(filters);
+        return this.get(`/analytics/fuel-anomalies?${params}`);
+    }
+
+    async getRollingFuelEfficiency() {
+        return this.get('/analytics/fuel-efficiency/rolling');
+    }
+
+    async getDashboardBundle(options = {}, onUpdate = null) {
+        const params = new URLSearchParams(options);
+        return this.get(`/analytics/dashboard/bundle?${params}`, onUpdate);
+    }
+
     async getFuelConsumptionTrends(days = 30) {
         return this.get(`/analytics/fuel-consumption?days=${days}`);
     }
@@ -216,9 +496,49 @@ class ApiClient {
         return this.get('/analytics/fuel-efficiency');
     }
 
+    async getTopRoutes(options = {}) {
+        const params = new URLSearchParams(options);
+        return this.get(`/analytics/routes?${params}`);
+    }
+
+    async getDriverScorecards(options = {}) {
+        const params = new URLSearchParams(options);
+        return this.get(`/analytics/driver-scorecards?${params}`);
+    }
+
+    async runDriverScorecards() {
+        return this.post('/analytics/driver-scorecards/run', {});
+    }
+
+    async getTcoReport(options = {}) {
+        const params = new URLSearchParams(options);
+        return this.get(`/analytics/tco?${params}`);
+    }
+
+    // options: days, driver_id
+    async getHosViolations(options = {}) {
+        const params = new URLSearchParams(options);
+        return this.get(`/analytics/hos-violations?${params}`);
+    }
+
+    // metric: duration_hours or km_per_liter
+    async getDistribution(metric, options = {}) {
+        const params = new URLSearchParams(options);
+        return this.get(`/analytics/distributions/${metric}?${params}`);
+    }
+
+    // Sync API: changes since a cursor returned by the previous call
+    async getChanges(since = null, perPage = null) {
+        const params = new URLSearchParams();
+        if (since) params.set('since', since);
+        if (perPage) params.set('per_page', perPage);
+        return this.get(`/sync?${params}`);
+    }
+
     // Users API (Admin only)
-    async getUsers() {
-        return this.get('/users');
+    async getUsers(filters = {}, onUpdate = null) {
+        const params = new URLSearchParams(filters);
+        return this.get(`/users?${params}`, onUpdate);
     }
 
     async getUser(id) {
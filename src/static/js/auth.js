@@ -40,6 +40,12 @@ class AuthManager {
         localStorage.removeItem('token');
         localStorage.removeItem('user');
         
+        // Cached responses belong to the user who is leaving
+        api.clearCache();
+        
+        // Close the live dashboard feed opened with the old token
+        disconnectDashboardEvents();
+        
         // Redirect to login page
         showLoginPage();
     }
@@ -1,6 +1,24 @@
 // Dashboard Module
 let dashboardCharts = {};
 
+// Latest widget data, patched in place by live events
+let dashboardState = {
+    stats: null,
+    recentTrips: [],
+    recentMaintenance: []
+};
+let dashboardEventSource = null;
+let pendingWidgetRefresh = new Set();
+let widgetRefreshTimer = null;
+let dashboardLoadId = 0;
+
+// Cached API responses to drop when an event arrives for an entity
+const EVENT_CACHE_PREFIXES = {
+    trip: API_CACHE_INVALIDATION['/trips'],
+    maintenance: API_CACHE_INVALIDATION['/maintenance'],
+    vehicle: API_CACHE_INVALIDATION['/vehicles']
+};
+
 async function loadDashboard() {
     const dashboardHtml = `
         <div class="container-fluid">
@@ -115,62 +133,29 @@ async function loadDashboard() {
 
     loadPageContent(dashboardHtml);
     await loadDashboardData();
+    connectDashboardEvents();
 }
 
 async function loadDashboardData() {
     showLoading(true);
+    const loadId = ++dashboardLoadId;
 
     try {
-        // Load all dashboard data in parallel
-        const [
-            statsResponse,
-            fuelResponse,
-            tripsVehicleResponse,
-            maintenanceResponse,
-            utilizationResponse,
-            recentTripsResponse,
-            recentMaintenanceResponse
-        ] = await Promise.all([
-            api.getDashboardStats(),
-            api.getFuelConsumptionTrends(30),
-            api.getTripsPerVehicle(),
-            api.getMaintenanceCostTrends(6),
-            api.getVehicleUtilization(30),
-            api.getTrips({ limit: 5 }),
-            api.getMaintenance({ limit: 5 })
-        ]);
-
-        // Load stats cards
-        if (statsResponse.success) {
-            loadStatsCards(statsResponse.data.data);
-        }
-
-        // Load charts
-        if (fuelResponse.success) {
-            loadFuelConsumptionChart(fuelResponse.data.data);
-        }
-
-        if (tripsVehicleResponse.success) {
-            loadTripsPerVehicleChart(tripsVehicleResponse.data.data);
-        }
-
-        if (maintenanceResponse.success) {
-            loadMaintenanceCostChart(maintenanceResponse.data.data);
-        }
-
-        if (utilizationResponse.success) {
-            loadVehicleUtilizationChart(utilizationResponse.data.data);
-        }
-
-        // Load recent activities
-        if (recentTripsResponse.success) {
-            loadRecentTrips(recentTripsResponse.data.data);
-        }
+        // All widgets come back in a single request, computed concurrently
+        // server-side; a cached bundle is drawn at once and redrawn if the
+        // background refresh brings different numbers
+        const response = await api.getDashboardBundle({ days: 30, months: 6, limit: 5 }, (fresh) => {
+            if (loadId === dashboardLoadId && document.getElementById('statsCards')) {
+                renderDashboardBundle(fresh.data);
+            }
+        });
 
-        if (recentMaintenanceResponse.success) {
-            loadRecentMaintenance(recentMaintenanceResponse.data.data);
+        if (!response || !response.success) {
+            showToast('Error loading dashboard data', 'error');
+            return;
         }
 
+        renderDashboardBundle(response.data);
     } catch (error) {
         console.error('Error loading dashboard data:', error);
         showToast('Error loading dashboard data', 'error');
@@ -179,6 +164,52 @@ async function loadDashboardData() {
     }
 }
 
+function renderDashboardBundle(bundle) {
+    const widgets = bundle.data;
+    const errors = bundle.errors || {};
+
+    // Load stats cards
+    if (widgets.stats) {
+        dashboardState.stats = widgets.stats;
+        loadStatsCards(widgets.stats);
+    }
+
+    // Load charts
+    if (widgets.fuel_consumption) {
+        loadFuelConsumptionChart(widgets.fuel_consumption);
+    }
+
+    if (widgets.trips_per_vehicle) {
+        loadTripsPerVehicleChart(widgets.trips_per_vehicle);
+    }
+
+    if (widgets.maintenance_costs) {
+        loadMaintenanceCostChart(widgets.maintenance_costs);
+    }
+
+    if (widgets.vehicle_utilization) {
+        loadVehicleUtilizationChart(widgets.vehicle_utilization);
+    }
+
+    // Load recent activities
+    if (widgets.recent_trips) {
+        dashboardState.recentTrips = widgets.recent_trips;
+        loadRecentTrips(widgets.recent_trips);
+    }
+
+    if (widgets.recent_maintenance) {
+        dashboardState.recentMaintenance = widgets.recent_maintenance;
+        loadRecentMaintenance(widgets.recent_maintenance);
+    }
+
+    // Partial results: report the widgets that failed or timed out
+    const failed = Object.keys(errors);
+    if (failed.length > 0) {
+        console.warn('Dashboard widgets unavailable:', errors);
+        showToast(`Some dashboard data is unavailable: ${failed.join(', ')}`, 'warning');
+    }
+}
+
 function loadStatsCards(stats) {
     const statsContainer = document.getElementById('statsCards');
     if (!statsContainer) return;
@@ -480,7 +511,166 @@ function loadRecentMaintenance(maintenance) {
 
 // Refresh dashboard data
 async function refreshDashboard() {
+    await api.invalidate(['/analytics/dashboard']);
     await loadDashboardData();
     showToast('Dashboard refreshed', 'success');
 }
 
+// Live updates via Server-Sent Events
+function connectDashboardEvents() {
+    disconnectDashboardEvents();
+    if (!auth.isAuthenticated() || typeof EventSource === 'undefined') return;
+
+    const params = new URLSearchParams({ token: auth.getToken() });
+    dashboardEventSource = new EventSource(`/api/events/stream?${params}`);
+
+    dashboardEventSource.onmessage = (e) => {
+        // Stop listening once the user has navigated away from the dashboard
+        if (!document.getElementById('statsCards')) {
+            disconnectDashboardEvents();
+            return;
+        }
+        try {
+            applyDashboardEvent(JSON.parse(e.data));
+        } catch (error) {
+            console.error('Error applying dashboard event:', error);
+        }
+    };
+
+    // The server could not replay everything we missed: reload in full
+    dashboardEventSource.addEventListener('reset', async () => {
+        await api.invalidate();
+        loadDashboardData();
+    });
+}
+
+function disconnectDashboardEvents() {
+    if (dashboardEventSource) {
+        dashboardEventSource.close();
+        dashboardEventSource = null;
+    }
+}
+
+function applyDashboardEvent(event) {
+    const [entity, action] = event.type.split('.');
+    if (EVENT_CACHE_PREFIXES[entity]) {
+        api.invalidate(EVENT_CACHE_PREFIXES[entity]);
+    }
+
+    if (entity === 'trip') {
+        applyTripEvent(action, event.data);
+        scheduleWidgetRefresh(['fuel_consumption', 'trips_per_vehicle', 'vehicle_utilization']);
+    } else if (entity === 'maintenance') {
+        applyMaintenanceEvent(action, event.data);
+        scheduleWidgetRefresh(['maintenance_costs']);
+    } else if (entity === 'vehicle') {
+        applyVehicleEvent(action, event.data);
+        if (action !== 'updated') {
+            scheduleWidgetRefresh(['trips_per_vehicle', 'vehicle_utilization']);
+        }
+    }
+}
+
+function applyTripEvent(action, data) {
+    const stats = dashboardState.stats;
+
+    if (action === 'deleted') {
+        dashboardState.recentTrips = dashboardState.recentTrips.filter(trip => trip.id !== data.id);
+        loadRecentTrips(dashboardState.recentTrips);
+        // The deleted trip's status is unknown here, so refetch the counts
+        scheduleWidgetRefresh(['stats', 'recent_trips']);
+        return;
+    }
+
+    const trip = data.trip;
+    if (stats) {
+        if (action === 'created') {
+            stats.trips.total += 1;
+            adjustCount(stats.trips, trip.status, 1);
+            const thirtyDaysAgo = new Date(Date.now() - 30 * 24 * 3600 * 1000);
+            if (new Date(trip.trip_date) >= thirtyDaysAgo) {
+                stats.trips.recent_30_days += 1;
+            }
+        } else if (data.previous_status && data.previous_status !== trip.status) {
+            adjustCount(stats.trips, data.previous_status, -1);
+            adjustCount(stats.trips, trip.status, 1);
+        }
+        loadStatsCards(stats);
+    }
+
+    const others = dashboardState.recentTrips.filter(existing => existing.id !== trip.id);
+    dashboardState.recentTrips = [trip, ...others]
+        .sort((a, b) => (b.trip_date || '').localeCompare(a.trip_date || '') || b.id - a.id)
+        .slice(0, 5);
+    loadRecentTrips(dashboardState.recentTrips);
+}
+
+function applyMaintenanceEvent(action, data) {
+    if (action === 'deleted') {
+        dashboardState.recentMaintenance = dashboardState.recentMaintenance.filter(record => record.id !== data.id);
+    } else {
+        const record = data.maintenance;
+        const others = dashboardState.recentMaintenance.filter(existing => existing.id !== record.id);
+        dashboardState.recentMaintenance = [record, ...others]
+            .sort((a, b) => (b.date || '').localeCompare(a.date || '') || b.id - a.id)
+            .slice(0, 5);
+    }
+    loadRecentMaintenance(dashboardState.recentMaintenance);
+
+    // Cost totals depend on the record's previous cost, so refetch them
+    scheduleWidgetRefresh(['stats']);
+}
+
+function applyVehicleEvent(action, data) {
+    const stats = dashboardState.stats;
+    if (!stats) return;
+
+    if (action === 'created') {
+        stats.vehicles.total += 1;
+        adjustCount(stats.vehicles, data.vehicle.status, 1);
+    } else if (action === 'updated') {
+        if (data.previous_status && data.previous_status !== data.vehicle.status) {
+            adjustCount(stats.vehicles, data.previous_status, -1);
+            adjustCount(stats.vehicles, data.vehicle.status, 1);
+        }
+    } else if (action === 'deleted') {
+        scheduleWidgetRefresh(['stats']);
+        return;
+    }
+    loadStatsCards(stats);
+}
+
+function adjustCount(counts, key, delta) {
+    if (key in counts) {
+        counts[key] = Math.max(0, counts[key] + delta);
+    }
+}
+
+// Refetch only the named widgets, batching bursts of events together
+function scheduleWidgetRefresh(names) {
+    names.forEach(name => pendingWidgetRefresh.add(name));
+    if (widgetRefreshTimer) return;
+
+    widgetRefreshTimer = setTimeout(async () => {
+        const widgets = [...pendingWidgetRefresh];
+        pendingWidgetRefresh.clear();
+        widgetRefreshTimer = null;
+
+        const response = await api.getDashboardBundle({ days: 30, months: 6, limit: 5, widgets: widgets.join(',') });
+        if (!response || !response.success || !document.getElementById('statsCards')) return;
+
+        const data = response.data.data;
+        if (data.stats) {
+            dashboardState.stats = data.stats;
+            loadStatsCards(data.stats);
+        }
+        if (data.fuel_consumption) loadFuelConsumptionChart(data.fuel_consumption);
+        if (data.trips_per_vehicle) loadTripsPerVehicleChart(data.trips_per_vehicle);
+        if (data.maintenance_costs) loadMaintenanceCostChart(data.maintenance_costs);
+        if (data.vehicle_utilization) loadVehicleUtilizationChart(data.vehicle_utilization);
+        if (data.recent_trips) {
+            dashboardState.recentTrips = data.recent_trips;
+            loadRecentTrips(data.recent_trips);
+        }
+    }, 2000);
+}
@@ -1,5 +1,7 @@
 // Drivers Module
 let driversData = [];
+let driversLoadId = 0;
+const DRIVERS_PER_PAGE = 25;
 
 async function loadDrivers() {
     const driversHtml = `
@@ -18,6 +20,18 @@ async function loadDrivers() {
                 </div>
             </div>
 
+            <!-- Search -->
+            <div class="row mb-4">
+                <div class="col-12">
+                    <div class="card">
+                        <div class="card-body">
+                            <label for="driverSearch" class="form-label">Search</label>
+                            <input type="text" class="form-control" id="driverSearch" placeholder="Search by name or licence number...">
+                        </div>
+                    </div>
+                </div>
+            </div>
+
             <!-- Drivers Table -->
             <div class="row">
                 <div class="col-12">
@@ -26,6 +40,7 @@ async function loadDrivers() {
                             <div id="driversTable">
                                 <!-- Table will be loaded here -->
                             </div>
+                            <div id="driversPagination"></div>
                         </div>
                     </div>
                 </div>
@@ -34,17 +49,32 @@ async function loadDrivers() {
     `;
 
     loadPageContent(driversHtml);
+    setupSearch('driverSearch', () => loadDriversData(1));
     await loadDriversData();
 }
 
-async function loadDriversData() {
+// Search and pagination happen server-side
+async function loadDriversData(page = 1) {
     showLoading(true);
     
     try {
-        const response = await api.getDrivers();
-        if (response.success) {
-            driversData = response.data.data;
+        const filters = { page: page, per_page: DRIVERS_PER_PAGE };
+        const search = document.getElementById('driverSearch');
+        if (search && search.value.trim()) filters.q = search.value.trim();
+
+        // Cached results render at once; a changed background refresh re-renders
+        const loadId = ++driversLoadId;
+        const render = (result) => {
+            if (loadId !== driversLoadId) return;
+            driversData = result.data.data;
             renderDriversTable(driversData);
+            const pagination = result.data.pagination;
+            renderPagination('driversPagination', pagination.page, pagination.pages, 'loadDriversData');
+        };
+
+        const response = await api.getDrivers(filters, render);
+        if (response.success) {
+            render(response);
         } else {
             showToast('Error loading drivers', 'error');
         }
@@ -1,5 +1,6 @@
 // Maintenance Module
 let maintenanceData = [];
+let maintenanceLoadId = 0;
 
 async function loadMaintenance() {
     const maintenanceHtml = `
@@ -42,7 +43,7 @@ async function loadMaintenance() {
                                 </div>
                                 <div class="col-md-4">
                                     <label for="maintenanceSearch" class="form-label">Search</label>
-                                    <input type="text" class="form-control" id="maintenanceSearch" placeholder="Search by vehicle or description..." onkeyup="searchMaintenance()">
+                                    <input type="text" class="form-control" id="maintenanceSearch" placeholder="Search by description or service provider...">
                                 </div>
                             </div>
                         </div>
@@ -118,18 +119,26 @@ async function loadMaintenance() {
     `;
 
     loadPageContent(maintenanceHtml);
+    setupSearch('maintenanceSearch', searchMaintenance);
     await loadMaintenanceData();
     setupMaintenanceForm();
 }
 
-async function loadMaintenanceData() {
+async function loadMaintenanceData(filters = {}) {
     showLoading(true);
     
     try {
-        const response = await api.getMaintenance();
-        if (response.success) {
-            maintenanceData = response.data.data;
+        // Cached results render at once; a changed background refresh re-renders
+        const loadId = ++maintenanceLoadId;
+        const render = (result) => {
+            if (loadId !== maintenanceLoadId) return;
+            maintenanceData = result.data.data;
             renderMaintenanceTable(maintenanceData);
+        };
+
+        const response = await api.getMaintenance(filters, render);
+        if (response.success) {
+            render(response);
         } else {
             showToast('Error loading maintenance records', 'error');
         }
@@ -293,18 +302,9 @@ function filterMaintenance() {
     renderMaintenanceTable(filtered);
 }
 
-// Search Maintenance
-function searchMaintenance() {
-    const term = document.getElementById('maintenanceSearch').value.toLowerCase();
-    if (!term) {
-        renderMaintenanceTable(maintenanceData);
-        return;
-    }
-
-    const filtered = maintenanceData.filter(m =>
-        (m.vehicle && m.vehicle.reg_no.toLowerCase().includes(term)) ||
-        (m.description && m.description.toLowerCase().includes(term))
-    );
-
-    renderMaintenanceTable(filtered);
-}
\ No newline at end of file
+// Search Maintenance server-side (full-text, accent-insensitive)
+async function searchMaintenance(term) {
+    term = term.trim();
+    await loadMaintenanceData(term ? { q: term, per_page: 100 } : {});
+    filterMaintenance();
+}
@@ -1,5 +1,6 @@
 // Trips Module
 let tripsData = [];
+let tripsLoadId = 0;
 
 async function loadTrips() {
     const tripsHtml = `
@@ -18,6 +19,18 @@ async function loadTrips() {
                 </div>
             </div>
 
+            <!-- Search -->
+            <div class="row mb-4">
+                <div class="col-12">
+                    <div class="card">
+                        <div class="card-body">
+                            <label for="tripSearch" class="form-label">Search</label>
+                            <input type="text" class="form-control" id="tripSearch" placeholder="Search by town or notes (e.g. Uíge)...">
+                        </div>
+                    </div>
+                </div>
+            </div>
+
             <!-- Trips Table -->
             <div class="row">
                 <div class="col-12">
@@ -34,17 +47,25 @@ async function loadTrips() {
     `;
 
     loadPageContent(tripsHtml);
+    setupSearch('tripSearch', searchTrips);
     await loadTripsData();
 }
 
-async function loadTripsData() {
+async function loadTripsData(filters = {}) {
     showLoading(true);
     
     try {
-        const response = await api.getTrips();
-        if (response.success) {
-            tripsData = response.data.data;
+        // Cached results render at once; a changed background refresh re-renders
+        const loadId = ++tripsLoadId;
+        const render = (result) => {
+            if (loadId !== tripsLoadId) return;
+            tripsData = result.data.data;
             renderTripsTable(tripsData);
+        };
+
+        const response = await api.getTrips(filters, render);
+        if (response.success) {
+            render(response);
         } else {
             showToast('Error loading trips', 'error');
         }
@@ -79,6 +100,12 @@ function renderTripsTable(trips) {
     renderTable('tripsTable', trips, columns, actions);
 }
 
+// Search trips server-side (full-text, accent-insensitive)
+async function searchTrips(term) {
+    term = term.trim();
+    await loadTripsData(term ? { q: term, per_page: 100 } : {});
+}
+
 function showAddTripModal() {
     showToast('Trip management coming soon!', 'info');
 }
@@ -1,5 +1,7 @@
 // Users Module (Admin only)
 let usersData = [];
+let usersLoadId = 0;
+const USERS_PER_PAGE = 25;
 
 async function loadUsers() {
     if (!auth.isAdmin()) {
@@ -25,6 +27,18 @@ async function loadUsers() {
                 </div>
             </div>
 
+            <!-- Search -->
+            <div class="row mb-4">
+                <div class="col-12">
+                    <div class="card">
+                        <div class="card-body">
+                            <label for="userSearch" class="form-label">Search</label>
+                            <input type="text" class="form-control" id="userSearch" placeholder="Search by username or email...">
+                        </div>
+                    </div>
+                </div>
+            </div>
+
             <!-- Users Table -->
             <div class="row">
                 <div class="col-12">
@@ -33,6 +47,7 @@ async function loadUsers() {
                             <div id="usersTable">
                                 <!-- Table will be loaded here -->
                             </div>
+                            <div id="usersPagination"></div>
                         </div>
                     </div>
                 </div>
@@ -41,17 +56,32 @@ async function loadUsers() {
     `;
 
     loadPageContent(usersHtml);
+    setupSearch('userSearch', () => loadUsersData(1));
     await loadUsersData();
 }
 
-async function loadUsersData() {
+// Search and pagination happen server-side
+async function loadUsersData(page = 1) {
     showLoading(true);
     
     try {
-        const response = await api.getUsers();
-        if (response.success) {
-            usersData = response.data.data;
+        const filters = { page: page, per_page: USERS_PER_PAGE };
+        const search = document.getElementById('userSearch');
+        if (search && search.value.trim()) filters.q = search.value.trim();
+
+        // Cached results render at once; a changed background refresh re-renders
+        const loadId = ++usersLoadId;
+        const render = (result) => {
+            if (loadId !== usersLoadId) return;
+            usersData = result.data.data;
             renderUsersTable(usersData);
+            const pagination = result.data.pagination;
+            renderPagination('usersPagination', pagination.page, pagination.pages, 'loadUsersData');
+        };
+
+        const response = await api.getUsers(filters, render);
+        if (response.success) {
+            render(response);
         } else {
             showToast('Error loading users', 'error');
         }
@@ -1,5 +1,7 @@
 // Vehicles Module
 let vehiclesData = [];
+let vehiclesLoadId = 0;
+const VEHICLES_PER_PAGE = 25;
 
 async function loadVehicles() {
     const vehiclesHtml = `
@@ -44,7 +46,7 @@ async function loadVehicles() {
                                 </div>
                                 <div class="col-md-4">
                                     <label for="vehicleSearch" class="form-label">Search</label>
-                                    <input type="text" class="form-control" id="vehicleSearch" placeholder="Search vehicles..." onkeyup="searchVehicles()">
+                                    <input type="text" class="form-control" id="vehicleSearch" placeholder="Search by registration or model...">
                                 </div>
                             </div>
                         </div>
@@ -58,6 +60,7 @@ async function loadVehicles() {
                     <div class="card">
                         <div class="card-body">
                             <div id="vehiclesTable"></div>
+                            <div id="vehiclesPagination"></div>
                         </div>
                     </div>
                 </div>
@@ -112,6 +115,7 @@ async function loadVehicles() {
     `;
 
     loadPageContent(vehiclesHtml);
+    setupSearch('vehicleSearch', searchVehicles);
     await loadVehiclesData();
     setupVehicleForm();
 }
@@ -132,14 +136,37 @@ function hideModal(modalId) {
 // --- Rest of your code (loadVehiclesData, renderVehiclesTable, filterVehicles, searchVehicles, editVehicle, deleteVehicle, setupVehicleForm) remains the same ---
 
 
-async function loadVehiclesData() {
+// Current filters, search term and sort order from the page controls
+function getVehicleFilters(page) {
+    const filters = { page: page, per_page: VEHICLES_PER_PAGE, sort: 'reg_no' };
+    const status = document.getElementById('statusFilter');
+    const fuelType = document.getElementById('fuelTypeFilter');
+    const search = document.getElementById('vehicleSearch');
+
+    if (status && status.value) filters.status = status.value;
+    if (fuelType && fuelType.value) filters.fuel_type = fuelType.value;
+    if (search && search.value.trim()) filters.q = search.value.trim();
+    return filters;
+}
+
+// Filtering, search, sorting and pagination all happen server-side
+async function loadVehiclesData(page = 1) {
     showLoading(true);
     
     try {
-        const response = await api.getVehicles();
-        if (response.success) {
-            vehiclesData = response.data.data;
+        // Cached results render at once; a changed background refresh re-renders
+        const loadId = ++vehiclesLoadId;
+        const render = (result) => {
+            if (loadId !== vehiclesLoadId) return;
+            vehiclesData = result.data.data;
             renderVehiclesTable(vehiclesData);
+            const pagination = result.data.pagination;
+            renderPagination('vehiclesPagination', pagination.page, pagination.pages, 'loadVehiclesData');
+        };
+
+        const response = await api.getVehicles(getVehicleFilters(page), render);
+        if (response.success) {
+            render(response);
         } else {
             showToast('Error loading vehicles', 'error');
         }
@@ -173,36 +200,11 @@ function renderVehiclesTable(vehicles) {
 }
 
 function filterVehicles() {
-    const statusFilter = document.getElementById('statusFilter').value;
-    const fuelTypeFilter = document.getElementById('fuelTypeFilter').value;
-    
-    let filtered = vehiclesData;
-    
-    if (statusFilter) {
-        filtered = filtered.filter(v => v.status === statusFilter);
-    }
-    
-    if (fuelTypeFilter) {
-        filtered = filtered.filter(v => v.fuel_type === fuelTypeFilter);
-    }
-    
-    renderVehiclesTable(filtered);
+    loadVehiclesData(1);
 }
 
 function searchVehicles() {
-    const searchTerm = document.getElementById('vehicleSearch').value.toLowerCase();
-    
-    if (!searchTerm) {
-        renderVehiclesTable(vehiclesData);
-        return;
-    }
-    
-    const filtered = vehiclesData.filter(v => 
-        v.reg_no.toLowerCase().includes(searchTerm) ||
-        v.model.toLowerCase().includes(searchTerm)
-    );
-    
-    renderVehiclesTable(filtered);
+    loadVehiclesData(1);
 }
 
 function showAddVehicleModal() {
@@ -0,0 +1,237 @@
+"""Incremental (delta) sync of vehicles, drivers, trips and maintenance.
+
+Every change is ordered by `(updated_at, entity, id)`; deletions are kept
+as `SyncTombstone` rows ordered the same way by `deleted_at`. A sync cursor
+is the position of the last change a client has seen, so
+`GET /api/sync?since=<cursor>` only transfers what changed after it.
+
+Changes younger than `SETTLE_SECONDS` are held back until the next call:
+`updated_at` is set before a transaction commits, so a slow writer can
+commit a row stamped slightly before a cursor that was already handed out.
+Records moved to the archive (see src/archive.py) are unchanged and simply
+stop appearing; they are not reported as deleted.
+
+A page lists its upserts and deletions separately, so a deletion is left out
+when the same id was upserted later in the page (SQLite reuses the id of a
+deleted newest row); otherwise a client applying the deletions last would
+drop the new record.
+
+A cursor only expires once a deletion after it has been pruned: pruning
+keeps a single `reason='pruned'` marker whose `deleted_at` is the newest
+deletion forgotten so far, and a cursor before it gets a 410. A client that
+is caught up gets a cursor at least at the settle horizon, so its cursor
+keeps moving forward even when nothing changes.
+"""
+
+import base64
+import binascii
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, func, literal, union_all, and_, or_, true, false, insert, delete, inspect
+from sqlalchemy.orm import joinedload
+
+from src.models import db, Vehicle, Driver, Trip, Maintenance, SyncTombstone
+
+SETTLE_SECONDS = 2
+DEFAULT_TOMBSTONE_RETENTION_DAYS = 90
+DEFAULT_PER_PAGE = 500
+MAX_PER_PAGE = 1000
+
+# entity name -> model; the names also fix the order of changes sharing a timestamp
+ENTITIES = {
+    'driver': Driver,
+    'maintenance': Maintenance,
+    'trip': Trip,
+    'vehicle': Vehicle
+}
+TOMBSTONE = '~deleted'  # sorts after every entity name
+PRUNED = '~pruned'  # entity of the marker row left behind by prune_tombstones()
+
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', DEFAULT_TOMBSTONE_RETENTION_DAYS))
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def encode_cursor(position):
+    changed_at, entity, row_id = position
+    raw = f'{changed_at.isoformat()}|{entity}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return `(changed_at, entity, id)`; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        changed_at, entity, row_id = raw.split('|')
+        return datetime.fromisoformat(changed_at), entity, int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Invalid sync cursor') from e
+
+
+def _after(column, id_column, name, position):
+    """Rows of one stream that come after `position` in (timestamp, entity, id) order"""
+    if position is None:
+        return true()
+    changed_at, entity, row_id = position
+    if name > entity:
+        return column >= changed_at
+    if name < entity:
+        return column > changed_at
+    return or_(column > changed_at, and_(column == changed_at, id_column > row_id))
+
+
+def _visible(name, model, user, driver_id):
+    """Role filter for one entity: drivers only sync their trips and their own profile"""
+    if user.role in ('admin', 'manager'):
+        return true()
+    if name == 'trip':
+        return model.driver_id == driver_id
+    if name == 'driver':
+        return model.id == driver_id
+    return false()
+
+
+def _visible_tombstones(user, driver_id):
+    if user.role in ('admin', 'manager'):
+        return SyncTombstone.reason == 'deleted'
+    return or_(
+        and_(SyncTombstone.entity == 'trip', SyncTombstone.driver_id == driver_id),
+        and_(SyncTombstone.entity == 'driver', SyncTombstone.entity_id == driver_id,
+             SyncTombstone.reason == 'deleted')
+    )
+
+
+def changes_since(user, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """One page of changes visible to `user` after `cursor` (None: full snapshot)"""
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        pruned_through = db.session.execute(
+            select(SyncTombstone.deleted_at).where(SyncTombstone.entity == PRUNED)
+        ).scalar()
+        if pruned_through is not None and position[0] <= pruned_through:
+            raise CursorExpired('Deletions after this sync cursor were pruned; start a full sync')
+    horizon = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+
+    driver_id = None
+    if user.role not in ('admin', 'manager'):
+        driver = Driver.query.filter_by(user_id=user.id).first()
+        driver_id = driver.id if driver else -1
+
+    # Each stream is ordered and limited on its own, so only a few pages'
+    # worth of rows ever reach the merge; an index on the timestamp serves it
+    streams = []
+    for name, model in ENTITIES.items():
+        streams.append(select(
+            literal(name).label('entity'), model.id.label('id'), model.updated_at.label('changed_at')
+        ).where(
+            model.updated_at <= horizon,
+            _after(model.updated_at, model.id, name, position),
+            _visible(name, model, user, driver_id)
+        ).order_by(model.updated_at, model.id).limit(per_page + 1).subquery())
+    if position is not None:
+        streams.append(select(
+            literal(TOMBSTONE).label('entity'), SyncTombstone.id.label('id'),
+            SyncTombstone.deleted_at.label('changed_at')
+        ).where(
+            SyncTombstone.deleted_at <= horizon,
+            _after(SyncTombstone.deleted_at, SyncTombstone.id, TOMBSTONE, position),
+            _visible_tombstones(user, driver_id)
+        ).order_by(SyncTombstone.deleted_at, SyncTombstone.id).limit(per_page + 1).subquery())
+
+    merged = union_all(*(select(stream.c.entity, stream.c.id, stream.c.changed_at) for stream in streams)).subquery()
+    rows = db.session.execute(
+        select(merged.c.entity, merged.c.id, merged.c.changed_at)
+        .order_by(merged.c.changed_at, merged.c.entity, merged.c.id)
+        .limit(per_page + 1)
+    ).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    ids = {}
+    for entity, row_id, _ in rows:
+        ids.setdefault(entity, []).append(row_id)
+
+    data = {name: {'upserts': [], 'deleted': []} for name in ENTITIES}
+    loaders = {
+        'trip': (joinedload(Trip.vehicle), joinedload(Trip.driver)),
+        'maintenance': (joinedload(Maintenance.vehicle),)
+    }
+    for name, model in ENTITIES.items():
+        if name in ids:
+            records = model.query.options(*loaders.get(name, ())).filter(model.id.in_(ids[name])).all()
+            data[name]['upserts'] = [record.to_dict() for record in sorted(records, key=lambda r: (r.updated_at, r.id))]
+    if TOMBSTONE in ids:
+        upserted = {(entity, row_id): changed_at for entity, row_id, changed_at in rows if entity != TOMBSTONE}
+        for tombstone in SyncTombstone.query.filter(SyncTombstone.id.in_(ids[TOMBSTONE])).order_by(
+                SyncTombstone.deleted_at, SyncTombstone.id):
+            recreated_at = upserted.get((tombstone.entity, tombstone.entity_id))
+            if recreated_at is not None and recreated_at >= tombstone.deleted_at:
+                continue  # the id was reused after the deletion; the upsert supersedes it
+            data[tombstone.entity]['deleted'].append(tombstone.entity_id)
+
+    if rows:
+        entity, row_id, changed_at = rows[-1]
+        next_position = (changed_at, entity, row_id)
+    else:
+        next_position = position
+    if not has_more:
+        # Everything up to the horizon has been sent: start the next sync there
+        next_position = max(next_position or (horizon, '', 0), (horizon, '', 0))
+
+    return {
+        'data': data,
+        'count': len(rows),
+        'cursor': encode_cursor(next_position),
+        'has_more': has_more
+    }
+
+
+def prune_tombstones(retention_days=None):
+    """Forget deletions older than the retention period, remembering the newest one forgotten"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days or TOMBSTONE_RETENTION_DAYS)
+    expired = and_(SyncTombstone.deleted_at < cutoff, SyncTombstone.entity != PRUNED)
+    try:
+        newest = db.session.execute(select(func.max(SyncTombstone.deleted_at)).where(expired)).scalar()
+        if newest is None:
+            return 0
+        removed = db.session.execute(delete(SyncTombstone).where(expired)).rowcount
+        marker = SyncTombstone.query.filter_by(entity=PRUNED).first()
+        if marker is None:
+            db.session.add(SyncTombstone(entity=PRUNED, entity_id=0, reason='pruned', deleted_at=newest))
+        elif marker.deleted_at < newest:
+            marker.deleted_at = newest
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return removed
+
+
+def _record_tombstone(connection, entity, entity_id, driver_id=None, reason='deleted'):
+    connection.execute(insert(SyncTombstone.__table__).values(
+        entity=entity, entity_id=entity_id, driver_id=driver_id, reason=reason,
+        deleted_at=datetime.utcnow()
+    ))
+
+
+def _listen_for_deletes(name, model):
+    @event.listens_for(model, 'after_delete')
+    def _after_delete(mapper, connection, target):
+        _record_tombstone(connection, name, target.id, driver_id=getattr(target, 'driver_id', None))
+
+
+for _name, _model in ENTITIES.items():
+    _listen_for_deletes(_name, _model)
+
+
+@event.listens_for(Trip, 'after_update')
+def _trip_reassigned(mapper, connection, target):
+    # The previous driver's client must drop a trip that is no longer theirs
+    history = inspect(target).attrs.driver_id.history
+    for previous_driver_id in history.deleted or ():
+        if previous_driver_id is not None and previous_driver_id != target.driver_id:
+            _record_tombstone(connection, 'trip', target.id, driver_id=previous_driver_id, reason='reassigned')
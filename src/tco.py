@@ -0,0 +1,179 @@
+"""Total cost of ownership per vehicle and month: fuel plus maintenance.
+
+Fuel is priced with an as-of join: every completed trip pays the price of
+its vehicle's fuel type in effect on the trip's date, i.e. the `FuelPrice`
+with the latest `effective_date` on or before it. Price changes are loaded
+once and sorted by `(fuel type, effective date)`, so each batch of trips
+finds its prices with a single `np.searchsorted` over those keys instead of
+one query per trip. Trips are streamed once (archived ones included) and
+summed per vehicle and month with `np.bincount`; fuel used before a fuel
+type's first known price is reported as `unpriced_fuel` and not costed.
+
+Maintenance costs (anything not merely `scheduled`) are summed per vehicle
+and month in SQL. `cost_per_km` is the total cost over the distance driven.
+
+Reports are cached per process for each month range. A cached report is
+reused while the row counts and latest `updated_at` of trips, maintenance,
+vehicles and fuel prices are unchanged, which one indexed query checks.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, func
+
+from src.models import db, Vehicle, Trip, Maintenance, FuelPrice
+from src.archive import trip_source, maintenance_source
+from src.timeseries import bucket_expression
+
+READ_BATCH_SIZE = 50000
+# Month ranges kept per process
+CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _data_version():
+    """Changes whenever a row the report depends on is added, edited, deleted or archived"""
+    parts = []
+    for model in (Trip, Maintenance, Vehicle, FuelPrice):
+        parts.extend((select(func.count(model.id)).scalar_subquery(),
+                      select(func.max(model.updated_at)).scalar_subquery()))
+    return tuple(db.session.execute(select(*parts)).one())
+
+
+def _month_number(days):
+    """Months since January 1970 for an array of day ordinals"""
+    epoch = date(1970, 1, 1).toordinal()
+    return (days - epoch).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+class PriceTable:
+    """Fuel price changes sorted by (fuel type, effective date), for as-of lookups"""
+
+    def __init__(self, rows):
+        self.fuel_types = sorted({fuel_type for fuel_type, _, _ in rows})
+        codes = {fuel_type: code for code, fuel_type in enumerate(self.fuel_types)}
+        keys = np.array([self._key(codes[fuel_type], effective.toordinal()) for fuel_type, effective, _ in rows],
+                        dtype=np.int64)
+        prices = np.array([price for _, _, price in rows], dtype=np.float64)
+        order = np.argsort(keys, kind='stable')
+        self.codes = codes
+        self.keys = keys[order]
+        self.prices = prices[order]
+
+    @staticmethod
+    def _key(code, day):
+        # Day ordinals stay below 2**22, so the fuel type sorts first
+        return (np.int64(code) << 32) | np.int64(day)
+
+    def lookup(self, fuel_codes, days):
+        """Price in effect for each (fuel code, day ordinal); NaN before the first price"""
+        keys = self._key(fuel_codes, days)
+        positions = np.searchsorted(self.keys, keys, side='right') - 1
+        prices = np.full(keys.size, np.nan)
+        found = positions >= 0
+        # The latest change at or before the day must be for the same fuel type
+        found[found] = (self.keys[positions[found]] >> 32) == fuel_codes[found]
+        prices[found] = self.prices[positions[found]]
+        return prices
+
+
+def compute_tco(start, end):
+    """TCO rows for every vehicle and month between `start` and `end` (dates, inclusive)"""
+    first_month = int(_month_number(np.array([start.toordinal()]))[0])
+    months = int(_month_number(np.array([end.toordinal()]))[0]) - first_month + 1
+
+    vehicles = db.session.query(Vehicle.id, Vehicle.reg_no, Vehicle.model, Vehicle.fuel_type).order_by(Vehicle.id).all()
+    vehicle_ids = np.array([vehicle.id for vehicle in vehicles], dtype=np.int64)
+    prices = PriceTable(db.session.query(FuelPrice.fuel_type, FuelPrice.effective_date, FuelPrice.price_per_liter).all())
+    # Vehicles whose fuel type has no price at all get code -1 and stay unpriced
+    fuel_codes = np.array([prices.codes.get(vehicle.fuel_type, -1) for vehicle in vehicles], dtype=np.int64)
+
+    cells = vehicle_ids.size * months
+    totals = {name: np.zeros(cells) for name in ('trips', 'distance', 'fuel_used', 'fuel_cost', 'unpriced_fuel')}
+
+    # One pass over the completed trips in the range
+    trips = trip_source(start)
+    statement = select(trips.vehicle_id, trips.trip_date, trips.distance, trips.fuel_used).where(
+        trips.status == 'completed', trips.trip_date >= start, trips.trip_date <= end
+    )
+    result = db.session.execute(statement.execution_options(yield_per=READ_BATCH_SIZE))
+    for rows in result.partitions():
+        count = len(rows)
+        trip_vehicles = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        days = np.fromiter((row[1].toordinal() for row in rows), dtype=np.int64, count=count)
+        distance = np.fromiter((row[2] or 0.0 for row in rows), dtype=np.float64, count=count)
+        fuel = np.fromiter((row[3] or 0.0 for row in rows), dtype=np.float64, count=count)
+
+        positions = np.searchsorted(vehicle_ids, trip_vehicles)
+        # Archived trips may belong to vehicles deleted since
+        known = positions < vehicle_ids.size
+        known[known] = vehicle_ids[positions[known]] == trip_vehicles[known]
+        positions, days, distance, fuel = positions[known], days[known], distance[known], fuel[known]
+
+        cell = positions * months + (_month_number(days) - first_month)
+        price = prices.lookup(fuel_codes[positions], days)
+        priced = ~np.isnan(price)
+        totals['trips'] += np.bincount(cell, minlength=cells)
+        totals['distance'] += np.bincount(cell, weights=distance, minlength=cells)
+        totals['fuel_used'] += np.bincount(cell, weights=fuel, minlength=cells)
+        totals['fuel_cost'] += np.bincount(cell[priced], weights=fuel[priced] * price[priced], minlength=cells)
+        totals['unpriced_fuel'] += np.bincount(cell[~priced], weights=fuel[~priced], minlength=cells)
+
+    # Maintenance per vehicle and month, grouped in SQL
+    records = maintenance_source(start)
+    month = bucket_expression(records.date, 'month')
+    maintenance_cost = np.zeros(cells)
+    for vehicle_id, label, cost in db.session.query(records.vehicle_id, month, func.sum(records.cost)).filter(
+            records.status != 'scheduled', records.date >= start, records.date <= end
+    ).group_by(records.vehicle_id, month):
+        position = np.searchsorted(vehicle_ids, vehicle_id)
+        if position < vehicle_ids.size and vehicle_ids[position] == vehicle_id:
+            year, month_of_year = (int(part) for part in label.split('-'))
+            maintenance_cost[position * months + (year - 1970) * 12 + month_of_year - 1 - first_month] += cost or 0
+
+    labels = [str(np.datetime64(first_month + offset, 'M')) for offset in range(months)]
+    report = []
+    for index, vehicle in enumerate(vehicles):
+        for offset, label in enumerate(labels):
+            cell = index * months + offset
+            distance = float(totals['distance'][cell])
+            total_cost = float(totals['fuel_cost'][cell] + maintenance_cost[cell])
+            report.append({
+                'vehicle_id': vehicle.id,
+                'vehicle': f"{vehicle.reg_no} ({vehicle.model})",
+                'fuel_type': vehicle.fuel_type,
+                'month': label,
+                'trips': int(totals['trips'][cell]),
+                'distance': round(distance, 2),
+                'fuel_used': round(float(totals['fuel_used'][cell]), 2),
+                'fuel_cost': round(float(totals['fuel_cost'][cell]), 2),
+                'unpriced_fuel': round(float(totals['unpriced_fuel'][cell]), 2),
+                'maintenance_cost': round(float(maintenance_cost[cell]), 2),
+                'total_cost': round(total_cost, 2),
+                'cost_per_km': round(total_cost / distance, 4) if distance > 0 else None
+            })
+    return report
+
+
+def tco_report(start, end):
+    """`compute_tco()` for the range, served from the cache while the data is unchanged"""
+    key = (start, end)
+    version = _data_version()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    report = compute_tco(start, end)
+    with _cache_lock:
+        _cache[key] = (version, report)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return report
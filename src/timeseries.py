@@ -0,0 +1,170 @@
+"""SQL-side time bucketing shared by the trend endpoints.
+
+Rows are grouped per day, week (starting Monday) or calendar month inside the
+database, so only one row per bucket (and series) comes back to Python. Empty
+buckets are then filled in a single pass over the expected bucket keys.
+"""
+
+from datetime import date, timedelta
+from sqlalchemy import func, literal_column
+from src.models import db
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def _dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def bucket_expression(column, granularity):
+    """Return a SQL expression mapping `column` to its bucket key.
+
+    Keys are ISO strings: `YYYY-MM-DD` for days and weeks (the Monday the
+    week starts on) and `YYYY-MM` for months.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Invalid granularity. Must be one of: {list(GRANULARITIES)}')
+
+    # Constant arguments are rendered inline (not as bind parameters) so the
+    # SELECT and GROUP BY expressions are textually identical on PostgreSQL.
+    if _dialect_name() == 'postgresql':
+        truncated = func.date_trunc(literal_column(f"'{granularity}'"), column)
+        pattern = "'YYYY-MM'" if granularity == 'month' else "'YYYY-MM-DD'"
+        return func.to_char(truncated, literal_column(pattern))
+
+    # SQLite: 'weekday 0' moves forward to Sunday (or stays on it), so going
+    # back six days lands on that week's Monday.
+    if granularity == 'day':
+        return func.strftime(literal_column("'%Y-%m-%d'"), column)
+    if granularity == 'week':
+        return func.date(column, literal_column("'weekday 0'"), literal_column("'-6 days'"))
+    return func.strftime(literal_column("'%Y-%m'"), column)
+
+
+def hours_between(start, end):
+    """Return a SQL expression for `end - start` in hours (as `Trip.get_duration_hours`)"""
+    if _dialect_name() == 'postgresql':
+        return func.extract('epoch', end - start) / 3600.0
+    return (func.julianday(end) - func.julianday(start)) * 24.0
+
+
+def bucket_start(day, granularity):
+    """Return the first date of the bucket containing `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def shift_buckets(day, granularity, count):
+    """Move a bucket start date `count` buckets forwards (or backwards)"""
+    if granularity == 'day':
+        return day + timedelta(days=count)
+    if granularity == 'week':
+        return day + timedelta(weeks=count)
+    months = day.year * 12 + (day.month - 1) + count
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def bucket_label(day, granularity):
+    """Format a bucket start date the same way `bucket_expression` does"""
+    return day.strftime('%Y-%m') if granularity == 'month' else day.isoformat()
+
+
+def window(granularity, periods, today=None):
+    """Return `(start, end)` covering the current bucket and `periods` before it.
+
+    Windows are aligned to real bucket boundaries, so a month window starts on
+    the first of a calendar month rather than a multiple of 30 days back.
+    """
+    end = today or date.today()
+    start = shift_buckets(bucket_start(end, granularity), granularity, -periods)
+    return start, end
+
+
+def bucket_labels(start, end, granularity):
+    """List every bucket key between `start` and `end`, inclusive"""
+    labels = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        labels.append(bucket_label(current, granularity))
+        current = shift_buckets(current, granularity, 1)
+    return labels
+
+
+def aggregate(date_column, measures, granularity, start=None, end=None,
+              filters=(), group=None, joins=()):
+    """Run a grouped aggregate over time buckets.
+
+    `measures` maps output names to aggregate expressions. `group`, when
+    given, is a `(key_column, label_column)` pair adding a series dimension;
+    `joins` holds entities or `(entity, onclause)` pairs.
+    Returns `(rows, labels)`: `rows` maps `(series_key, bucket)` to a dict of
+    measure values and `labels` maps series keys to display labels.
+    """
+    bucket = bucket_expression(date_column, granularity).label('bucket')
+    columns = [bucket]
+    group_by = [bucket]
+    if group is not None:
+        key_column, label_column = group
+        columns += [key_column.label('series_key'), label_column.label('series_label')]
+        group_by += [key_column, label_column]
+    columns += [expression.label(name) for name, expression in measures.items()]
+
+    query = db.session.query(*columns)
+    for target in joins:
+        query = query.join(*target) if isinstance(target, tuple) else query.join(target)
+    if start is not None:
+        query = query.filter(date_column >= start)
+    if end is not None:
+        query = query.filter(date_column <= end)
+    query = query.filter(*filters).group_by(*group_by)
+
+    rows = {}
+    labels = {}
+    for row in query.all():
+        mapping = row._mapping
+        series_key = mapping['series_key'] if group is not None else None
+        if group is not None:
+            labels[series_key] = mapping['series_label']
+        rows[(series_key, mapping['bucket'])] = {name: mapping[name] for name in measures}
+    return rows, labels
+
+
+def series(date_column, value, granularity, start, end, filters=(), group=None,
+           joins=(), precision=2):
+    """Build gap-filled chart data for a single summed value.
+
+    Without `group` the result is `{'labels': [...], 'values': [...]}`; with
+    it, `values` is replaced by a `series` list holding one entry per group.
+    """
+    rows, series_labels = aggregate(
+        date_column, {'value': func.sum(value)}, granularity, start, end,
+        filters=filters, group=group, joins=joins
+    )
+    labels = bucket_labels(start, end, granularity)
+
+    def fill(series_key):
+        values = []
+        for label in labels:
+            row = rows.get((series_key, label))
+            values.append(round(row['value'] or 0, precision) if row else 0)
+        return values
+
+    if group is None:
+        return {
+            'granularity': granularity,
+            'labels': labels,
+            'values': fill(None)
+        }
+
+    ordered = sorted(series_labels.items(), key=lambda item: str(item[1]))
+    return {
+        'granularity': granularity,
+        'labels': labels,
+        'series': [
+            {'key': key, 'label': label, 'values': fill(key)}
+            for key, label in ordered
+        ]
+    }